@@ -4,10 +4,10 @@ from .models import FileConversion, Newsletter
 
 @admin.register(FileConversion)
 class FileConversionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'conversion_type', 'status', 'created_at', 'original_filename')
+    list_display = ('id', 'conversion_type', 'status', 'progress', 'created_at', 'original_filename')
     list_filter = ('conversion_type', 'status', 'created_at')
     search_fields = ('original_file', 'error_message')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'attempts')
     ordering = ['-created_at']
 
 
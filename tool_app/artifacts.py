@@ -0,0 +1,133 @@
+"""
+Short-lived artifact store for generated downloads.
+
+Tool outputs (converted audio, memes, PDFs) are written once to
+``MEDIA_ROOT/<ARTIFACT_DIR>/<id>/<filename>`` and handed to the client as a
+signed download URL that expires after ARTIFACT_TTL seconds, instead of being
+base64-encoded into the HTML or JSON response.
+"""
+import base64
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+
+
+SIGNING_SALT = 'tool_app.artifacts'
+
+# When this process last purged expired artifacts
+_purged_at = 0.0
+
+
+def get_artifact_dir():
+    """Absolute path of the artifact directory inside MEDIA_ROOT"""
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'ARTIFACT_DIR', 'artifacts'))
+
+
+def get_artifact_ttl():
+    return getattr(settings, 'ARTIFACT_TTL', 3600)
+
+
+def safe_filename(filename, default='download'):
+    """Filesystem- and header-safe version of a user-supplied filename
+
+    Characters other than letters, digits, dashes, underscores and dots are
+    dropped (spaces become underscores) and the name is cut to
+    ARTIFACT_FILENAME_MAX_LENGTH, keeping its extension.
+    """
+    try:
+        name = get_valid_filename(os.path.basename(filename))
+    except SuspiciousFileOperation:
+        name = default
+
+    max_length = getattr(settings, 'ARTIFACT_FILENAME_MAX_LENGTH', 100)
+    stem, dot, extension = name.rpartition('.')
+    if dot:
+        extension = f'.{extension}'
+    else:
+        stem, extension = extension, ''
+    if len(name) > max_length:
+        stem = stem[:max(max_length - len(extension), 1)]
+    return f'{stem or default}{extension}'
+
+
+def create_artifact(filename):
+    """Reserve a new artifact and return (artifact_id, path) for the writer"""
+    global _purged_at
+    # Purging scans every artifact, so do it at most once per interval
+    now = time.time()
+    if now - _purged_at >= getattr(settings, 'ARTIFACT_PURGE_INTERVAL', 60):
+        _purged_at = now
+        purge_expired_artifacts()
+
+    artifact_id = uuid.uuid4().hex
+    artifact_path = os.path.join(get_artifact_dir(), artifact_id)
+    os.makedirs(artifact_path, exist_ok=True)
+    return artifact_id, os.path.join(artifact_path, safe_filename(filename))
+
+
+def save_artifact(data, filename):
+    """Store bytes or a file-like object as an artifact; returns (artifact_id, path)"""
+    artifact_id, path = create_artifact(filename)
+    with open(path, 'wb') as f:
+        if isinstance(data, (bytes, bytearray)):
+            f.write(data)
+        else:
+            data.seek(0)
+            shutil.copyfileobj(data, f)
+    return artifact_id, path
+
+
+def artifact_url(artifact_id):
+    """Signed, expiring download URL for an artifact"""
+    token = signing.TimestampSigner(salt=SIGNING_SALT).sign(artifact_id)
+    return reverse('tool_app:download_artifact', args=[token])
+
+
+def resolve_artifact(token):
+    """Return the file path for a download token, or None if invalid or expired"""
+    try:
+        artifact_id = signing.TimestampSigner(salt=SIGNING_SALT).unsign(token, max_age=get_artifact_ttl())
+    except signing.BadSignature:
+        return None
+
+    artifact_path = os.path.join(get_artifact_dir(), os.path.basename(artifact_id))
+    try:
+        filename = os.listdir(artifact_path)[0]
+    except (FileNotFoundError, IndexError):
+        return None
+    return os.path.join(artifact_path, filename)
+
+
+def purge_expired_artifacts():
+    """Delete artifacts whose download links can no longer be used"""
+    artifact_dir = get_artifact_dir()
+    if not os.path.isdir(artifact_dir):
+        return 0
+
+    cutoff = time.time() - get_artifact_ttl()
+    removed = 0
+    for entry in os.scandir(artifact_dir):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def inline_artifact_data(path, inline=False):
+    """Base64 payload for the opt-in inline mode, limited to small outputs"""
+    if not inline:
+        return None
+    if os.path.getsize(path) > getattr(settings, 'ARTIFACT_INLINE_MAX_BYTES', 1024 * 1024):
+        return None
+    with open(path, 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
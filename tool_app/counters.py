@@ -0,0 +1,34 @@
+"""
+Counters shared across processes.
+
+Statistics such as result cache hits or image admission decisions are counted
+by web workers, conversion workers and tool pool processes alike, and read by
+management commands running in a process of their own. Per-process caches
+(Django's default LocMem backend) would give each of them a private copy, so
+the counters are ``ToolCounter`` rows bumped with a single atomic UPDATE.
+"""
+from django.db.models import F
+
+from .models import ToolCounter
+
+
+def increment(name, amount=1):
+    """Add amount to a counter, creating it on first use; never raises"""
+    try:
+        counters = ToolCounter.objects.filter(name=name)
+        if not counters.update(value=F('value') + amount):
+            ToolCounter.objects.get_or_create(name=name)
+            counters.update(value=F('value') + amount)
+    except Exception as e:
+        # Statistics must never fail a conversion
+        print(f"Counter {name} update error: {e}")
+
+
+def get_counts(names):
+    """Current value of each counter in names (0 for counters never incremented)"""
+    values = dict(ToolCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in names}
+
+
+def reset(names):
+    ToolCounter.objects.filter(name__in=names).delete()
@@ -0,0 +1,256 @@
+"""
+DOCX to PDF conversion that keeps the document's structure.
+
+The python-docx body is walked element by element: each paragraph becomes a
+platypus Paragraph built from its runs (bold, italic, underline, strike,
+super/subscript, line breaks, hyperlinks) in the reportlab style its Word
+style maps to, and each table becomes a Table with merged cells spanned.
+``StyleMap`` resolves a Word style (following its base styles) to a
+reportlab style once per document.
+
+Flowables are produced lazily: ``FlowableStream`` hands platypus a list it
+consumes from the front and refills from the generator a few flowables ahead.
+Besides the parsed DOCX itself and the finished pages reportlab keeps until
+it saves, only the flowables of the page being laid out are in memory, and no
+copy of the document's text is ever made.
+"""
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.table import Table as DocxTable
+from docx.text.hyperlink import Hyperlink
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from xml.sax.saxutils import escape
+
+from .text_pdf import get_stylesheet
+
+
+# Word style name -> sample stylesheet style; other styles resolve through their base style
+WORD_STYLES = {
+    'Normal': 'Normal',
+    'Title': 'Title',
+    'Subtitle': 'Heading2',
+    'Heading 1': 'Heading1',
+    'Heading 2': 'Heading2',
+    'Heading 3': 'Heading3',
+    'Heading 4': 'Heading4',
+    'Heading 5': 'Heading5',
+    'Heading 6': 'Heading6',
+    'Quote': 'Italic',
+    'Intense Quote': 'Italic',
+    'List Bullet': 'Bullet',
+    'List Bullet 2': 'Bullet',
+    'List Bullet 3': 'Bullet',
+    'List Number': 'Bullet',
+    'List Number 2': 'Bullet',
+    'List Number 3': 'Bullet',
+    'Macro Text': 'Code',
+}
+
+ALIGNMENTS = {
+    WD_ALIGN_PARAGRAPH.LEFT: TA_LEFT,
+    WD_ALIGN_PARAGRAPH.CENTER: TA_CENTER,
+    WD_ALIGN_PARAGRAPH.RIGHT: TA_RIGHT,
+    WD_ALIGN_PARAGRAPH.JUSTIFY: TA_JUSTIFY,
+}
+
+# Flowables generated ahead of the one being laid out; platypus looks ahead for keepWithNext
+LOOKAHEAD = 16
+
+TABLE_STYLE = [
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+]
+
+
+class FlowableStream(list):
+    """The list of flowables platypus builds from, refilled lazily from an iterable
+
+    SimpleDocTemplate.build takes flowables off the front of its list (and
+    puts split remainders back), so only a short window needs to exist.
+    """
+
+    def __init__(self, iterable, lookahead=LOOKAHEAD):
+        super().__init__()
+        self._source = iter(iterable)
+        self._lookahead = lookahead
+
+    def _fill(self, size):
+        while self._source is not None and list.__len__(self) < size:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill(self._lookahead)
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= 0:
+            self._fill(index + 1)
+        return list.__getitem__(self, index)
+
+
+class StyleMap:
+    """Resolves Word paragraph styles to reportlab ParagraphStyles, once per document"""
+
+    def __init__(self):
+        self.styles = get_stylesheet()
+        self._resolved = {}
+
+    def _base_name(self, style):
+        while style is not None:
+            if style.name in WORD_STYLES:
+                return WORD_STYLES[style.name]
+            style = style.base_style
+        return 'Normal'
+
+    def get(self, paragraph):
+        """(ParagraphStyle, list kind) for a paragraph; list kind is 'bullet', 'number' or None
+
+        Keyed by the paragraph's raw style id, since python-docx's
+        ``paragraph.style`` searches the styles part on every access.
+        """
+        key = (paragraph._p.style, paragraph.alignment)
+        if key not in self._resolved:
+            style = paragraph.style
+            alignment = key[1]
+            if alignment is None and style is not None:
+                alignment = style.paragraph_format.alignment
+            base = self.styles[self._base_name(style)]
+            if alignment in ALIGNMENTS and ALIGNMENTS[alignment] != base.alignment:
+                base = ParagraphStyle(f'{base.name}-{alignment}', parent=base, alignment=ALIGNMENTS[alignment])
+            self._resolved[key] = (base, _list_kind(style.name if style is not None else ''))
+        return self._resolved[key]
+
+
+def _run_markup(run):
+    """Paragraph markup for one run, or '' for an empty run"""
+    parts = []
+    for child in run._r.iterchildren():
+        if child.tag == qn('w:t'):
+            parts.append(escape(child.text or ''))
+        elif child.tag == qn('w:tab'):
+            parts.append('&nbsp;' * 4)
+        elif child.tag in (qn('w:br'), qn('w:cr')) and child.get(qn('w:type')) != 'page':
+            parts.append('<br/>')
+    text = ''.join(parts)
+    if not text:
+        return ''
+
+    font = run.font
+    for enabled, tag in ((run.bold, 'b'), (run.italic, 'i'), (run.underline, 'u'), (font.strike, 'strike'),
+                         (font.superscript, 'super'), (font.subscript, 'sub')):
+        if enabled:
+            text = f'<{tag}>{text}</{tag}>'
+    return text
+
+
+def paragraph_markup(paragraph):
+    parts = []
+    for item in paragraph.iter_inner_content():
+        if isinstance(item, Hyperlink):
+            text = ''.join(_run_markup(run) for run in item.runs)
+            if text and item.url:
+                text = f'<a href="{escape(item.url, {chr(34): "&quot;"})}" color="blue">{text}</a>'
+            parts.append(text)
+        else:
+            parts.append(_run_markup(item))
+    return ''.join(parts)
+
+
+def _has_page_break(paragraph):
+    return bool(paragraph._p.xpath('./w:r/w:br[@w:type="page"]'))
+
+
+def _list_kind(style_name):
+    """'bullet', 'number' or None for a Word style name"""
+    if style_name.startswith('List Number'):
+        return 'number'
+    if style_name.startswith('List Bullet'):
+        return 'bullet'
+    return None
+
+
+def _is_numbered(paragraph):
+    """Whether a paragraph carries its own list numbering, whatever its style"""
+    return paragraph._p.pPr is not None and paragraph._p.pPr.numPr is not None
+
+
+def table_flowable(table, styles, width):
+    """A reportlab Table for a docx table, with horizontally and vertically merged cells spanned"""
+    cell_style = styles.styles['Normal']
+    # row.cells lays out the whole row grid, so walk it once
+    rows = [row.cells for row in table.rows]
+    grid = [[cell._tc for cell in cells] for cells in rows]
+    contents = {}
+    for cells in rows:
+        for cell in cells:
+            if cell._tc not in contents:
+                markup = '<br/>'.join(paragraph_markup(paragraph) for paragraph in cell.paragraphs)
+                contents[cell._tc] = Paragraph(markup, cell_style)
+
+    columns = max(len(row) for row in grid)
+    grid = [row + [None] * (columns - len(row)) for row in grid]
+    data = [[''] * columns for _ in grid]
+    commands = list(TABLE_STYLE)
+    seen = set()
+    for r, row in enumerate(grid):
+        for c, tc in enumerate(row):
+            if tc is None or id(tc) in seen:
+                continue
+            seen.add(id(tc))
+            data[r][c] = contents[tc]
+            right = c
+            while right + 1 < columns and grid[r][right + 1] is tc:
+                right += 1
+            bottom = r
+            while bottom + 1 < len(grid) and grid[bottom + 1][c] is tc:
+                bottom += 1
+            if (right, bottom) != (c, r):
+                commands.append(('SPAN', (c, r), (right, bottom)))
+
+    return Table(data, colWidths=[width / columns] * columns, style=TableStyle(commands))
+
+
+def iter_flowables(document, styles, width):
+    """Yield the flowables for a python-docx document's body in order"""
+    number = 0
+    for item in document.iter_inner_content():
+        if isinstance(item, DocxTable):
+            number = 0
+            if item.rows:
+                yield table_flowable(item, styles, width)
+                yield Spacer(1, 6)
+            continue
+
+        style, kind = styles.get(item)
+        if kind is None and _is_numbered(item):
+            kind = 'bullet'
+        markup = paragraph_markup(item)
+        number = number + 1 if kind == 'number' else 0
+        if markup.strip():
+            bullet = f'{number}.' if kind == 'number' else '•' if kind == 'bullet' else None
+            yield Paragraph(markup, style, bulletText=bullet)
+        else:
+            yield Spacer(1, style.leading)
+        if _has_page_break(item):
+            yield PageBreak()
+
+
+def convert_docx_to_pdf_file(docx_file, output):
+    """Write a PDF of a DOCX's paragraphs and tables to the binary file output"""
+    document = Document(docx_file)
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=letter,
+        title=document.core_properties.title or 'Converted Document',
+        invariant=int(getattr(settings, 'TEXT_PDF_INVARIANT', True)),
+    )
+    doc.build(FlowableStream(iter_flowables(document, StyleMap(), doc.width)))
@@ -0,0 +1,224 @@
+"""
+Warm process pools for CPU-bound tool helpers.
+
+Pillow, reportlab and qrcode work holds the GIL, so running it on the request
+thread stalls every other request handled by the same web worker. Views hand
+those helpers to ``run_in_pool`` instead: each tool gets its own small
+ProcessPoolExecutor whose workers import Django and the heavy libraries once
+at start-up, a semaphore bounds how many tasks may wait for a pool, and every
+task has a timeout after which it is cancelled, recycling the pool if the task
+was already running.
+
+Recycling kills every worker of that pool, not just the stuck one, so the
+other tasks it was running fail with BrokenProcessPool and tasks still queued
+on it are cancelled. ``wait_for_result`` recognises those as collateral of a
+recycle and resubmits each of them once to the fresh pool, with a new
+timeout; only a task that is caught by a second recycle reports an error.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+
+
+DEFAULT_POOL_WORKERS = {
+    'image': 2,
+    'meme': 1,
+    'qr': 1,
+    'pdf': 1,
+    'pdf_text': 4,
+    'pdf_pages': 4,
+    'pdf_layout': 2,
+}
+
+_pools = {}
+_slots = {}
+_lock = threading.Lock()
+
+
+class ToolPoolError(Exception):
+    """Base class for errors raised by the tool pools"""
+
+
+class ToolPoolBusy(ToolPoolError):
+    """Raised when a tool's queue is full"""
+
+
+class ToolTimeout(ToolPoolError):
+    """Raised when a task exceeds TOOL_POOL_TIMEOUT and is cancelled"""
+
+
+def is_enabled():
+    return getattr(settings, 'TOOL_POOL_ENABLED', True)
+
+
+def get_pool_workers(tool):
+    return getattr(settings, 'TOOL_POOL_WORKERS', DEFAULT_POOL_WORKERS).get(tool, 1)
+
+
+def _warm_worker():
+    """Pool initializer: load Django and the heavy libraries before the first task"""
+    import django
+    django.setup()
+
+    # Importing the views pulls in PIL, reportlab, qrcode and the helpers themselves
+    from . import views  # noqa: F401
+    from .fonts import preload_fonts
+    from .text_pdf import get_stylesheet
+    get_stylesheet()
+    preload_fonts()
+
+
+def _ping():
+    return True
+
+
+def _get_pool(tool):
+    with _lock:
+        pool = _pools.get(tool)
+        if pool is None:
+            workers = get_pool_workers(tool)
+            context = multiprocessing.get_context(getattr(settings, 'TOOL_POOL_START_METHOD', 'forkserver'))
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_warm_worker)
+            # Start every worker now so the first real task does not pay for the imports
+            for _ in range(workers):
+                pool.submit(_ping)
+            _pools[tool] = pool
+        if tool not in _slots:
+            _slots[tool] = threading.BoundedSemaphore(
+                get_pool_workers(tool) + getattr(settings, 'TOOL_POOL_QUEUE_SIZE', 8)
+            )
+        return pool, _slots[tool]
+
+
+def _recycle_pool(tool, pool):
+    """Kill a pool whose worker is stuck on a cancelled task; the next call starts a fresh one"""
+    with _lock:
+        if _pools.get(tool) is pool:
+            del _pools[tool]
+    # Lets wait_for_result tell the other tasks killed with it from real crashes
+    pool.tool_recycled = True
+    # ProcessPoolExecutor cannot cancel a running task, so stop its processes
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pools():
+    """Stop every pool (tests and graceful shutdown)"""
+    with _lock:
+        pools = list(_pools.items())
+        _pools.clear()
+    for tool, pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _portable(value):
+    """Replace uploaded files with something that can be sent to another process"""
+    if isinstance(value, UploadedFile):
+        # Large uploads are already on disk; only send the path
+        if hasattr(value, 'temporary_file_path'):
+            return value.temporary_file_path()
+        value.seek(0)
+        data = BytesIO(value.read())
+        value.seek(0)
+        return data
+    return value
+
+
+def submit_to_pool(tool, func, *args, _retry=False, **kwargs):
+    """Queue func(*args, **kwargs) on the tool's pool and return its Future
+
+    The queue slot is released when the task finishes or is cancelled. Runs
+    inline (returning a finished Future) when TOOL_POOL_ENABLED is False.
+    Raises ToolPoolBusy when no slot frees up within TOOL_POOL_QUEUE_TIMEOUT.
+    """
+    if not is_enabled():
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        future.tool_pool = (tool, None)
+        return future
+
+    pool, slots = _get_pool(tool)
+    if not slots.acquire(timeout=getattr(settings, 'TOOL_POOL_QUEUE_TIMEOUT', 5)):
+        raise ToolPoolBusy(f'The {tool} tool is busy, please try again shortly')
+
+    try:
+        args = [_portable(arg) for arg in args]
+        kwargs = {key: _portable(value) for key, value in kwargs.items()}
+        try:
+            future = pool.submit(func, *args, **kwargs)
+        except (BrokenProcessPool, RuntimeError):
+            # The pool was recycled or a worker died; retry once on a fresh pool
+            _recycle_pool(tool, pool)
+            pool, _ = _get_pool(tool)
+            future = pool.submit(func, *args, **kwargs)
+    except Exception:
+        slots.release()
+        raise
+
+    future.tool_pool = (tool, pool)
+    future.tool_task = None if _retry else (func, args, kwargs)
+    future.add_done_callback(lambda f: slots.release())
+    return future
+
+
+def wait_for_result(future, timeout=None):
+    """Result of a submit_to_pool Future, cancelling the task if it takes longer than timeout"""
+    if timeout is None:
+        timeout = getattr(settings, 'TOOL_POOL_TIMEOUT', 60)
+    tool, pool = future.tool_pool
+
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        if not future.cancel():
+            _recycle_pool(tool, pool)
+        raise ToolTimeout(f'The {tool} tool took longer than {timeout} seconds and was cancelled')
+    except (BrokenProcessPool, CancelledError) as e:
+        task = getattr(future, 'tool_task', None)
+        if getattr(pool, 'tool_recycled', False) and task is not None:
+            # Killed or dropped along with a task that timed out; run it again once
+            func, args, kwargs = task
+            return wait_for_result(submit_to_pool(tool, func, *args, _retry=True, **kwargs), timeout)
+        if isinstance(e, CancelledError):
+            raise
+        _recycle_pool(tool, pool)
+        raise ToolPoolError(f'A {tool} worker process crashed, please try again')
+
+
+def run_in_pool(tool, func, *args, timeout=None, **kwargs):
+    """Run func(*args, **kwargs) in the tool's worker pool and return its result
+
+    Runs inline when TOOL_POOL_ENABLED is False. Raises ToolPoolBusy when the
+    queue is full and ToolTimeout when the task takes longer than the timeout.
+    """
+    return wait_for_result(submit_to_pool(tool, func, *args, **kwargs), timeout)
+
+
+def map_in_pool(tool, func, iterable, window=None, timeout=None):
+    """Yield func(*args) for each args tuple of iterable, in order, running them on the tool's pool
+
+    At most window tasks (by default the pool's worker count) are queued at
+    once and iterable is only consumed as results are taken, so it may be a
+    lazy pipeline. Each result is subject to the task timeout.
+    """
+    window = window or get_pool_workers(tool)
+    pending = []
+    try:
+        for args in iterable:
+            pending.append(submit_to_pool(tool, func, *args))
+            if len(pending) >= window:
+                yield wait_for_result(pending.pop(0), timeout)
+        while pending:
+            yield wait_for_result(pending.pop(0), timeout)
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,53 @@
+"""
+Process-wide font registry for the tools that draw text.
+
+The face is looked up once per process from MEME_FONTS (file names FreeType
+finds on the system font path, or absolute paths), and each (size, face) is
+loaded once and kept, so a request never goes looking for font files. The
+tool pool initializer calls ``preload_fonts``, so warm workers have already
+paid for the lookup before the first meme arrives.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import ImageFont
+
+
+DEFAULT_FONTS = ['arial.ttf', 'DejaVuSans-Bold.ttf']
+
+# Loaded fonts kept per process; the meme form allows sizes 20-100
+FONT_CACHE_SIZE = 128
+
+
+def get_font_candidates():
+    return tuple(getattr(settings, 'MEME_FONTS', DEFAULT_FONTS))
+
+
+@lru_cache(maxsize=None)
+def find_face(candidates):
+    """Path of the first of candidates FreeType can open, or None for Pillow's built-in font"""
+    for name in candidates:
+        try:
+            return ImageFont.truetype(name, 10).path
+        except OSError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_font(size, face=None):
+    """Font of size px, loaded once per process
+
+    face is a font file name or path; by default the first available of
+    MEME_FONTS, falling back to Pillow's built-in font.
+    """
+    path = face or find_face(get_font_candidates())
+    if path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(path, size)
+
+
+def preload_fonts(sizes=(40,)):
+    """Resolve the default face and load the common sizes ahead of the first request"""
+    for size in sizes:
+        get_font(size)
@@ -56,7 +56,7 @@ class TextToPdfForm(forms.Form):
             'placeholder': 'Enter your text here...'
         }),
         label='Text Content',
-        help_text='Enter the text you want to convert to PDF'
+        help_text='Enter the text you want to convert to PDF. Very long texts are laid out as plain text, without markup, for speed.'
     )
     
     title = forms.CharField(
@@ -147,6 +147,18 @@ class ImageCompressionForm(forms.Form):
         label='Resize Width (optional)',
         help_text='Resize image width in pixels (height will be adjusted proportionally)'
     )
+    
+    target_size_kb = forms.IntegerField(
+        required=False,
+        min_value=5,
+        max_value=20000,
+        widget=forms.NumberInput(attrs={
+            'class': 'mt-1 block w-full py-2 px-3 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-blue-500 focus:border-blue-500',
+            'placeholder': 'Leave empty to use the quality setting'
+        }),
+        label='Maximum File Size in KB (optional)',
+        help_text='Find the highest quality (up to the value above) that fits this size, scaling down if needed'
+    )
 
 
 class ImageConversionForm(forms.Form):
@@ -167,11 +179,15 @@ class ImageConversionForm(forms.Form):
             ('WEBP', 'WebP'),
             ('BMP', 'BMP'),
             ('TIFF', 'TIFF'),
+            ('GIF', 'GIF'),
+            ('AUTO', 'Auto (smallest file)'),
         ],
         widget=forms.Select(attrs={
             'class': 'mt-1 block w-full py-2 px-3 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-blue-500 focus:border-blue-500'
         }),
-        label='Target Format'
+        label='Target Format',
+        help_text='Animations and multi-page TIFFs keep every frame as GIF, WebP, PNG or TIFF. '
+                  'Auto picks the smallest of WebP, JPEG and PNG that your browser supports'
     )
     
     quality = forms.IntegerField(
@@ -183,7 +199,42 @@ class ImageConversionForm(forms.Form):
             'type': 'range'
         }),
         label='Quality (%)',
-        help_text='Only applies to JPEG and WebP formats'
+        help_text='Only applies to JPEG, WebP and Auto formats'
+    )
+
+    tiff_compression = forms.ChoiceField(
+        choices=[
+            ('lzw', 'LZW (lossless, widely supported)'),
+            ('deflate', 'Deflate (lossless, usually smaller)'),
+            ('none', 'None (largest files)'),
+        ],
+        initial='lzw',
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'mt-1 block w-full py-2 px-3 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-blue-500 focus:border-blue-500'
+        }),
+        label='TIFF Compression',
+        help_text='Only applies to the TIFF format'
+    )
+
+    optimize_png = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-checkbox'
+        }),
+        label='Optimize PNG size',
+        help_text='Tries palette reduction and several encoder settings and keeps the smallest lossless file'
+    )
+
+    tiled = forms.BooleanField(
+        required=False,
+        initial=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-checkbox'
+        }),
+        label='Tiled processing for very large images',
+        help_text='Converts large scanned TIFFs to TIFF or PNG in bands of rows so they never have to fit in memory at once'
     )
 
 
@@ -554,7 +605,7 @@ class MemeGeneratorForm(forms.Form):
             'accept': '.jpg,.jpeg,.png,.gif,.bmp,.webp'
         }),
         label='Upload Image',
-        help_text='Supported formats: JPG, PNG, GIF, BMP, WebP (max 10MB)'
+        help_text='Supported formats: JPG, PNG, GIF, BMP, WebP (max 10MB). Animated GIF/WebP/PNG stay animated'
     )
     
     top_text = forms.CharField(
@@ -865,13 +916,15 @@ class VideoToAudioForm(forms.Form):
             ('wav', 'WAV'),
             ('flac', 'FLAC'),
             ('aac', 'AAC'),
+            ('m4a', 'M4A'),
             ('ogg', 'OGG'),
         ],
         initial='mp3',
         widget=forms.Select(attrs={
             'class': 'mt-1 block w-full py-2 px-3 border border-gray-300 bg-white rounded-md shadow-sm focus:outline-none focus:ring-blue-500 focus:border-blue-500'
         }),
-        label='Audio Format'
+        label='Audio Format',
+        help_text='AAC and M4A keep the original audio track without re-encoding when the video already uses AAC'
     )
     
     audio_quality = forms.ChoiceField(
@@ -0,0 +1,373 @@
+"""
+Frame-by-frame conversion of animated GIF/WebP/PNG and multi-page TIFF images.
+
+``iter_frames`` seeks through a source one frame at a time, and each writer
+below encodes a frame as soon as it arrives: GIF and APNG frames are encoded
+by Pillow on their own and spliced into the output, WebP frames go straight
+to libwebp's animation encoder (when this Pillow exposes it; see
+``WebPFrameWriter``) and TIFF pages to Pillow's AppendingTiffWriter.
+Only the current frame (and the previous one, to crop unchanged areas) is held
+decoded, so peak memory follows the frame size rather than the frame count.
+
+``map_frames`` runs per-frame work (resizing for animated compression,
+compositing meme captions) on a thread pool, keeping the frames in order and
+at most a few in flight.
+"""
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from PIL import ImageChops, TiffImagePlugin
+
+try:
+    # Private: the encoder behind Pillow's WebP save_all, checked against pillow==11.3.0
+    from PIL import _webp
+except ImportError:
+    _webp = None
+
+from .imaging import _png_chunk, get_tiff_compression, resize_to_width, scaled_size
+
+
+# Targets that can hold more than one frame
+ANIMATED_FORMATS = ['GIF', 'WEBP', 'PNG', 'TIFF']
+
+# Frame duration (ms) used when the source has none, e.g. TIFF pages
+DEFAULT_FRAME_DURATION = 100
+
+
+def get_frame_workers():
+    return getattr(settings, 'IMAGE_FRAME_WORKERS', 4)
+
+
+def frame_count(image):
+    return getattr(image, 'n_frames', 1)
+
+
+def is_multi_frame(image):
+    return frame_count(image) > 1
+
+
+def frame_mode(image):
+    """Mode every frame of an animation is converted to
+
+    GIF frames are always RGBA because transparency may first appear on a
+    later frame.
+    """
+    if image.format == 'GIF' or 'A' in image.mode or 'transparency' in image.info:
+        return 'RGBA'
+    return 'RGB'
+
+
+def iter_frames(image, mode=None):
+    """Yield (frame, duration in ms) for each frame of an opened image, decoding one at a time
+
+    Frames are converted to mode, or keep their own mode when mode is None
+    (TIFF pages), except that palette transparency becomes an alpha channel.
+    """
+    for index in range(frame_count(image)):
+        image.seek(index)
+        if mode is None and image.mode == 'P' and 'transparency' in image.info:
+            frame = image.convert('RGBA')
+        else:
+            frame = image.convert(mode) if mode else image.copy()
+        yield frame, image.info.get('duration') or DEFAULT_FRAME_DURATION
+
+
+def map_frames(frames, func, workers=None):
+    """Apply func to the frame of each (frame, duration) pair on a thread pool, in order
+
+    At most twice the worker count of frames are in flight at once.
+    """
+    workers = workers or get_frame_workers()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for frame, duration in frames:
+            pending.append((pool.submit(func, frame), duration))
+            if len(pending) >= 2 * workers:
+                future, duration = pending.pop(0)
+                yield future.result(), duration
+        for future, duration in pending:
+            yield future.result(), duration
+
+
+def _is_opaque(frame):
+    return frame.mode != 'RGBA' or frame.getchannel('A').getextrema()[0] == 255
+
+
+def _changed_box(frame, previous):
+    """Bounding box of the pixels that differ from the previous frame (at least 1x1)"""
+    return ImageChops.difference(frame, previous).getbbox(alpha_only=False) or (0, 0, 1, 1)
+
+
+def _skip_sub_blocks(data, pos):
+    while data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+
+def _gif_frame(frame, reserve_transparency=False):
+    """Encode one frame with Pillow and split out (palette, transparency index, image block)
+
+    With reserve_transparency, an opaque frame is given a transparency index
+    no pixel uses, which decoders such as Pillow clear it to when it is
+    disposed to the background.
+    """
+    # Source metadata such as a WebP background colour would end up in the palette
+    frame.info = {}
+    buffer = BytesIO()
+    if reserve_transparency:
+        frame.convert('RGB').quantize(255).save(buffer, format='GIF', transparency=255)
+    else:
+        frame.save(buffer, format='GIF')
+    data = buffer.getvalue()
+
+    flags, pos = data[10], 13
+    palette = None
+    if flags & 0x80:
+        palette_size = 3 << ((flags & 7) + 1)
+        palette, pos = data[pos:pos + palette_size], pos + palette_size
+
+    transparency = None
+    while data[pos] == 0x21:
+        if data[pos + 1] == 0xF9 and data[pos + 3] & 1:
+            transparency = data[pos + 6]
+        pos = _skip_sub_blocks(data, pos + 2)
+
+    # Image descriptor, then the LZW code size and data sub-blocks
+    descriptor, pos = data[pos:pos + 10], pos + 10
+    if descriptor[9] & 0x80:
+        palette_size = 3 << ((descriptor[9] & 7) + 1)
+        palette, pos = data[pos:pos + palette_size], pos + palette_size
+    start = pos
+    pos = _skip_sub_blocks(data, pos + 1)
+    return palette, transparency, descriptor, data[start:pos]
+
+
+class GifFrameWriter:
+    """Write an animated GIF one frame at a time, each with its own colour table
+
+    Opaque frames following an opaque frame are cropped to the area that
+    changed. A frame's disposal says what happens to it once the next one is
+    due, so each frame is held back until the next arrives: frames with
+    transparency, and frames followed by one, are written whole and cleared
+    after display, so transparent pixels never show a stale frame.
+    """
+
+    def __init__(self, fp, size, loop=0):
+        self.fp = fp
+        self.size = size
+        self.previous = None
+        self.pending = None
+        self.fp.write(b'GIF89a' + struct.pack('<HHBBB', size[0], size[1], 0, 0, 0))
+        self.fp.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\x00')
+
+    def write(self, frame, duration):
+        opaque = _is_opaque(frame)
+        box = (0, 0) + frame.size
+        if opaque and self.previous is not None:
+            box = _changed_box(frame, self.previous)
+        self.previous = frame if opaque else None
+
+        if self.pending is not None:
+            self._write_frame(*self.pending, clear=not opaque)
+        self.pending = (frame, duration, opaque, box)
+
+    def _write_frame(self, frame, duration, opaque, box, clear):
+        if clear:
+            # The canvas is cleared after this frame, so it must cover all of it
+            box = (0, 0) + frame.size
+        if box != (0, 0) + frame.size:
+            frame = frame.crop(box)
+        palette, transparency, descriptor, block = _gif_frame(frame, reserve_transparency=clear and opaque)
+        disposal = 2 if clear or not opaque else 1
+        self.fp.write(b'!\xf9\x04' + struct.pack('<BHBB', (disposal << 2) | (transparency is not None),
+                                                  min(round(duration / 10), 0xFFFF), transparency or 0, 0))
+        flags = descriptor[9] & 0x40
+        if palette:
+            flags |= 0x80 | (len(palette) // 3).bit_length() - 2
+        self.fp.write(b',' + struct.pack('<HHHHB', box[0], box[1], box[2] - box[0], box[3] - box[1], flags))
+        if palette:
+            self.fp.write(palette)
+        self.fp.write(block)
+
+    def close(self):
+        if self.pending is not None:
+            self._write_frame(*self.pending, clear=False)
+            self.pending = None
+        self.fp.write(b';')
+
+
+def _png_chunks(data):
+    """Yield (type, payload) for each chunk of an encoded PNG"""
+    pos = 8
+    while pos < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        yield chunk_type, data[pos + 8:pos + 8 + length]
+        pos += length + 12
+
+
+class ApngFrameWriter:
+    """Write an animated PNG one frame at a time
+
+    Frames after the first are cropped to the area that changed and replace
+    it outright, so transparency needs no special disposal. The frame count
+    goes in the header, so it must be known up front.
+    """
+
+    def __init__(self, fp, size, frames, loop=0, compress_level=6):
+        self.fp = fp
+        self.size = size
+        self.frames = frames
+        self.loop = loop
+        self.compress_level = compress_level
+        self.previous = None
+        self.sequence = 0
+
+    def write(self, frame, duration):
+        box = (0, 0) + frame.size
+        if self.previous is not None:
+            box = _changed_box(frame, self.previous)
+        self.previous = frame
+
+        if box != (0, 0) + frame.size:
+            frame = frame.crop(box)
+        buffer = BytesIO()
+        frame.save(buffer, format='PNG', compress_level=self.compress_level)
+        chunks = list(_png_chunks(buffer.getvalue()))
+        first = self.sequence == 0
+        if first:
+            self.fp.write(b'\x89PNG\r\n\x1a\n')
+            self.fp.write(_png_chunk(b'IHDR', dict(chunks)[b'IHDR']))
+            self.fp.write(_png_chunk(b'acTL', struct.pack('>II', self.frames, self.loop)))
+
+        self.fp.write(_png_chunk(b'fcTL', struct.pack(
+            '>IIIIIHHBB', self.sequence, box[2] - box[0], box[3] - box[1], box[0], box[1],
+            min(round(duration), 0xFFFF), 1000, 0, 0
+        )))
+        self.sequence += 1
+        for chunk_type, data in chunks:
+            if chunk_type != b'IDAT':
+                continue
+            if first:
+                self.fp.write(_png_chunk(b'IDAT', data))
+            else:
+                self.fp.write(_png_chunk(b'fdAT', struct.pack('>I', self.sequence) + data))
+                self.sequence += 1
+
+    def close(self):
+        self.fp.write(_png_chunk(b'IEND', b''))
+
+
+class WebPFrameWriter:
+    """Feed frames to libwebp's animation encoder one at a time
+
+    Uses the encoder behind Pillow's save_all, which would otherwise insist on
+    seeking through a single source image. That encoder is private and its
+    arguments have changed between Pillow releases, so when it is missing or
+    refuses them the frames are collected and written with the public
+    ``save(save_all=True)`` instead, at the cost of holding every frame.
+    """
+
+    def __init__(self, fp, size, quality=85, lossless=False, loop=0):
+        self.fp = fp
+        self.quality = quality
+        self.lossless = lossless
+        self.loop = loop
+        self.timestamp = 0
+        self.encoder = None
+        self.frames = []
+        if getattr(_webp, 'WebPAnimEncoder', None) is not None:
+            try:
+                self.encoder = _webp.WebPAnimEncoder(
+                    size, 0, loop, False, 9 if lossless else 3, 17 if lossless else 5, False, False
+                )
+            except TypeError:
+                self.encoder = None
+
+    def write(self, frame, duration):
+        if self.encoder is not None:
+            try:
+                # Method 0 (fastest), Pillow's default for animations, as the cost is paid per frame
+                self.encoder.add(frame.getim(), self.timestamp, self.lossless, self.quality, 100, 0)
+            except TypeError:
+                if self.timestamp:
+                    raise
+                self.encoder = None
+        if self.encoder is None:
+            frame.info = {}
+            self.frames.append((frame, round(duration)))
+        self.timestamp += round(duration)
+
+    def close(self):
+        if self.encoder is not None:
+            self.encoder.add(None, self.timestamp, self.lossless, self.quality, 100, 0)
+            self.fp.write(self.encoder.assemble('', b'', ''))
+            return
+
+        first = self.frames[0][0]
+        first.save(
+            self.fp, format='WEBP', save_all=True,
+            append_images=[frame for frame, duration in self.frames[1:]],
+            duration=[duration for frame, duration in self.frames],
+            loop=self.loop, quality=self.quality, lossless=self.lossless, method=0,
+        )
+
+
+class TiffPageWriter:
+    """Append each frame to a multi-page TIFF as its own page
+
+    fp must be readable as well as writable ('w+b' or BytesIO).
+    """
+
+    def __init__(self, fp, compression=None):
+        self.writer = TiffImagePlugin.AppendingTiffWriter(fp)
+        self.compression = get_tiff_compression(compression)
+
+    def write(self, frame, duration):
+        frame.save(self.writer, format='TIFF', compression=self.compression)
+        self.writer.newFrame()
+
+    def close(self):
+        self.writer.finalize()
+
+
+def convert_frames(image, output, target_format, quality=85, tiff_compression=None, resize_width=None,
+                   transform=None, workers=None):
+    """Convert every frame of an opened multi-frame image into output, one frame at a time
+
+    Frames are resized to resize_width and then passed through transform
+    (a function from frame to frame of the same size) on a thread pool when
+    either is given. TIFF output needs a readable output file. Returns the
+    number of frames written.
+    """
+    source = iter_frames(image, None if target_format == 'TIFF' else frame_mode(image))
+    size = image.size
+    if resize_width or transform:
+        def prepare(frame):
+            if resize_width:
+                frame = resize_to_width(frame, resize_width)
+            return transform(frame) if transform else frame
+
+        source = map_frames(source, prepare, workers)
+        if resize_width:
+            size = scaled_size(image.size, resize_width)
+
+    loop = image.info.get('loop', 0)
+    if target_format == 'GIF':
+        writer = GifFrameWriter(output, size, loop)
+    elif target_format == 'WEBP':
+        writer = WebPFrameWriter(output, size, quality, loop=loop)
+    elif target_format == 'PNG':
+        writer = ApngFrameWriter(output, size, frame_count(image), loop)
+    elif target_format == 'TIFF':
+        writer = TiffPageWriter(output, tiff_compression)
+    else:
+        raise ValueError(f"Frame conversion does not support {target_format}")
+
+    written = 0
+    for frame, duration in source:
+        writer.write(frame, duration)
+        written += 1
+    writer.close()
+    return written
@@ -0,0 +1,894 @@
+"""
+Pillow helpers shared by the image tools.
+
+Downscaling is done in stages so large photos are never fully decoded just to
+be thrown away: JPEG sources are decoded directly at 1/2, 1/4 or 1/8 size
+with DCT scaling (``Image.draft``), the result is shrunk by an integer factor
+with ``Image.reduce`` and only the last step uses a full LANCZOS resample.
+IMAGE_RESIZE_STRATEGY picks how close to the target size the cheap stages go.
+
+Every tool opens uploads through ``open_image``, which admits an image from
+its header alone: anything over IMAGE_MAX_PIXELS or IMAGE_MAX_DECODE_BYTES is
+rejected, or for JPEGs downsampled at decode time, before a pixel is decoded.
+
+``compress_to_size`` searches JPEG quality (and, if needed, scale) against a
+byte budget by re-encoding one decoded image in memory,
+``generate_variants`` turns one decode into a pyramid of responsive sizes,
+and ``choose_smallest_format`` encodes one decode as every format the client
+accepts and keeps the smallest that is still close enough to the source.
+
+``convert_tiled`` converts large striped or tiled TIFFs to TIFF or PNG one
+band of rows at a time: each band is decoded from its own strips, encoded and
+written out before the next is read, so peak memory follows IMAGE_TILE_BYTES
+rather than the image size.
+"""
+import math
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, TiffImagePlugin
+from PIL.TiffImagePlugin import ImageFileDirectory_v2
+
+from . import counters
+
+
+# How much larger than the target the image must stay before the final
+# LANCZOS resample; 'speed' lets draft/reduce do nearly all the work
+REDUCING_GAPS = {
+    'speed': 1.0,
+    'quality': 3.0,
+}
+
+
+# File extension and MIME type for each output format
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'BMP': 'bmp',
+    'TIFF': 'tiff',
+    'GIF': 'gif',
+}
+
+FORMAT_CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'BMP': 'image/bmp',
+    'TIFF': 'image/tiff',
+    'GIF': 'image/gif',
+}
+
+# Formats offered for responsive variants
+VARIANT_FORMATS = ['JPEG', 'WEBP', 'PNG']
+
+# Pseudo target format: pick the smallest of AUTO_CANDIDATES
+AUTO_FORMAT = 'AUTO'
+
+# (format, lossless) encodes tried for the 'auto' target
+AUTO_CANDIDATES = [
+    ('WEBP', False),
+    ('WEBP', True),
+    ('JPEG', False),
+    ('PNG', True),
+]
+
+# Pillow compression names behind the TIFF compression choices
+TIFF_COMPRESSIONS = {
+    'none': 'raw',
+    'lzw': 'tiff_lzw',
+    'deflate': 'tiff_adobe_deflate',
+}
+
+# Targets that can be written band by band
+TILED_FORMATS = ['TIFF', 'PNG']
+
+MIN_TARGET_QUALITY = 10
+
+# A result this close below the budget ends the quality search early
+TARGET_SIZE_TOLERANCE = 0.05
+
+# Downscaling rounds tried when even the lowest quality is over budget
+MAX_SCALE_ROUNDS = 3
+
+
+# Decoded bytes per pixel for Pillow's in-memory modes (RGB is stored padded to 4)
+MODE_BYTES_PER_PIXEL = {
+    '1': 1,
+    'L': 1,
+    'P': 1,
+    'I;16': 2,
+    'LA': 4,
+    'PA': 4,
+    'RGB': 4,
+    'RGBA': 4,
+    'CMYK': 4,
+    'YCbCr': 4,
+    'I': 4,
+    'F': 4,
+}
+
+ADMISSION_COUNTERS = ['admitted', 'downsampled', 'rejected']
+
+
+class ImageRejected(ValueError):
+    """Raised when an image is over the pixel or memory budget"""
+
+
+def _counter_name(counter):
+    return f'image_admission:{counter}'
+
+
+def _increment(counter):
+    counters.increment(_counter_name(counter))
+
+
+def admission_stats():
+    """Counters of admitted, downsampled and rejected images"""
+    counts = counters.get_counts([_counter_name(counter) for counter in ADMISSION_COUNTERS])
+    return {counter: counts[_counter_name(counter)] for counter in ADMISSION_COUNTERS}
+
+
+def reset_admission_stats():
+    counters.reset([_counter_name(counter) for counter in ADMISSION_COUNTERS])
+
+
+def decoded_size(size, mode):
+    """Approximate bytes needed to hold the decoded image, plus an RGB working copy"""
+    bytes_per_pixel = MODE_BYTES_PER_PIXEL.get(mode, 4)
+    return size[0] * size[1] * (bytes_per_pixel + (4 if bytes_per_pixel < 4 else 0))
+
+
+def _over_budget(image, max_pixels, max_bytes):
+    pixels = image.size[0] * image.size[1]
+    return pixels > max_pixels or decoded_size(image.size, image.mode) > max_bytes
+
+
+def _open_banded_tiff(image_file):
+    """Open a TIFF that can be read in bands, skipping Pillow's decompression bomb check
+
+    Returns None for anything else. The check is skipped because a banded
+    conversion never holds the full image; open_image applies
+    IMAGE_TILED_MAX_PIXELS instead.
+    """
+    if isinstance(image_file, str):
+        with open(image_file, 'rb') as f:
+            prefix = f.read(4)
+    else:
+        image_file.seek(0)
+        prefix = image_file.read(4)
+        image_file.seek(0)
+    if not TiffImagePlugin._accept(prefix):
+        return None
+
+    try:
+        image = TiffImagePlugin.TiffImageFile(image_file)
+    except (SyntaxError, OSError):
+        image = None
+    if image is not None and band_layout(image) is not None:
+        return image
+
+    # Leave the file for the regular Image.open path
+    if isinstance(image_file, str):
+        if image is not None:
+            image.close()
+    else:
+        image_file.seek(0)
+    return None
+
+
+def open_image(image_file, tiled=False):
+    """Image.open with admission control, before any pixel data is decoded
+
+    Oversized JPEGs are downsampled with DCT scaling when IMAGE_OVERSIZE_POLICY
+    is 'downsample'; anything else over budget raises ImageRejected. With
+    tiled=True, TIFFs that convert_tiled can read in bands are admitted up to
+    IMAGE_TILED_MAX_PIXELS instead.
+    """
+    max_pixels = getattr(settings, 'IMAGE_MAX_PIXELS', 40_000_000)
+    max_bytes = getattr(settings, 'IMAGE_MAX_DECODE_BYTES', 256 * 1024 * 1024)
+
+    if tiled:
+        image = _open_banded_tiff(image_file)
+        if image is not None:
+            width, height = image.size
+            tiled_max_pixels = getattr(settings, 'IMAGE_TILED_MAX_PIXELS', 1_000_000_000)
+            if width * height <= tiled_max_pixels:
+                _increment('admitted')
+                return image
+            _increment('rejected')
+            raise ImageRejected(
+                f'Image is too large to process ({width}x{height} pixels); '
+                f'the limit is {tiled_max_pixels // 1_000_000} megapixels'
+            )
+
+    try:
+        image = Image.open(image_file)
+    except Image.DecompressionBombError as e:
+        _increment('rejected')
+        raise ImageRejected(str(e))
+
+    if not _over_budget(image, max_pixels, max_bytes):
+        _increment('admitted')
+        return image
+
+    width, height = image.size
+    if getattr(settings, 'IMAGE_OVERSIZE_POLICY', 'downsample') == 'downsample' and image.format == 'JPEG':
+        # Smallest DCT scale (1/2, 1/4, 1/8) that brings the decode under budget
+        needed = max(
+            math.sqrt(width * height / float(max_pixels)),
+            math.sqrt(decoded_size(image.size, image.mode) / float(max_bytes))
+        )
+        scale = next((s for s in (2, 4, 8) if s >= needed), 8)
+        image.draft(None, (width // scale, height // scale))
+        if not _over_budget(image, max_pixels, max_bytes):
+            _increment('downsampled')
+            return image
+
+    _increment('rejected')
+    raise ImageRejected(
+        f'Image is too large to process ({width}x{height} pixels); '
+        f'the limit is {max_pixels // 1_000_000} megapixels'
+    )
+
+
+def get_resize_strategy():
+    strategy = getattr(settings, 'IMAGE_RESIZE_STRATEGY', 'quality')
+    return strategy if strategy in REDUCING_GAPS else 'quality'
+
+
+def scaled_size(size, width):
+    """Proportional (width, height) for a new width"""
+    return width, max(1, int(size[1] * width / float(size[0])))
+
+
+def resize_to_width(image, width, strategy=None):
+    """Shrink an opened image to width px, using draft and reduce before the resample
+
+    Must be called before the image is loaded for the JPEG draft to apply.
+    Images that are already narrower than width are resized the usual way.
+    """
+    target = scaled_size(image.size, width)
+    if target[0] >= image.size[0]:
+        return image.resize(target, Image.Resampling.LANCZOS)
+
+    gap = REDUCING_GAPS[strategy or get_resize_strategy()]
+    minimum = (int(target[0] * gap), int(target[1] * gap))
+
+    # JPEG: let the decoder produce a 1/2, 1/4 or 1/8 scale image directly
+    if image.format == 'JPEG':
+        image.draft(None, minimum)
+
+    # Box-filter by an integer factor while still at least `gap` times the target
+    factor = min(image.size[0] // max(minimum[0], 1), image.size[1] // max(minimum[1], 1))
+    if factor >= 2:
+        image = image.reduce(factor)
+
+    return image.resize(target, Image.Resampling.LANCZOS)
+
+
+def get_tiff_compression(name=None):
+    """Pillow compression for a TIFF_COMPRESSIONS key, defaulting to IMAGE_TIFF_COMPRESSION"""
+    if name not in TIFF_COMPRESSIONS:
+        name = getattr(settings, 'IMAGE_TIFF_COMPRESSION', 'lzw')
+    return TIFF_COMPRESSIONS.get(name, 'raw')
+
+
+def encode_image(image, target_format, quality=85, tiff_compression=None):
+    """Encode a decoded image into a BytesIO in one of FORMAT_EXTENSIONS"""
+    buffer = BytesIO()
+    
+    if target_format == 'JPEG':
+        if image.mode in ('RGBA', 'P'):
+            image = image.convert('RGB')
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    elif target_format == 'PNG':
+        image.save(buffer, format='PNG', optimize=True)
+    elif target_format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=quality, optimize=True)
+    elif target_format == 'BMP':
+        if image.mode in ('RGBA', 'P'):
+            image = image.convert('RGB')
+        image.save(buffer, format='BMP')
+    elif target_format == 'TIFF':
+        image.save(buffer, format='TIFF', compression=get_tiff_compression(tiff_compression))
+    elif target_format == 'GIF':
+        image.save(buffer, format='GIF')
+    else:
+        raise ValueError(f"Unsupported target format: {target_format}")
+    
+    buffer.seek(0)
+    return buffer
+
+
+def psnr(reference, image):
+    """Peak signal-to-noise ratio in dB between two same-sized images of the same mode"""
+    error = np.mean((np.asarray(reference, dtype=np.float32) - np.asarray(image, dtype=np.float32)) ** 2)
+    return float('inf') if error == 0 else float(10 * np.log10(255.0 ** 2 / error))
+
+
+def acceptable_formats(accept_header):
+    """Formats the 'auto' target may produce for a request's Accept header
+
+    JPEG and PNG are always allowed. WebP needs an explicit image/webp entry,
+    which every browser that can decode it sends; */* alone does not count.
+    """
+    formats = []
+    for entry in (accept_header or '').split(','):
+        media_type, _, params = entry.strip().partition(';')
+        if media_type.strip().lower() != 'image/webp':
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            formats.append('WEBP')
+    return formats + ['JPEG', 'PNG']
+
+
+def _encode_candidate(image, target_format, lossless, quality):
+    """Encode one 'auto' candidate; returns (buffer, psnr against image)"""
+    if lossless:
+        # Default-effort encoders; level 9 zlib can take seconds on a photo PNG cannot win anyway
+        buffer = BytesIO()
+        if target_format == 'WEBP':
+            image.save(buffer, format='WEBP', lossless=True, quality=50, method=3)
+        else:
+            image.save(buffer, format='PNG', compress_level=6)
+        buffer.seek(0)
+        return buffer, float('inf')
+
+    buffer = encode_image(image, target_format, quality)
+    decoded = Image.open(buffer).convert(image.mode)
+    buffer.seek(0)
+    return buffer, psnr(image, decoded)
+
+
+def choose_smallest_format(image, formats=None, quality=85, min_psnr=None, max_workers=None):
+    """Encode a decoded image as every candidate in formats at once and keep the smallest
+
+    Lossy results below min_psnr dB (IMAGE_AUTO_MIN_PSNR) against the source
+    are discarded, and JPEG is skipped for images with transparency, so the
+    lossless PNG is always a valid fallback. Returns (format, buffer, info).
+    """
+    if formats is None:
+        formats = [target_format for target_format, lossless in AUTO_CANDIDATES]
+    if min_psnr is None:
+        min_psnr = getattr(settings, 'IMAGE_AUTO_MIN_PSNR', 36.0)
+
+    # One working copy every encoder shares: RGB, or RGBA when alpha is actually used
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha and image.getchannel('A').getextrema() == (255, 255):
+        image, has_alpha = image.convert('RGB'), False
+
+    candidates = [
+        (target_format, lossless) for target_format, lossless in AUTO_CANDIDATES
+        if target_format in formats and not (target_format == 'JPEG' and has_alpha)
+    ]
+    # Image.save keeps its options on the image, so each encode gets its own copy
+    with ThreadPoolExecutor(max_workers=max_workers or len(candidates)) as pool:
+        futures = [
+            (target_format, lossless, pool.submit(_encode_candidate, image.copy(), target_format, lossless, quality))
+            for target_format, lossless in candidates
+        ]
+        results = [(target_format, lossless) + future.result() for target_format, lossless, future in futures]
+
+    tried = {
+        f"{target_format.lower()}{'-lossless' if lossless else ''}": {
+            'size': buffer.getbuffer().nbytes,
+            'psnr': None if score == float('inf') else round(score, 2),
+        }
+        for target_format, lossless, buffer, score in results
+    }
+    passing = [result for result in results if result[3] >= min_psnr]
+    target_format, lossless, buffer, score = min(passing, key=lambda result: result[2].getbuffer().nbytes)
+    return target_format, buffer, {
+        'format': target_format,
+        'lossless': lossless,
+        'size': buffer.getbuffer().nbytes,
+        'psnr': None if score == float('inf') else round(score, 2),
+        'candidates': tried,
+    }
+
+
+def sniff_format(buffer):
+    """Format of encoded image bytes, read from the header only"""
+    buffer.seek(0)
+    target_format = Image.open(buffer).format
+    buffer.seek(0)
+    return target_format
+
+
+def _jpeg_size(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.tell()
+
+
+def _search_quality(image, max_bytes, low, high):
+    """Highest quality in [low, high] that fits max_bytes
+
+    Returns (quality or None, size of the last encode, number of encodes).
+    """
+    size = _jpeg_size(image, high)
+    if size <= max_bytes:
+        return high, size, 1
+
+    best, attempts = None, 1
+    high -= 1
+    while low <= high:
+        quality = (low + high) // 2
+        size = _jpeg_size(image, quality)
+        attempts += 1
+        if size <= max_bytes:
+            best, low = quality, quality + 1
+            if size >= max_bytes * (1 - TARGET_SIZE_TOLERANCE):
+                break
+        else:
+            high = quality - 1
+    return best, size, attempts
+
+
+def compress_to_size(image, max_bytes, max_quality=95):
+    """Encode image as JPEG at the highest quality, then the largest scale, within max_bytes
+
+    Every attempt re-encodes the same decoded image in memory. If nothing fits,
+    the smallest encoding tried is returned. Returns (buffer, info).
+    """
+    candidate, scale, attempts = image, 1.0, 0
+    quality = None
+    for _ in range(MAX_SCALE_ROUNDS + 1):
+        quality, size, tries = _search_quality(candidate, max_bytes, min(MIN_TARGET_QUALITY, max_quality), max_quality)
+        attempts += tries
+        if quality is not None:
+            break
+
+        # Bytes grow roughly with pixel count; aim a little under the budget
+        scale *= min(0.9, (max_bytes / float(size)) ** 0.5 * 0.95)
+        width = max(1, int(image.size[0] * scale))
+        if width < 16:
+            break
+        candidate = image.resize(scaled_size(image.size, width), Image.Resampling.LANCZOS)
+
+    final_quality = quality if quality is not None else min(MIN_TARGET_QUALITY, max_quality)
+    buffer = BytesIO()
+    candidate.save(buffer, format='JPEG', quality=final_quality, optimize=True)
+    buffer.seek(0)
+    return buffer, {
+        'quality': final_quality,
+        'scale': round(candidate.size[0] / float(image.size[0]), 3),
+        'size': buffer.getbuffer().nbytes,
+        'attempts': attempts + 1,
+        'fits': buffer.getbuffer().nbytes <= max_bytes,
+    }
+
+
+def build_pyramid(image, widths, strategy=None):
+    """Yield one image per requested width, largest first, each resized from the previous level
+
+    Widths above the source width are capped at it (no upscaling) and
+    duplicates are dropped.
+    """
+    source_width = image.size[0]
+    level = None
+    for width in sorted({min(width, source_width) for width in widths}, reverse=True):
+        if level is None:
+            # Only the first level touches the source, so JPEG draft decoding still applies
+            if width < source_width:
+                level = resize_to_width(image, width, strategy)
+            else:
+                # Decode here, not lazily inside whichever encoder thread gets it first
+                image.load()
+                level = image
+        else:
+            level = level.resize(scaled_size(level.size, width), Image.Resampling.LANCZOS)
+        yield level
+
+
+def generate_variants(image, widths, formats, quality=85, max_workers=None):
+    """Decode an image from open_image once and yield (size, format, BytesIO) for every width and format
+
+    Levels are built sequentially from the largest down while their encodes run
+    on a thread pool (Pillow releases the GIL while resizing and encoding).
+    Results are yielded in request order as soon as each is ready.
+    """
+    if max_workers is None:
+        max_workers = getattr(settings, 'IMAGE_VARIANT_WORKERS', 4)
+
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = []
+        for level in build_pyramid(image, widths):
+            for target_format in formats:
+                # Image.save keeps its options on the image, so concurrent encodes each get a copy
+                pending.append((level.size, target_format, pool.submit(encode_image, level.copy(), target_format, quality)))
+            # Hand back whatever is already finished while the next level is built
+            while pending and pending[0][2].done():
+                size, target_format, future = pending.pop(0)
+                yield size, target_format, future.result()
+        for size, target_format, future in pending:
+            yield size, target_format, future.result()
+
+
+# TIFF tags that locate pixel data or sub-directories; rewritten or dropped when strips move
+_TIFF_DATA_TAGS = {
+    TiffImagePlugin.STRIPOFFSETS,
+    TiffImagePlugin.STRIPBYTECOUNTS,
+    TiffImagePlugin.TILEOFFSETS,
+    TiffImagePlugin.TILEBYTECOUNTS,
+    330,    # SubIFDs
+    34665,  # Exif IFD
+    34853,  # GPS IFD
+    40965,  # Interoperability IFD
+}
+
+TIFF_HEADER = b'II*\x00\x08\x00\x00\x00'
+
+# Rows filtered per numpy pass when writing PNG
+PNG_FILTER_BLOCK_BYTES = 256 * 1024
+
+
+def band_layout(image):
+    """How a TIFF's pixel data can be read in bands, or None if it must be decoded whole
+
+    Returns a dict with the chunk offsets and byte counts, the rows each
+    strip or row of tiles covers, and for uncompressed strips the row stride
+    (those can be cut at any row).
+    """
+    if image.format != 'TIFF':
+        return None
+    tags = image.tag_v2
+    if tags.get(TiffImagePlugin.PLANAR_CONFIGURATION, 1) != 1:
+        return None
+
+    width, height = image.size
+    if TiffImagePlugin.TILEOFFSETS in tags:
+        offsets = tags[TiffImagePlugin.TILEOFFSETS]
+        counts = tags.get(TiffImagePlugin.TILEBYTECOUNTS)
+        rows = tags.get(TiffImagePlugin.TILELENGTH)
+        across = math.ceil(width / float(tags.get(TiffImagePlugin.TILEWIDTH, width)))
+    elif TiffImagePlugin.STRIPOFFSETS in tags:
+        offsets = tags[TiffImagePlugin.STRIPOFFSETS]
+        counts = tags.get(TiffImagePlugin.STRIPBYTECOUNTS)
+        rows = min(tags.get(TiffImagePlugin.ROWSPERSTRIP, height), height)
+        across = 1
+    else:
+        return None
+
+    offsets = offsets if isinstance(offsets, tuple) else (offsets,)
+    counts = counts if isinstance(counts, tuple) else (counts,)
+    if not rows or len(offsets) != len(counts) or len(offsets) < math.ceil(height / float(rows)) * across:
+        return None
+
+    stride = None
+    if tags.get(TiffImagePlugin.COMPRESSION, 1) == 1 and across == 1:
+        bits = tags.get(TiffImagePlugin.BITSPERSAMPLE, (1,))
+        bits = bits if isinstance(bits, tuple) else (bits,)
+        samples = tags.get(TiffImagePlugin.SAMPLESPERPIXEL, len(bits))
+        stride = (width * bits[0] * samples + 7) // 8
+    elif rows >= height and height > 1:
+        # A single compressed strip: nothing to gain over a full decode
+        return None
+
+    return {'offsets': offsets, 'counts': counts, 'rows': rows, 'across': across, 'stride': stride}
+
+
+def get_band_rows(image, layout=None, max_bytes=None):
+    """Rows per band: whole strips or tile rows filling up to IMAGE_TILE_BYTES decoded"""
+    layout = layout or band_layout(image)
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'IMAGE_TILE_BYTES', 16 * 1024 * 1024)
+    row_bytes = image.size[0] * MODE_BYTES_PER_PIXEL.get(image.mode, 4)
+    unit = 1 if layout['stride'] else layout['rows']
+    return max(unit, max_bytes // max(row_bytes * unit, 1) * unit)
+
+
+def _tiff_bytes(ifd, chunks):
+    """A complete little-endian TIFF from a directory and its strip or tile data"""
+    offsets, position = [], 0
+    for chunk in chunks:
+        offsets.append(position)
+        position += len(chunk)
+
+    if TiffImagePlugin.TILEWIDTH in ifd:
+        # Tile offsets are written as given, so place them after the directory
+        _set_long(ifd, TiffImagePlugin.TILEBYTECOUNTS, tuple(len(chunk) for chunk in chunks))
+        _set_long(ifd, TiffImagePlugin.TILEOFFSETS, tuple(offsets))
+        start = len(TIFF_HEADER) + len(ifd.tobytes(len(TIFF_HEADER)))
+        _set_long(ifd, TiffImagePlugin.TILEOFFSETS, tuple(start + offset for offset in offsets))
+    else:
+        # Strip offsets are stored relative to the end of the directory
+        _set_long(ifd, TiffImagePlugin.STRIPBYTECOUNTS, tuple(len(chunk) for chunk in chunks))
+        _set_long(ifd, TiffImagePlugin.STRIPOFFSETS, tuple(offsets))
+    return TIFF_HEADER + ifd.tobytes(len(TIFF_HEADER)) + b''.join(chunks)
+
+
+def _set_long(ifd, tag, value):
+    ifd[tag] = value
+    ifd.tagtype[tag] = TiffImagePlugin.TiffTags.LONG
+
+
+def _copy_tags(tags):
+    ifd = ImageFileDirectory_v2(prefix=b'II')
+    for tag, value in tags.items():
+        if tag in _TIFF_DATA_TAGS:
+            continue
+        ifd[tag] = value
+        if tag in tags.tagtype:
+            ifd.tagtype[tag] = tags.tagtype[tag]
+    return ifd
+
+
+def _read_range(fp, offset, count):
+    fp.seek(offset)
+    return fp.read(count)
+
+
+def iter_bands(image, band_rows=None):
+    """Yield successive full-width bands of a TIFF from open_image(..., tiled=True)
+
+    Each band is decoded on its own from the strips or tiles it covers, by
+    handing Pillow a small TIFF holding just those chunks, so every
+    compression Pillow can read works while only one band is in memory.
+    """
+    layout = band_layout(image)
+    if layout is None:
+        raise ValueError('This image cannot be read in bands')
+    band_rows = band_rows or get_band_rows(image, layout)
+    width, height = image.size
+    template = _copy_tags(image.tag_v2)
+    fp = image.fp
+
+    for top in range(0, height, band_rows):
+        rows = min(band_rows, height - top)
+        ifd = _copy_tags(template)
+        _set_long(ifd, TiffImagePlugin.IMAGELENGTH, rows)
+
+        if layout['stride']:
+            # Uncompressed strips: cut exactly the rows of this band out of them
+            stride, strip_rows, chunk = layout['stride'], layout['rows'], []
+            for strip in range(top // strip_rows, (top + rows - 1) // strip_rows + 1):
+                first = max(top, strip * strip_rows) - strip * strip_rows
+                last = min(top + rows, (strip + 1) * strip_rows) - strip * strip_rows
+                chunk.append(_read_range(fp, layout['offsets'][strip] + first * stride, (last - first) * stride))
+            _set_long(ifd, TiffImagePlugin.ROWSPERSTRIP, rows)
+            chunks = [b''.join(chunk)]
+        else:
+            first = top // layout['rows'] * layout['across']
+            last = math.ceil((top + rows) / float(layout['rows'])) * layout['across']
+            chunks = [_read_range(fp, layout['offsets'][index], layout['counts'][index]) for index in range(first, last)]
+
+        band = Image.open(BytesIO(_tiff_bytes(ifd, chunks)))
+        band.load()
+        yield band
+
+
+class TiffBandWriter:
+    """Write a striped TIFF band by band to a seekable file, one strip per band
+
+    Pillow encodes each band (so LZW and Deflate go through libtiff) and its
+    strip is copied out; the directory is written in front of the strips once
+    every band is in, into space reserved when the first band arrives.
+    """
+
+    def __init__(self, fp, size, compression=None):
+        self.fp = fp
+        self.size = size
+        self.compression = get_tiff_compression(compression)
+        self.ifd = None
+        self.counts = []
+
+    def _reserve(self, band, band_tags):
+        self.ifd = _copy_tags(band_tags)
+        _set_long(self.ifd, TiffImagePlugin.IMAGELENGTH, self.size[1])
+        _set_long(self.ifd, TiffImagePlugin.ROWSPERSTRIP, band.size[1])
+        self.strips = math.ceil(self.size[1] / float(band.size[1]))
+        self.directory_size = len(_tiff_bytes(_copy_tags(self.ifd), [b''] * self.strips)) - len(TIFF_HEADER)
+        self.fp.seek(0)
+        self.fp.write(TIFF_HEADER)
+        self.fp.write(b'\x00' * self.directory_size)
+
+    def write(self, band):
+        buffer = BytesIO()
+        band.save(buffer, format='TIFF', compression=self.compression,
+                  tiffinfo={TiffImagePlugin.ROWSPERSTRIP: band.size[1]})
+        encoded = Image.open(buffer)
+        if self.ifd is None:
+            self._reserve(band, encoded.tag_v2)
+        offsets = encoded.tag_v2[TiffImagePlugin.STRIPOFFSETS]
+        counts = encoded.tag_v2[TiffImagePlugin.STRIPBYTECOUNTS]
+        data = buffer.getbuffer()
+        for offset, count in zip(offsets if isinstance(offsets, tuple) else (offsets,),
+                                 counts if isinstance(counts, tuple) else (counts,)):
+            self.fp.write(data[offset:offset + count])
+            self.counts.append(count)
+
+    def close(self):
+        """Write the directory; the strips must already cover the full height"""
+        if len(self.counts) != self.strips:
+            raise ValueError('Bands do not cover the image')
+        # Strip offsets are relative to the end of the directory, as in _tiff_bytes
+        offsets, position = [], 0
+        for count in self.counts:
+            offsets.append(position)
+            position += count
+        _set_long(self.ifd, TiffImagePlugin.STRIPOFFSETS, tuple(offsets))
+        _set_long(self.ifd, TiffImagePlugin.STRIPBYTECOUNTS, tuple(self.counts))
+        directory = self.ifd.tobytes(len(TIFF_HEADER))
+        if len(directory) != self.directory_size:
+            raise ValueError('TIFF directory does not fit the reserved space')
+        self.fp.seek(len(TIFF_HEADER))
+        self.fp.write(directory)
+        self.fp.seek(0, 2)
+
+
+def _png_mode(mode):
+    """Mode a band is converted to before PNG encoding"""
+    if mode in ('L', 'LA', 'RGB', 'RGBA', 'P', 'I;16'):
+        return mode
+    if mode == '1':
+        return 'L'
+    return 'RGBA' if 'A' in mode else 'RGB'
+
+
+# (bit depth, colour type, bytes per pixel) for each PNG band mode
+PNG_MODES = {
+    'L': (8, 0, 1),
+    'I;16': (16, 0, 2),
+    'LA': (8, 4, 2),
+    'RGB': (8, 2, 3),
+    'RGBA': (8, 6, 4),
+    'P': (8, 3, 1),
+}
+
+
+def _png_chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+# PNG filter types, in the order of their filter byte
+PNG_FILTERS = ['none', 'sub', 'up', 'average', 'paeth']
+
+
+def _filter_rows(rows, previous, bpp, filter_type=None):
+    """PNG-filter a block of rows with one of PNG_FILTERS, or by default pick per
+    row the filter with the smallest sum of absolute differences (the
+    heuristic libpng uses)"""
+    x = rows.astype(np.int16)
+    up = np.vstack([previous[np.newaxis].astype(np.int16), x[:-1]])
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    up_left = np.zeros_like(x)
+    up_left[:, bpp:] = up[:, :-bpp]
+
+    def paeth():
+        estimate = left + up - up_left
+        distance_left, distance_up, distance_up_left = (np.abs(estimate - left), np.abs(estimate - up),
+                                                        np.abs(estimate - up_left))
+        return np.where((distance_left <= distance_up) & (distance_left <= distance_up_left), left,
+                        np.where(distance_up <= distance_up_left, up, up_left))
+
+    predictors = [
+        lambda: 0,
+        lambda: left,
+        lambda: up,
+        lambda: (left + up) // 2,
+        paeth,
+    ]
+    types = range(len(PNG_FILTERS)) if filter_type is None else [PNG_FILTERS.index(filter_type)]
+    filtered = (np.stack([x - predictors[index]() for index in types]) & 0xFF).astype(np.uint8)
+    if filter_type is None:
+        choice = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2).argmin(axis=0)
+    else:
+        choice = np.zeros(len(rows), dtype=np.intp)
+    best = filtered[choice, np.arange(len(rows))]
+    filter_bytes = np.asarray(types, dtype=np.uint8)[choice]
+    return np.hstack([filter_bytes[:, np.newaxis], best]).tobytes()
+
+
+def _pack_bits(rows, bits):
+    """Pack one-byte palette indices into 1, 2 or 4 bits per pixel, MSB first"""
+    per_byte = 8 // bits
+    padding = -rows.shape[1] % per_byte
+    if padding:
+        rows = np.hstack([rows, np.zeros((len(rows), padding), dtype=np.uint8)])
+    shifts = (bits * np.arange(per_byte - 1, -1, -1)).astype(np.uint8)
+    return (rows.reshape(len(rows), -1, per_byte) << shifts).sum(axis=2, dtype=np.uint8)
+
+
+class PngBandWriter:
+    """Write a PNG band by band: each band is filtered and fed to one zlib stream
+
+    filter_type fixes one of PNG_FILTERS instead of choosing per row, and
+    strategy is a zlib strategy (Z_FILTERED, Z_RLE, ...). Palette images with
+    16 colours or fewer are packed to 1, 2 or 4 bits per pixel.
+    """
+
+    def __init__(self, fp, size, compress_level=6, filter_type=None, strategy=zlib.Z_DEFAULT_STRATEGY,
+                 icc_profile=None):
+        self.fp = fp
+        self.size = size
+        self.mode = None
+        self.filter_type = filter_type
+        self.icc_profile = icc_profile
+        self.compressor = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+        self.previous = None
+
+    def _start(self, band):
+        bit_depth, colour_type, self.bpp = PNG_MODES[self.mode]
+        self.bits = 8
+        palette = band.getpalette() if self.mode == 'P' else None
+        if palette is not None:
+            colours = len(palette) // 3
+            self.bits = 1 if colours <= 2 else 2 if colours <= 4 else 4 if colours <= 16 else 8
+            bit_depth = self.bits
+
+        self.fp.write(b'\x89PNG\r\n\x1a\n')
+        self.fp.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', self.size[0], self.size[1],
+                                                       bit_depth, colour_type, 0, 0, 0)))
+        if self.icc_profile:
+            self.fp.write(_png_chunk(b'iCCP', b'ICC Profile\x00\x00' + zlib.compress(self.icc_profile)))
+        if palette is not None:
+            self.fp.write(_png_chunk(b'PLTE', bytes(palette)))
+            transparency = band.info.get('transparency')
+            if isinstance(transparency, bytes):
+                self.fp.write(_png_chunk(b'tRNS', transparency))
+
+        row_bytes = (self.size[0] * self.bits + 7) // 8 if self.bits < 8 else self.size[0] * self.bpp
+        self.previous = np.zeros(row_bytes, dtype=np.uint8)
+
+    def write(self, band):
+        if self.mode is None:
+            self.mode = _png_mode(band.mode)
+            self._start(band.convert(self.mode) if band.mode != self.mode else band)
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+
+        raw = band.tobytes('raw', 'I;16B') if self.mode == 'I;16' else band.tobytes()
+        rows = np.frombuffer(raw, dtype=np.uint8).reshape(band.size[1], -1)
+        if self.bits < 8:
+            rows = _pack_bits(rows, self.bits)
+        block = max(1, PNG_FILTER_BLOCK_BYTES // rows.shape[1])
+        for start in range(0, len(rows), block):
+            filtered = _filter_rows(rows[start:start + block], self.previous, self.bpp, self.filter_type)
+            data = self.compressor.compress(filtered)
+            self.previous = rows[min(start + block, len(rows)) - 1]
+            if data:
+                self.fp.write(_png_chunk(b'IDAT', data))
+
+    def close(self):
+        self.fp.write(_png_chunk(b'IDAT', self.compressor.flush()))
+        self.fp.write(_png_chunk(b'IEND', b''))
+
+
+def convert_tiled(image, output, target_format, tiff_compression=None, band_rows=None):
+    """Convert a TIFF opened with open_image(..., tiled=True) to TIFF or PNG in bands
+
+    output must be a seekable binary file. Returns the number of bands written.
+    """
+    if target_format == 'TIFF':
+        writer = TiffBandWriter(output, image.size, tiff_compression)
+    elif target_format == 'PNG':
+        writer = PngBandWriter(output, image.size)
+    else:
+        raise ValueError(f"Tiled conversion does not support {target_format}")
+
+    bands = 0
+    for band in iter_bands(image, band_rows):
+        writer.write(band)
+        bands += 1
+    writer.close()
+    return bands
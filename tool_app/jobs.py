@@ -0,0 +1,192 @@
+"""
+Database-backed job queue for file conversions.
+
+FileConversion rows double as the queue: a ``pending`` row is a queued job and
+workers claim it by atomically flipping it to ``processing``. No external
+broker is needed; run the workers with ``python manage.py conversion_worker``.
+
+While a worker runs a job it touches the row's ``updated_at`` every
+CONVERSION_JOB_HEARTBEAT seconds. A ``processing`` row whose heartbeat is
+older than CONVERSION_JOB_TIMEOUT belonged to a worker that died and is
+queued again, until it has been claimed CONVERSION_JOB_MAX_ATTEMPTS times;
+then it is marked failed, so an input that kills its worker is not retried
+forever.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FileConversion
+
+
+# Conversion types handled by process_file_conversion
+QUEUED_CONVERSION_TYPES = [
+    'txt_to_pdf',
+    'pdf_to_txt',
+    'doc_to_pdf',
+    'pdf_to_doc',
+    'image_compress',
+    'image_convert',
+]
+
+
+def enqueue_conversion(conversion):
+    """Queue a saved FileConversion for processing by the worker pool"""
+    conversion.status = 'pending'
+    conversion.progress = 0
+    conversion.attempts = 0
+    conversion.error_message = None
+    conversion.save()
+
+    # Run inline when no worker pool is available (development/tests)
+    if getattr(settings, 'CONVERSION_QUEUE_EAGER', False):
+        run_conversion_job(conversion)
+
+    return conversion
+
+
+def claim_next_job():
+    """Claim the oldest pending conversion, or return None if the queue is empty"""
+    candidates = (
+        FileConversion.objects
+        .filter(status='pending', conversion_type__in=QUEUED_CONVERSION_TYPES)
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:10]
+    )
+    for pk in candidates:
+        # Compare-and-set so two workers never pick up the same row
+        claimed = FileConversion.objects.filter(pk=pk, status='pending').update(
+            status='processing',
+            progress=10,
+            started_at=timezone.now(),
+            updated_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return FileConversion.objects.get(pk=pk)
+    return None
+
+
+def set_progress(conversion, progress):
+    """Persist job progress without touching the other fields"""
+    conversion.progress = progress
+    FileConversion.objects.filter(pk=conversion.pk).update(progress=progress, updated_at=timezone.now())
+
+
+def _heartbeat(pk, interval, stop_event):
+    """Touch a running job's updated_at every interval seconds until stop_event is set"""
+    try:
+        while not stop_event.wait(interval):
+            FileConversion.objects.filter(pk=pk, status='processing').update(updated_at=timezone.now())
+    except Exception as e:
+        print(f"Conversion job {pk} heartbeat error: {e}")
+    finally:
+        # This thread's own connection
+        connection.close()
+
+
+def run_conversion_job(conversion, heartbeat=None):
+    """Run a claimed conversion and record the outcome on the model
+
+    With heartbeat (seconds), a background thread keeps the job's
+    updated_at fresh so requeue_stale_jobs leaves it alone however long
+    the conversion takes.
+    """
+    # Imported here because views imports this module
+    from .views import process_file_conversion
+
+    if conversion.status != 'processing':
+        conversion.status = 'processing'
+        conversion.started_at = timezone.now()
+        conversion.save(update_fields=['status', 'started_at', 'updated_at'])
+
+    stop_heartbeat = threading.Event()
+    if heartbeat:
+        threading.Thread(
+            target=_heartbeat, args=(conversion.pk, heartbeat, stop_heartbeat), daemon=True
+        ).start()
+
+    set_progress(conversion, 25)
+    try:
+        converted_file = process_file_conversion(conversion)
+        if converted_file:
+            conversion.converted_file = converted_file
+            conversion.status = 'completed'
+            conversion.progress = 100
+            conversion.error_message = None
+        else:
+            conversion.status = 'failed'
+            conversion.error_message = 'Conversion failed'
+    except Exception as e:
+        print(f"Conversion job {conversion.pk} error: {e}")
+        conversion.status = 'failed'
+        conversion.error_message = str(e)
+    finally:
+        stop_heartbeat.set()
+        if conversion.original_file:
+            conversion.original_file.close()
+
+    conversion.save()
+    return conversion
+
+
+def requeue_stale_jobs(timeout=None, max_attempts=None):
+    """Put jobs whose worker died mid-conversion back into the queue
+
+    A job is stale when its heartbeat (updated_at) is older than timeout
+    seconds. Stale jobs that have already been claimed max_attempts times
+    are marked failed instead. Returns the number of jobs requeued.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'CONVERSION_JOB_TIMEOUT', 600)
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'CONVERSION_JOB_MAX_ATTEMPTS', 3)
+    stale = FileConversion.objects.filter(
+        status='processing',
+        updated_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+
+    stale.filter(attempts__gte=max_attempts).update(
+        status='failed',
+        error_message=f'Conversion abandoned after {max_attempts} attempts; the worker stopped responding',
+        updated_at=timezone.now(),
+    )
+    return stale.filter(attempts__lt=max_attempts).update(
+        status='pending',
+        progress=0,
+        started_at=None,
+        updated_at=timezone.now(),
+    )
+
+
+def run_worker(poll_interval=None, max_jobs=None, stop_event=None):
+    """Poll the queue and process jobs until stopped"""
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'CONVERSION_WORKER_POLL_INTERVAL', 1.0)
+    heartbeat = getattr(settings, 'CONVERSION_JOB_HEARTBEAT', 30)
+
+    processed = 0
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            print(f"Conversion worker {os.getpid()} queue error: {e}")
+            job = None
+
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        run_conversion_job(job, heartbeat=heartbeat)
+        processed += 1
+        if max_jobs and processed >= max_jobs:
+            break
+
+    return processed
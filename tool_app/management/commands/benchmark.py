@@ -0,0 +1,393 @@
+import os
+import tempfile
+import textwrap
+import time
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate
+
+from tool_app.executor import shutdown_pools
+from tool_app.fonts import get_font
+from tool_app.imaging import REDUCING_GAPS, psnr, resize_to_width, scaled_size
+from tool_app.pdf_docx import convert_pdf_to_docx_file
+from tool_app.png_optimizer import optimize_png
+from tool_app.text_pdf import TextLayout, render_text_pdf, render_text_pdf_parallel
+from tool_app.time_stretch import TimeStretcher
+from tool_app.views import draw_meme_text
+
+
+SAMPLE_RATE = 44100
+
+# Chunk size matching what the ffmpeg decoder pipe hands over (64 KB of stereo s16le)
+PCM_CHUNK_FRAMES = 16384
+
+
+def synthetic_track(duration, channels=2, sample_rate=SAMPLE_RATE):
+    """A noisy chord with a moving tone, so the vocoder sees a realistic spectrum"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    chord = sum(0.15 * np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6))
+    sweep = 0.1 * np.sin(2 * np.pi * (440.0 + 220.0 * np.sin(2 * np.pi * 0.1 * t)) * t)
+    track = np.stack([chord + sweep + 0.02 * rng.standard_normal(t.size) for _ in range(channels)])
+    return track.astype(np.float32)
+
+
+def synthetic_photo(width, height, quality=92):
+    """JPEG bytes of a photo-like image: smooth gradients, texture and sensor noise"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [
+        128 + 60 * np.sin(x / (width / 7.0) + phase) * np.cos(y / (height / 5.0) - phase)
+        + 25 * np.sin((x + y) / 9.0 + phase)
+        for phase in (0.0, 1.3, 2.6)
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 6, (height, width, 3))
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB').save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def png_corpus():
+    """(name, image) fixtures covering what users convert to PNG"""
+    rng = np.random.default_rng(0)
+
+    screenshot = Image.new('RGB', (1280, 800), '#f3f4f6')
+    draw = ImageDraw.Draw(screenshot)
+    draw.rectangle([0, 0, 1280, 56], fill='#1f2937')
+    for row in range(24):
+        draw.rectangle([240, 80 + row * 28, 1240, 100 + row * 28], fill='#ffffff' if row % 2 else '#e5e7eb')
+        draw.text((252, 84 + row * 28), f'Item {row}: quarterly report, revenue and notes', fill='#111827')
+
+    logo = Image.new('RGBA', (512, 512), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse([40, 40, 472, 472], fill=(37, 99, 235, 255))
+    draw.polygon([(256, 110), (400, 380), (112, 380)], fill=(255, 255, 255, 255))
+
+    chart = Image.new('RGB', (1000, 600), 'white')
+    draw = ImageDraw.Draw(chart)
+    for index, height in enumerate(rng.integers(50, 500, 12)):
+        draw.rectangle([60 + index * 75, 560 - height, 110 + index * 75, 560], fill=['#2563eb', '#f59e0b', '#10b981'][index % 3])
+    draw.line([40, 560, 980, 560], fill='black', width=2)
+
+    y, x = np.mgrid[0:1100, 0:850]
+    scan = np.full((1100, 850), 245.0) - 180 * ((y % 22 < 3) & (x % 400 < 330)) + rng.normal(0, 4, (1100, 850))
+    scan = Image.fromarray(np.clip(scan, 0, 255).astype(np.uint8)).convert('RGB')
+
+    photo = Image.open(BytesIO(synthetic_photo(1200, 800))).convert('RGB')
+
+    return [('screenshot', screenshot), ('logo', logo), ('chart', chart), ('scan', scan), ('photo', photo)]
+
+
+def pdf_corpus(pages):
+    """(name, PDF bytes) fixtures of the given length: a typeset report and a dense listing"""
+    styles = getSampleStyleSheet()
+    body = (
+        'Quarterly revenue grew in every region, with <b>services</b> ahead of plan and hardware '
+        'flat against the previous year. Costs rose with hiring, and the margin held at the level '
+        'forecast in the spring. The outlook for the next quarter assumes stable demand. '
+    ) * 2
+    story = []
+    for page in range(pages):
+        story.append(Paragraph(f'Section {page + 1}', styles['Heading1']))
+        story.append(Paragraph('Summary of results', styles['Heading2']))
+        for _ in range(3):
+            story.append(Paragraph(body, styles['Normal']))
+        story.append(Paragraph('<i>Figures are unaudited.</i>', styles['Normal']))
+        story.append(PageBreak())
+    report = BytesIO()
+    SimpleDocTemplate(report).build(story)
+
+    listing = BytesIO()
+    pdf = canvas.Canvas(listing)
+    for page in range(pages):
+        for line in range(50):
+            pdf.drawString(50, 800 - line * 15, f'{page * 50 + line:>6}  entry recorded, reference {page:05d}-{line:02d}, status ok')
+        pdf.showPage()
+    pdf.save()
+
+    return [('report', report.getvalue()), ('listing', listing.getvalue())]
+
+
+def synthetic_log(pages):
+    """Plain text that fills about pages pages of the text-to-PDF layout, one log line per row"""
+    rng = np.random.default_rng(0)
+    rows = pages * TextLayout().lines_per_page
+    levels = ['INFO', 'INFO', 'INFO', 'WARNING', 'ERROR']
+    return '\n'.join(
+        f'2026-10-17 12:{row // 60 % 60:02d}:{row % 60:02d} {levels[row % 5]:<7} worker-{row % 8} '
+        f'GET /api/items/{row} 200 {rng.integers(1, 900)} ms'
+        for row in range(rows)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks for the processing engines'
+
+    suites = ['time_stretch', 'image_resize', 'png_optimize', 'meme_text', 'pdf_to_docx', 'text_pdf']
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=self.suites, help='Benchmark suite to run')
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=180.0,
+            help='Length in seconds of the generated test input (audio suites)',
+        )
+        parser.add_argument(
+            '--image-size',
+            default='6000x4000',
+            help='WIDTHxHEIGHT of the generated photo (image suites)',
+        )
+        parser.add_argument(
+            '--width',
+            type=int,
+            default=800,
+            help='Target width for the image_resize suite',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per case; the fastest is reported (image suites)',
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=None,
+            help='Seconds of encoder search per image for png_optimize (default IMAGE_PNG_OPTIMIZE_BUDGET)',
+        )
+        parser.add_argument(
+            '--outlines',
+            default='1,2,4,6',
+            help='Comma-separated outline widths in px for the meme_text suite',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=None,
+            help='Pages per generated PDF for the pdf_to_docx suite (text_pdf default: 10000)',
+        )
+        parser.add_argument(
+            '--workers',
+            default='1,2,4',
+            help="Comma-separated pool sizes for the pdf_to_docx ('pdf_text', 1 runs inline) and text_pdf ('pdf_pages') suites",
+        )
+        parser.add_argument(
+            '--speeds',
+            default='0.5,0.75,1.25,1.5,2.0',
+            help='Comma-separated speed multipliers for the time_stretch suite',
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"bench_{options['suite']}")(options)
+
+    def bench_time_stretch(self, options):
+        try:
+            speeds = [float(speed) for speed in options['speeds'].split(',')]
+        except ValueError:
+            raise CommandError('--speeds must be a comma-separated list of numbers')
+
+        duration = options['duration']
+        track = synthetic_track(duration)
+        self.stdout.write(f'Time-stretching {duration:.0f}s of stereo {SAMPLE_RATE} Hz audio')
+        self.stdout.write(f"{'speed':>8} {'seconds':>10} {'RTF':>8} {'x realtime':>12}")
+
+        for speed in speeds:
+            stretcher = TimeStretcher(speed, track.shape[0])
+            start = time.perf_counter()
+            for offset in range(0, track.shape[1], PCM_CHUNK_FRAMES):
+                stretcher.process(track[:, offset:offset + PCM_CHUNK_FRAMES])
+            stretcher.flush()
+            elapsed = time.perf_counter() - start
+
+            # Real-time factor: processing time over audio duration (lower is better)
+            self.stdout.write(
+                f'{speed:>8.2f} {elapsed:>10.2f} {elapsed / duration:>8.3f} {duration / elapsed:>12.1f}'
+            )
+
+    def _image_size(self, options):
+        try:
+            width, height = (int(value) for value in options['image_size'].lower().split('x'))
+        except ValueError:
+            raise CommandError('--image-size must look like 6000x4000')
+        return width, height
+
+    def _best_time(self, func, repeat):
+        best, result = None, None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def bench_image_resize(self, options):
+        width, height = self._image_size(options)
+        target_width = options['width']
+        data = synthetic_photo(width, height)
+        self.stdout.write(
+            f'Resizing a {width}x{height} JPEG ({len(data) // 1024} KB) to {target_width}px wide, '
+            f"best of {options['repeat']}"
+        )
+
+        def full_decode():
+            # The previous path: decode at native size, then one LANCZOS resample
+            image = Image.open(BytesIO(data))
+            return image.resize(scaled_size(image.size, target_width), Image.Resampling.LANCZOS)
+
+        baseline_time, baseline = self._best_time(full_decode, options['repeat'])
+        self.stdout.write(f"{'strategy':>10} {'ms':>10} {'speed-up':>10} {'PSNR dB':>10}")
+        self.stdout.write(f"{'full':>10} {baseline_time * 1000:>10.1f} {1.0:>10.2f} {'ref':>10}")
+
+        for strategy in REDUCING_GAPS:
+            elapsed, image = self._best_time(
+                lambda: resize_to_width(Image.open(BytesIO(data)), target_width, strategy),
+                options['repeat']
+            )
+            self.stdout.write(
+                f'{strategy:>10} {elapsed * 1000:>10.1f} {baseline_time / elapsed:>10.2f} '
+                f'{psnr(baseline, image):>10.2f}'
+            )
+
+    def bench_png_optimize(self, options):
+        budget = options['budget']
+        self.stdout.write(f"{'fixture':>12} {'pillow KB':>10} {'optimized KB':>13} {'saved':>7} {'CPU ms':>8}  choice")
+
+        total_baseline = total_size = total_cpu = 0
+        for name, image in png_corpus():
+            start = time.process_time()
+            buffer, info = optimize_png(image, budget)
+            cpu = time.process_time() - start
+            total_baseline += info['baseline_size']
+            total_size += info['size']
+            total_cpu += cpu
+            self.stdout.write(
+                f"{name:>12} {info['baseline_size'] / 1024:>10.1f} {info['size'] / 1024:>13.1f} "
+                f"{info['saved'] / float(info['baseline_size']):>7.1%} {cpu * 1000:>8.0f}  {info['choice']}"
+            )
+
+        self.stdout.write(
+            f"{'total':>12} {total_baseline / 1024:>10.1f} {total_size / 1024:>13.1f} "
+            f"{1 - total_size / float(total_baseline):>7.1%} {total_cpu * 1000:>8.0f}"
+        )
+
+    def bench_meme_text(self, options):
+        try:
+            outlines = [int(width) for width in options['outlines'].split(',')]
+        except ValueError:
+            raise CommandError('--outlines must be a comma-separated list of integers')
+
+        top_text, bottom_text, font_size = 'When the benchmark finally runs', 'and the numbers look good', 48
+        photo = Image.open(BytesIO(synthetic_photo(1200, 900))).convert('RGB')
+        self.stdout.write(f"Captioning a 1200x900 photo at {font_size}px, best of {options['repeat']}")
+        self.stdout.write(f"{'outline':>8} {'before ms':>10} {'after ms':>10} {'speed-up':>10}")
+
+        def before(outline_width):
+            # The previous path: font files searched on every request, outline faked with offset copies
+            image = photo.copy()
+            draw = ImageDraw.Draw(image)
+            try:
+                font = ImageFont.truetype('arial.ttf', font_size)
+            except OSError:
+                try:
+                    font = ImageFont.truetype('DejaVuSans-Bold.ttf', font_size)
+                except OSError:
+                    font = ImageFont.load_default()
+            for text, bottom in ((top_text, False), (bottom_text, True)):
+                lines = textwrap.fill(text.upper(), width=20).split('\n')
+                for i, line in enumerate(reversed(lines) if bottom else lines):
+                    bbox = draw.textbbox((0, 0), line, font=font)
+                    text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+                    x = (image.size[0] - text_width) // 2
+                    y = image.size[1] - 10 - text_height * (i + 1) - i * 5 if bottom else 10 + i * (text_height + 5)
+                    for dx in range(-outline_width, outline_width + 1):
+                        for dy in range(-outline_width, outline_width + 1):
+                            draw.text((x + dx, y + dy), line, font=font, fill='black')
+                    draw.text((x, y), line, font=font, fill='white')
+            return image
+
+        def after(outline_width):
+            image = photo.copy()
+            draw_meme_text(ImageDraw.Draw(image), image.size, top_text, bottom_text, get_font(font_size), outline_width)
+            return image
+
+        for outline_width in outlines:
+            before_time, _ = self._best_time(lambda: before(outline_width), options['repeat'])
+            after_time, _ = self._best_time(lambda: after(outline_width), options['repeat'])
+            self.stdout.write(
+                f'{outline_width:>8} {before_time * 1000:>10.1f} {after_time * 1000:>10.1f} '
+                f'{before_time / after_time:>10.1f}'
+            )
+
+    def bench_pdf_to_docx(self, options):
+        try:
+            worker_counts = [int(workers) for workers in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers must be a comma-separated list of integers')
+
+        pages = options['pages'] or 200
+        self.stdout.write(f"Converting {pages}-page PDFs to DOCX, best of {options['repeat']}")
+        self.stdout.write(f"{'fixture':>10} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'DOCX KB':>9}")
+
+        for name, data in pdf_corpus(pages):
+            with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf_file:
+                pdf_file.write(data)
+                pdf_file.flush()
+
+                for workers in worker_counts:
+                    pool_workers = {**getattr(settings, 'TOOL_POOL_WORKERS', {}), 'pdf_text': workers}
+                    with override_settings(TOOL_POOL_WORKERS=pool_workers, PDF_TEXT_MAX_PAGES=pages):
+                        # Start a pool of this size; the first (slowest) run warms it up
+                        shutdown_pools()
+
+                        def convert():
+                            with open(pdf_file.name, 'rb') as source, tempfile.TemporaryFile() as output:
+                                convert_pdf_to_docx_file(source, output, workers=workers)
+                                return output.tell()
+
+                        elapsed, size = self._best_time(convert, options['repeat'])
+                    self.stdout.write(
+                        f'{name:>10} {workers:>8} {elapsed:>9.2f} {pages / elapsed:>9.1f} {size / 1024:>9.1f}'
+                    )
+        shutdown_pools()
+
+    def bench_text_pdf(self, options):
+        try:
+            worker_counts = [int(workers) for workers in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers must be a comma-separated list of integers')
+
+        text = synthetic_log(options['pages'] or 10000)
+        self.stdout.write(
+            f"Rendering {len(text) / 1e6:.1f} MB of log text to PDF on {os.cpu_count()} CPU(s), "
+            f"best of {options['repeat']}"
+        )
+        self.stdout.write(f"{'mode':>10} {'workers':>8} {'pages':>7} {'seconds':>9} {'pages/s':>9} {'speed-up':>9}")
+
+        def render(func, *args):
+            with tempfile.TemporaryFile() as output:
+                return func(text, 'Server log', output, *args)
+
+        serial_time, pages = self._best_time(lambda: render(render_text_pdf), options['repeat'])
+        self.stdout.write(
+            f"{'serial':>10} {1:>8} {pages:>7} {serial_time:>9.2f} {pages / serial_time:>9.0f} {1.0:>9.2f}"
+        )
+
+        for workers in worker_counts:
+            pool_workers = {**getattr(settings, 'TOOL_POOL_WORKERS', {}), 'pdf_pages': workers}
+            with override_settings(TOOL_POOL_WORKERS=pool_workers):
+                # Start a pool of this size; the first (slowest) run warms it up
+                shutdown_pools()
+                elapsed, pages = self._best_time(lambda: render(render_text_pdf_parallel, workers), options['repeat'])
+            self.stdout.write(
+                f"{'parallel':>10} {workers:>8} {pages:>7} {elapsed:>9.2f} {pages / elapsed:>9.0f} "
+                f"{serial_time / elapsed:>9.2f}"
+            )
+        shutdown_pools()
@@ -0,0 +1,84 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tool_app.jobs import requeue_stale_jobs, run_worker
+
+
+def worker_main(poll_interval):
+    """Entry point for a single worker process"""
+    # Never share the parent's database connections across a fork
+    connections.close_all()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    run_worker(poll_interval=poll_interval, stop_event=stop_event)
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker processes that process queued file conversions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=getattr(settings, 'CONVERSION_WORKER_PROCESSES', 2),
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'CONVERSION_WORKER_POLL_INTERVAL', 1.0),
+            help='Seconds to wait between queue polls when idle',
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        connections.close_all()
+        workers = []
+        for _ in range(processes):
+            workers.append(self._spawn(poll_interval))
+        self.stdout.write(self.style.SUCCESS(f'Started {processes} conversion worker(s)'))
+
+        try:
+            while not stopping:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(f'Requeued {requeued} stale conversion job(s)')
+
+                # Replace workers that crashed
+                for i, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        self.stdout.write(f'Worker {worker.pid} exited, restarting')
+                        connections.close_all()
+                        workers[i] = self._spawn(poll_interval)
+
+                time.sleep(5)
+        finally:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join(timeout=30)
+            self.stdout.write('Conversion workers stopped')
+
+    def _spawn(self, poll_interval):
+        # Not a daemon, so jobs can use the tool pools; handle() terminates and joins every worker
+        worker = multiprocessing.Process(target=worker_main, args=(poll_interval,))
+        worker.start()
+        return worker
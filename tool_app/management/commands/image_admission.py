@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tool_app.imaging import admission_stats, reset_admission_stats
+
+
+class Command(BaseCommand):
+    help = 'Show how many uploaded images were admitted, downsampled or rejected'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters to zero')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_admission_stats()
+            self.stdout.write(self.style.SUCCESS('Image admission counters reset'))
+
+        stats = admission_stats()
+        self.stdout.write(f"Policy:      {getattr(settings, 'IMAGE_OVERSIZE_POLICY', 'downsample')}")
+        self.stdout.write(f"Pixel limit: {getattr(settings, 'IMAGE_MAX_PIXELS', 40_000_000)}")
+        self.stdout.write(f"Admitted:    {stats['admitted']}")
+        self.stdout.write(f"Downsampled: {stats['downsampled']}")
+        self.stdout.write(f"Rejected:    {stats['rejected']}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from tool_app.result_cache import cache_stats, clear_cache, evict_entries
+
+
+class Command(BaseCommand):
+    help = 'Show statistics for the conversion result cache, or clear it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Remove every cached result')
+        parser.add_argument('--evict', action='store_true', help='Evict entries until the cache fits its size budget')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            removed = clear_cache()
+            self.stdout.write(self.style.SUCCESS(f'Removed {removed} cached result(s)'))
+        elif options['evict']:
+            removed = evict_entries()
+            self.stdout.write(self.style.SUCCESS(f'Evicted {removed} cached result(s)'))
+
+        stats = cache_stats()
+        self.stdout.write(f"Entries:  {stats['entries']}")
+        self.stdout.write(f"Size:     {stats['size_bytes']} / {stats['max_bytes']} bytes")
+        self.stdout.write(f"Hits:     {stats['hits']}")
+        self.stdout.write(f"Misses:   {stats['misses']}")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1%}")
@@ -0,0 +1,353 @@
+"""
+ffmpeg/ffprobe helpers for streaming audio and video processing.
+
+Inputs are handed to ffmpeg by path when Django already spooled the upload to
+disk, and otherwise piped through stdin in upload-sized chunks. Outputs are
+written by ffmpeg straight to their destination file, so no step holds the
+decoded track in memory.
+"""
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .result_cache import hash_file
+
+
+# ffmpeg muxer and encoder for each output format offered by the forms
+AUDIO_OUTPUT_FORMATS = {
+    'mp3': {'format': 'mp3', 'codec': 'libmp3lame'},
+    'wav': {'format': 'wav', 'codec': 'pcm_s16le'},
+    'flac': {'format': 'flac', 'codec': 'flac'},
+    'aac': {'format': 'adts', 'codec': 'aac'},
+    'ogg': {'format': 'ogg', 'codec': 'libvorbis'},
+    'm4a': {'format': 'ipod', 'codec': 'aac'},
+}
+
+LOSSY_AUDIO_FORMATS = ['mp3', 'aac', 'ogg', 'm4a']
+
+# Source codecs that each output format can take as-is, without re-encoding
+STREAM_COPY_CODECS = {
+    'aac': ['aac'],
+    'm4a': ['aac', 'alac'],
+    'mp3': ['mp3'],
+    'flac': ['flac'],
+    'ogg': ['vorbis', 'opus'],
+}
+
+# Containers whose index may sit at the end of the file and cannot be read from a pipe
+SEEKABLE_INPUT_EXTENSIONS = ['m4a', 'mp4', 'm4v', 'mov', '3gp']
+
+CHUNK_SIZE = 64 * 1024
+
+# Raw PCM layout used when piping decoded samples in and out of ffmpeg
+PCM_FORMAT = 's16le'
+PCM_CODEC = 'pcm_s16le'
+
+
+class MediaError(Exception):
+    """Raised when ffmpeg or ffprobe cannot process a file"""
+
+
+def get_ffmpeg_binary():
+    return getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+
+
+def get_ffprobe_binary():
+    return getattr(settings, 'FFPROBE_BINARY', 'ffprobe')
+
+
+def _iter_file_chunks(file_obj):
+    if hasattr(file_obj, 'chunks'):
+        yield from file_obj.chunks(CHUNK_SIZE)
+    else:
+        file_obj.seek(0)
+        yield from iter(lambda: file_obj.read(CHUNK_SIZE), b'')
+
+
+@contextmanager
+def media_input(source):
+    """Yield (input_arg, chunks) for ffmpeg: a file path, or ``pipe:0`` and the chunks to feed it"""
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source), None
+        return
+
+    # Large uploads are already on disk; let ffmpeg read them in place
+    if hasattr(source, 'temporary_file_path'):
+        yield source.temporary_file_path(), None
+        return
+
+    extension = source.name.rsplit('.', 1)[-1].lower() if getattr(source, 'name', None) else ''
+    if extension in SEEKABLE_INPUT_EXTENSIONS:
+        with tempfile.NamedTemporaryFile(suffix=f'.{extension}') as temp_input:
+            for chunk in _iter_file_chunks(source):
+                temp_input.write(chunk)
+            temp_input.flush()
+            yield temp_input.name, None
+        return
+
+    yield 'pipe:0', _iter_file_chunks(source)
+
+
+def _error_message(stderr, args):
+    stderr.seek(0)
+    message = stderr.read().decode('utf-8', errors='replace').strip().splitlines()
+    return message[-1] if message else f'{os.path.basename(args[0])} failed'
+
+
+def _feed_stdin(process, chunks):
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+    except (BrokenPipeError, ValueError):
+        # The process has read all it needs (e.g. a header probe) or was killed
+        pass
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def run_media_process(args, chunks=None, timeout=None):
+    """Run ffmpeg/ffprobe, streaming chunks to stdin; returns stdout bytes"""
+    if timeout is None:
+        timeout = getattr(settings, 'MEDIA_PROCESS_TIMEOUT', 300)
+
+    # stdout/stderr go to temp files so a chatty process can never block on a full pipe
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        try:
+            process = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE if chunks is not None else subprocess.DEVNULL,
+                stdout=stdout,
+                stderr=stderr,
+            )
+        except FileNotFoundError:
+            raise MediaError(f'{args[0]} is not installed or not on PATH')
+
+        try:
+            if chunks is not None:
+                _feed_stdin(process, chunks)
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise MediaError(f'{os.path.basename(args[0])} timed out after {timeout} seconds')
+
+        if returncode != 0:
+            raise MediaError(_error_message(stderr, args))
+
+        stdout.seek(0)
+        return stdout.read()
+
+
+def iter_pcm(source, sample_rate, channels, timeout=None):
+    """Yield the first audio track of source as raw s16le PCM while ffmpeg decodes it"""
+    if timeout is None:
+        timeout = getattr(settings, 'MEDIA_PROCESS_TIMEOUT', 300)
+
+    with media_input(source) as (input_arg, chunks), tempfile.TemporaryFile() as stderr:
+        args = [
+            get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error',
+            '-i', input_arg,
+            '-map', '0:a:0', '-vn',
+            '-f', PCM_FORMAT, '-c:a', PCM_CODEC,
+            '-ac', str(channels), '-ar', str(sample_rate),
+            'pipe:1',
+        ]
+        try:
+            process = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE if chunks is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+            )
+        except FileNotFoundError:
+            raise MediaError(f'{args[0]} is not installed or not on PATH')
+
+        # Input is fed from a thread so the decoder never stalls on a full stdout pipe
+        feeder = None
+        if chunks is not None:
+            feeder = threading.Thread(target=_feed_stdin, args=(process, chunks), daemon=True)
+            feeder.start()
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+
+        try:
+            for data in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+                yield data
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            if feeder is not None:
+                feeder.join()
+
+        if timer.finished.is_set() and returncode < 0:
+            raise MediaError(f'{os.path.basename(args[0])} timed out after {timeout} seconds')
+        if returncode != 0:
+            raise MediaError(_error_message(stderr, args))
+
+
+def probe_media(source):
+    """Read container and stream metadata with ffprobe, without decoding"""
+    with media_input(source) as (input_arg, chunks):
+        output = run_media_process([
+            get_ffprobe_binary(), '-v', 'error',
+            '-print_format', 'json',
+            '-show_format', '-show_streams',
+            input_arg,
+        ], chunks)
+    return json.loads(output or b'{}')
+
+
+def probe_media_cached(source):
+    """probe_media with results cached by content hash, so repeat uploads cost one hash"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            content_hash = hash_file(f)
+    else:
+        content_hash = hash_file(source)
+
+    cache_key = f'media_probe:{content_hash}'
+    probe = cache.get(cache_key)
+    if probe is None:
+        probe = probe_media(source)
+        cache.set(cache_key, probe, timeout=getattr(settings, 'MEDIA_PROBE_CACHE_TTL', 24 * 60 * 60))
+    return probe
+
+
+def _first_stream(probe, codec_type):
+    return next((s for s in probe.get('streams', []) if s.get('codec_type') == codec_type), None)
+
+
+def _parse_frame_rate(rate):
+    """Turn an ffprobe rate such as '30000/1001' into frames per second"""
+    try:
+        numerator, denominator = (rate or '0/1').split('/')
+        return round(int(numerator) / int(denominator), 3) if int(denominator) else 0.0
+    except ValueError:
+        return 0.0
+
+
+def audio_info_from_probe(probe):
+    """Duration, channel, sample-rate and bitrate details for the first audio stream"""
+    audio_stream = _first_stream(probe, 'audio')
+    if audio_stream is None:
+        raise MediaError('No audio stream found in file')
+
+    container = probe.get('format', {})
+    duration = audio_stream.get('duration') or container.get('duration')
+    bit_rate = audio_stream.get('bit_rate') or container.get('bit_rate')
+    return {
+        'duration': round(float(duration), 3) if duration else 0.0,
+        'channels': audio_stream.get('channels'),
+        'sample_rate': int(audio_stream['sample_rate']) if audio_stream.get('sample_rate') else None,
+        'bitrate': int(bit_rate) // 1000 if bit_rate else 'Unknown',
+        'codec': audio_stream.get('codec_name'),
+    }
+
+
+def video_info_from_probe(probe):
+    """Duration, frame rate, dimensions and codecs of a video file"""
+    video_stream = _first_stream(probe, 'video')
+    if video_stream is None:
+        raise MediaError('No video stream found in file')
+
+    audio_stream = _first_stream(probe, 'audio')
+    duration = probe.get('format', {}).get('duration') or video_stream.get('duration')
+    return {
+        'duration': round(float(duration), 3) if duration else 0.0,
+        'fps': _parse_frame_rate(video_stream.get('avg_frame_rate') or video_stream.get('r_frame_rate')),
+        'size': [video_stream.get('width'), video_stream.get('height')],
+        'has_audio': audio_stream is not None,
+        'video_codec': video_stream.get('codec_name'),
+        'audio_codec': audio_stream.get('codec_name') if audio_stream else None,
+    }
+
+
+def media_info_from_probe(probe):
+    """Summary of a probed file for the media info API"""
+    container = probe.get('format', {})
+    duration = container.get('duration')
+    bit_rate = container.get('bit_rate')
+    info = {
+        'format': container.get('format_name'),
+        'format_long_name': container.get('format_long_name'),
+        'duration': round(float(duration), 3) if duration else None,
+        'size': int(container['size']) if container.get('size') else None,
+        'bitrate': int(bit_rate) // 1000 if bit_rate else None,
+        'audio': None,
+        'video': None,
+    }
+    if _first_stream(probe, 'audio'):
+        info['audio'] = audio_info_from_probe(probe)
+    if _first_stream(probe, 'video'):
+        info['video'] = video_info_from_probe(probe)
+    return info
+
+
+def _audio_codec_args(target_format, bitrate=None):
+    """ffmpeg encoder arguments for one of AUDIO_OUTPUT_FORMATS"""
+    args = ['-c:a', AUDIO_OUTPUT_FORMATS[target_format]['codec']]
+    if bitrate and target_format in LOSSY_AUDIO_FORMATS:
+        args += ['-b:a', f'{bitrate}k']
+    return args
+
+
+def can_stream_copy(source_codec, target_format):
+    """Whether the source audio codec can be remuxed into target_format unchanged"""
+    return source_codec in STREAM_COPY_CODECS.get(target_format, [])
+
+
+def transcode_audio(source, output_path, target_format, bitrate=None, start=None, end=None, stream_copy=False):
+    """Stream the first audio track of source through ffmpeg into output_path
+
+    start/end (seconds) seek in the input instead of decoding from zero, and
+    stream_copy remuxes the existing audio packets without re-encoding them.
+    """
+    if target_format not in AUDIO_OUTPUT_FORMATS:
+        raise MediaError(f'Unsupported audio format: {target_format}')
+    output = AUDIO_OUTPUT_FORMATS[target_format]
+
+    with media_input(source) as (input_arg, chunks):
+        args = [get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y']
+        if start:
+            args += ['-ss', str(start)]
+        args += ['-i', input_arg]
+        if end is not None:
+            args += ['-t', str(end - (start or 0))]
+        args += ['-map', '0:a:0', '-vn', '-sn', '-dn']
+        if stream_copy:
+            args += ['-c:a', 'copy']
+        else:
+            args += _audio_codec_args(target_format, bitrate)
+        args += ['-f', output['format'], output_path]
+        run_media_process(args, chunks)
+
+    return output_path
+
+
+def encode_pcm(pcm_chunks, output_path, target_format, sample_rate, channels, bitrate=None):
+    """Encode raw s16le PCM chunks into output_path as they are produced"""
+    if target_format not in AUDIO_OUTPUT_FORMATS:
+        raise MediaError(f'Unsupported audio format: {target_format}')
+
+    args = [
+        get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', PCM_FORMAT, '-ac', str(channels), '-ar', str(sample_rate),
+        '-i', 'pipe:0',
+    ]
+    args += _audio_codec_args(target_format, bitrate)
+    args += ['-f', AUDIO_OUTPUT_FORMATS[target_format]['format'], output_path]
+    run_media_process(args, pcm_chunks)
+    return output_path
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tool_app', '0005_newsletter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileconversion',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Job progress in percent'),
+        ),
+        migrations.AddField(
+            model_name='fileconversion',
+            name='started_at',
+            field=models.DateTimeField(blank=True, help_text='When a worker picked up the job', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tool_app', '0006_fileconversion_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileconversion',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Times a worker has claimed the job'),
+        ),
+    ]
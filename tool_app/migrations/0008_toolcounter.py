@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tool_app', '0007_fileconversion_attempts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -42,6 +42,9 @@ class FileConversion(models.Model):
     converted_file = models.FileField(upload_to=upload_to_files, blank=True, null=True)
     conversion_type = models.CharField(max_length=30, choices=CONVERSION_TYPES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Job progress in percent")
+    started_at = models.DateTimeField(blank=True, null=True, help_text="When a worker picked up the job")
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Times a worker has claimed the job")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True)
@@ -61,6 +64,15 @@ class FileConversion(models.Model):
         return os.path.basename(self.converted_file.name) if self.converted_file else None
 
 
+class ToolCounter(models.Model):
+    """Named counter shared by every process (cache hits, image admission decisions)"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
 class Newsletter(models.Model):
     """Model to store newsletter email subscriptions"""
     email = models.EmailField(unique=True, help_text="Email address for newsletter subscription")
@@ -0,0 +1,252 @@
+"""
+Layout-aware PDF to DOCX conversion, written page by page.
+
+Each page's text fragments are collected with their position, size and font,
+grouped into lines by baseline and lines into blocks by spacing, indentation
+and style, and every block becomes a paragraph: larger-than-body blocks become
+headings, bold and italic fonts carry over to the run. Pages are parsed in
+parallel by the 'pdf_text' tool pool (see ``pdf_text.iter_pages``) and come
+back in order.
+
+python-docx keeps the whole document tree in memory, so it is only used once
+per process to produce the package template (styles, settings, relationships).
+``DocxStreamWriter`` copies those parts into the output archive and streams
+word/document.xml one page of paragraphs at a time.
+"""
+import math
+import os
+import re
+import time
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+from statistics import median
+from xml.sax.saxutils import escape
+
+from docx import Document
+
+from .executor import get_pool_workers
+from .pdf_text import (
+    NO_TEXT_NOTE, get_max_pages, get_time_budget, iter_pages, open_pdf, source_path, stop_note, stop_reason,
+    worker_reader,
+)
+
+
+DOCUMENT_PART = 'word/document.xml'
+
+# Blocks this much larger than the page's body text become Heading 1 / Heading 2
+HEADING_RATIOS = [(1.5, 'Heading1'), (1.2, 'Heading2')]
+
+# Baselines further apart than this many font sizes start a new paragraph
+PARAGRAPH_GAP = 1.6
+
+# A line shorter than this fraction of the widest line in its paragraph ends it
+SHORT_LINE = 0.6
+
+# XML 1.0 cannot hold these, and PDF text occasionally does
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _font_style(font_dict):
+    name = str((font_dict or {}).get('/BaseFont', '')).lower()
+    return 'bold' in name or 'black' in name or 'heavy' in name, 'italic' in name or 'oblique' in name
+
+
+def _page_lines(page):
+    """(baseline y, x, font size, bold, italic, text) for each line of a page, top to bottom"""
+    fragments = []
+
+    def visit(text, cm, tm, font_dict, font_size):
+        if not text.strip():
+            return
+        x = cm[0] * tm[4] + cm[2] * tm[5] + cm[4]
+        y = cm[1] * tm[4] + cm[3] * tm[5] + cm[5]
+        size = font_size * math.hypot(tm[2], tm[3]) * math.hypot(cm[2], cm[3])
+        bold, italic = _font_style(font_dict)
+        # A fragment can span several lines when pypdf flushes late
+        for offset, line in enumerate(text.split('\n')):
+            if line.strip():
+                fragments.append((y - offset * size * 1.2, x, size or 1.0, bold, italic, line))
+
+    page.extract_text(visitor_text=visit)
+
+    lines = []
+    for fragment in sorted(fragments, key=lambda f: (-f[0], f[1])):
+        y, x, size, bold, italic, text = fragment
+        if lines and abs(lines[-1][0] - y) < 0.5 * min(size, lines[-1][2]):
+            # Same baseline: font changes within a line split it into fragments
+            last = lines[-1]
+            lines[-1] = (last[0], last[1], max(last[2], size), last[3] and bold, last[4] and italic, last[5] + text)
+        else:
+            lines.append(fragment)
+    return lines
+
+
+def _join_lines(texts):
+    """Join wrapped lines into one paragraph, undoing hyphenation at line ends"""
+    joined = ''
+    for text in texts:
+        text = text.strip()
+        if not joined:
+            joined = text
+        elif joined.endswith('-') and text[:1].islower():
+            joined = joined[:-1] + text
+        else:
+            joined += ' ' + text
+    return joined
+
+
+def page_blocks(page):
+    """(style, text, bold, italic) for each paragraph of a page in reading order
+
+    style is 'Normal', 'Heading1' or 'Heading2'.
+    """
+    lines = _page_lines(page)
+    if not lines:
+        return []
+
+    # Body size: the size most of the page's characters are set in
+    body_size = median(size for y, x, size, bold, italic, text in lines for _ in range(len(text)))
+
+    groups = []
+    for line in lines:
+        y, x, size, bold, italic, text = line
+        if groups:
+            previous = groups[-1][-1]
+            same_style = abs(previous[2] - size) < 0.1 * size and previous[3:5] == (bold, italic)
+            close = previous[0] - y <= PARAGRAPH_GAP * max(size, previous[2])
+            # An indented line, or any line after one that stopped well short, opens a new paragraph
+            indented = len(groups[-1]) > 1 and x > previous[1] + size
+            widest = max(len(other[5]) for other in groups[-1])
+            ended = len(groups[-1]) > 1 and len(previous[5].rstrip()) < SHORT_LINE * widest
+            if same_style and close and not indented and not ended:
+                groups[-1].append(line)
+                continue
+        groups.append([line])
+
+    blocks = []
+    for group in groups:
+        size, bold, italic = group[0][2:5]
+        style = 'Normal'
+        for ratio, heading in HEADING_RATIOS:
+            if size >= ratio * body_size:
+                style = heading
+                break
+        blocks.append((style, _join_lines(line[5] for line in group), bold, italic))
+    return blocks
+
+
+def extract_page_blocks(path, start, stop, deadline=None):
+    """page_blocks for pages [start, stop) of the PDF at path, stopping early once deadline passes"""
+    reader = worker_reader(path)
+    pages = []
+    for index in range(start, stop):
+        if deadline is not None and time.time() > deadline:
+            break
+        try:
+            pages.append(page_blocks(reader.pages[index]))
+        except Exception as e:
+            print(f"PDF layout extraction error on page {index + 1}: {e}")
+            pages.append([])
+    return pages
+
+
+@lru_cache(maxsize=None)
+def _template():
+    """([(name, data)] parts of an empty python-docx document, document.xml head, tail)"""
+    buffer = BytesIO()
+    Document().save(buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        parts = [(name, archive.read(name)) for name in archive.namelist()]
+
+    document = dict(parts)[DOCUMENT_PART].decode('utf-8')
+    body = document.index('<w:body>') + len('<w:body>')
+    section = document.index('<w:sectPr', body)
+    return parts, document[:body].encode('utf-8'), document[section:].encode('utf-8')
+
+
+def paragraph_xml(text, style='Normal', bold=False, italic=False):
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style != 'Normal' else ''
+    run_properties = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+    if run_properties:
+        run_properties = f'<w:rPr>{run_properties}</w:rPr>'
+    text = escape(_INVALID_XML.sub('', text))
+    return f'<w:p>{properties}<w:r>{run_properties}<w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+
+
+class DocxStreamWriter:
+    """Write a DOCX to a seekable binary file, streaming the document body
+
+    The package parts come from python-docx's default template, so styles
+    such as Heading 1 exist; paragraphs are appended with ``add_page`` and
+    ``add_paragraph`` and compressed as they are written.
+    """
+
+    def __init__(self, fp):
+        parts, self.head, self.tail = _template()
+        self.archive = zipfile.ZipFile(fp, 'w', zipfile.ZIP_DEFLATED)
+        names = [name for name, data in parts]
+        split = names.index(DOCUMENT_PART)
+        for name, data in parts[:split]:
+            self.archive.writestr(name, data)
+        self.remaining = parts[split + 1:]
+        self.body = self.archive.open(DOCUMENT_PART, 'w', force_zip64=True)
+        self.body.write(self.head)
+        self.pages = 0
+
+    def add_paragraph(self, text, style='Normal', bold=False, italic=False):
+        self.body.write(paragraph_xml(text, style, bold, italic).encode('utf-8'))
+
+    def add_page(self, blocks):
+        """Append a page of (style, text, bold, italic) blocks, after a page break"""
+        xml = []
+        if self.pages:
+            xml.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        xml.extend(paragraph_xml(text, style, bold, italic) for style, text, bold, italic in blocks)
+        self.body.write(''.join(xml).encode('utf-8'))
+        self.pages += 1
+
+    def close(self):
+        self.body.write(self.tail)
+        self.body.close()
+        for name, data in self.remaining:
+            self.archive.writestr(name, data)
+        self.archive.close()
+
+
+def convert_pdf_to_docx_file(pdf_file, output, max_pages=None, time_budget=None, workers=None):
+    """Write a DOCX of the PDF's text blocks to the seekable binary file output, page by page
+
+    Uses the PDF_TEXT_* page and time budget. Returns the same dict as
+    ``pdf_text.extract_text_to_file``.
+    """
+    max_pages = max_pages or get_max_pages()
+    time_budget = time_budget or get_time_budget()
+    workers = workers or get_pool_workers('pdf_text')
+    deadline = time.time() + time_budget
+
+    writer = DocxStreamWriter(output)
+    path, is_temporary = source_path(pdf_file)
+    try:
+        page_count = len(open_pdf(path).pages)
+        budget_pages = min(page_count, max_pages)
+
+        extracted = 0
+        blocks = 0
+        outcome = {}
+        for page in iter_pages(path, budget_pages, deadline, workers, extract_page_blocks, outcome):
+            writer.add_page(page)
+            extracted += 1
+            blocks += len(page)
+    finally:
+        if is_temporary:
+            os.remove(path)
+
+    stopped = stop_reason(extracted, budget_pages, page_count, outcome)
+    if stopped:
+        writer.add_paragraph(stop_note(extracted, page_count, stopped), italic=True)
+    elif not blocks:
+        writer.add_paragraph(NO_TEXT_NOTE, italic=True)
+    writer.close()
+
+    return {'pages': page_count, 'extracted': extracted, 'stopped': stopped}
@@ -0,0 +1,218 @@
+"""
+Page-parallel text extraction from PDFs.
+
+A document is split into runs of PDF_TEXT_CHUNK_PAGES pages and each run is
+extracted by a worker of the 'pdf_text' tool pool, which opens the PDF from
+its path once per document and only parses the pages it is given. Text is
+written to the output file in page order as soon as the next run is done, with
+at most two runs per worker in flight, so the text of a whole document is never
+held in memory.
+
+Every document gets a budget of PDF_TEXT_MAX_PAGES pages and
+PDF_TEXT_TIME_BUDGET seconds. Workers stop at the first page boundary past the
+deadline, and the output ends with a note saying where extraction stopped and
+why: the page limit, the time limit, or a worker process that failed.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from pypdf import PdfReader
+
+from .executor import ToolPoolError, ToolTimeout, get_pool_workers, submit_to_pool, wait_for_result
+
+
+# Separates the text of consecutive pages in the output
+PAGE_SEPARATOR = '\n\n'
+
+NO_TEXT_NOTE = '[No extractable text found; the PDF may contain only scanned images]'
+
+# Seconds a run may overrun the document deadline before its pool task is cancelled
+DEADLINE_GRACE = 10
+
+# Why extraction ended before the last page, as shown in the closing note
+STOP_REASONS = {
+    'page limit': 'page limit reached',
+    'time limit': 'time limit reached',
+    'worker error': 'a worker process failed',
+}
+
+# Stops caused by load rather than the document; output cut short by one is not cached
+TRANSIENT_STOPS = {'time limit', 'worker error'}
+
+# (key, PdfReader) of the document this process last extracted from
+_reader = None
+
+
+def get_max_pages():
+    return getattr(settings, 'PDF_TEXT_MAX_PAGES', 500)
+
+
+def get_time_budget():
+    return getattr(settings, 'PDF_TEXT_TIME_BUDGET', 120)
+
+
+def get_chunk_pages():
+    return getattr(settings, 'PDF_TEXT_CHUNK_PAGES', 8)
+
+
+def open_pdf(source):
+    """PdfReader for a path or file object, unlocking PDFs encrypted with an empty password"""
+    reader = PdfReader(source)
+    if reader.is_encrypted:
+        reader.decrypt('')
+    return reader
+
+
+def worker_reader(path):
+    """The PdfReader for path, parsed once per worker process for all the runs it is given"""
+    global _reader
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if _reader is None or _reader[0] != key:
+        _reader = (key, open_pdf(path))
+    return _reader[1]
+
+
+def extract_pages(path, start, stop, deadline=None):
+    """Text of pages [start, stop) of the PDF at path, stopping early once deadline (epoch seconds) passes"""
+    reader = worker_reader(path)
+    texts = []
+    for index in range(start, stop):
+        if deadline is not None and time.time() > deadline:
+            break
+        try:
+            texts.append(reader.pages[index].extract_text() or '')
+        except Exception as e:
+            # One malformed page should not cost the rest of the document
+            print(f"PDF text extraction error on page {index + 1}: {e}")
+            texts.append('')
+    return texts
+
+
+def source_path(pdf_file):
+    """(path, is_temporary) of a file the pool workers can open by name"""
+    for attribute in ('temporary_file_path', 'path'):
+        try:
+            value = getattr(pdf_file, attribute)
+            path = value() if callable(value) else value
+        except (AttributeError, NotImplementedError, ValueError):
+            continue
+        if path and os.path.exists(path):
+            return path, False
+
+    # In-memory uploads or remote storage: spool to disk once, rather than pickling bytes per run
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    with os.fdopen(fd, 'wb') as f:
+        pdf_file.seek(0)
+        shutil.copyfileobj(pdf_file, f)
+    pdf_file.seek(0)
+    return path, True
+
+
+def _page_runs(page_count, chunk_pages):
+    return [(start, min(start + chunk_pages, page_count)) for start in range(0, page_count, chunk_pages)]
+
+
+def iter_pages(path, page_count, deadline, workers, extract=extract_pages, outcome=None):
+    """Yield extract's result for each page in order, extracting runs of pages in parallel
+
+    extract(path, start, stop, deadline) returns one item per page and must
+    be a module-level function so it can be sent to the pool. Stops early
+    when a run comes back short or is cancelled after the deadline passed,
+    or when a worker crashes; outcome (a dict), when given, gets 'stopped'
+    set to 'time limit' or 'worker error' accordingly.
+    """
+    outcome = {} if outcome is None else outcome
+    runs = _page_runs(page_count, get_chunk_pages())
+    if workers <= 1 or len(runs) == 1:
+        # Not worth a round trip through the pool
+        pages = extract(path, 0, page_count, deadline)
+        if len(pages) < page_count:
+            outcome['stopped'] = 'time limit'
+        yield from pages
+        return
+
+    pending = []
+    next_run = 0
+    try:
+        while next_run < len(runs) or pending:
+            while next_run < len(runs) and len(pending) < 2 * workers and time.time() < deadline:
+                start, stop = runs[next_run]
+                pending.append((stop - start, submit_to_pool('pdf_text', extract, path, start, stop, deadline)))
+                next_run += 1
+            if not pending:
+                outcome['stopped'] = 'time limit'
+                return
+
+            expected, future = pending.pop(0)
+            try:
+                texts = wait_for_result(future, max(deadline - time.time(), 0) + DEADLINE_GRACE)
+            except ToolPoolError as e:
+                print(f"PDF text extraction stopped: {e}")
+                outcome['stopped'] = 'time limit' if isinstance(e, ToolTimeout) else 'worker error'
+                return
+            yield from texts
+            if len(texts) < expected:
+                outcome['stopped'] = 'time limit'
+                return
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def stop_reason(extracted, budget_pages, page_count, outcome=None):
+    """Why extraction ended before the last page ('time limit', 'worker error' or 'page limit'), or None
+
+    outcome is the dict iter_pages filled in.
+    """
+    if extracted < budget_pages:
+        return (outcome or {}).get('stopped', 'time limit')
+    if extracted < page_count:
+        return 'page limit'
+    return None
+
+
+def stop_note(extracted, page_count, reason):
+    return f'[Text extraction stopped after {extracted} of {page_count} pages: {STOP_REASONS[reason]}]'
+
+
+def extract_text_to_file(pdf_file, output, max_pages=None, time_budget=None, workers=None):
+    """Write the text of a PDF to the binary file output as UTF-8, page by page
+
+    Returns a dict with the document's page count, the number of pages
+    extracted and, when it stopped early, the reason ('page limit',
+    'time limit' or 'worker error').
+    """
+    max_pages = max_pages or get_max_pages()
+    time_budget = time_budget or get_time_budget()
+    workers = workers or get_pool_workers('pdf_text')
+    deadline = time.time() + time_budget
+
+    path, is_temporary = source_path(pdf_file)
+    try:
+        page_count = len(open_pdf(path).pages)
+        budget_pages = min(page_count, max_pages)
+
+        extracted = 0
+        characters = 0
+        outcome = {}
+        for text in iter_pages(path, budget_pages, deadline, workers, outcome=outcome):
+            if extracted:
+                output.write(PAGE_SEPARATOR.encode('utf-8'))
+            output.write(text.encode('utf-8'))
+            extracted += 1
+            characters += len(text.strip())
+    finally:
+        if is_temporary:
+            os.remove(path)
+
+    stopped = stop_reason(extracted, budget_pages, page_count, outcome)
+    if stopped:
+        output.write(f'\n\n{stop_note(extracted, page_count, stopped)}\n'.encode('utf-8'))
+    elif not characters:
+        output.write(f'{NO_TEXT_NOTE}\n'.encode('utf-8'))
+
+    return {'pages': page_count, 'extracted': extracted, 'stopped': stopped}
@@ -0,0 +1,179 @@
+"""
+Size-optimizing PNG encoder.
+
+``optimize_png`` first applies lossless reductions: an opaque alpha channel is
+dropped, RGB that is really grey becomes greyscale, and images with at most 256
+colours get an exact palette (packed to 1, 2 or 4 bits when there are 16 or
+fewer). It then encodes the candidates with several PNG filter and zlib
+strategies and keeps the smallest file. Encodes run cheapest and most likely
+first and stop once IMAGE_PNG_OPTIMIZE_BUDGET seconds have been spent, so a
+large photo costs a couple of attempts rather than stalling an image worker.
+"""
+import time
+import zlib
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageChops
+
+from .imaging import PngBandWriter
+
+
+# Modes Pillow writes as PNG without converting
+PNG_SAVE_MODES = ('1', 'L', 'LA', 'I;16', 'P', 'RGB', 'RGBA')
+
+
+def get_time_budget():
+    return getattr(settings, 'IMAGE_PNG_OPTIMIZE_BUDGET', 2.0)
+
+
+def _is_grey(image):
+    red, green, blue = image.split()[:3]
+    return ImageChops.difference(red, green).getbbox() is None and ImageChops.difference(green, blue).getbbox() is None
+
+
+def reduce_image(image):
+    """Losslessly reduce an image to the smallest PNG colour type that holds it"""
+    if image.mode == 'P':
+        # Rebuilt below from the real colours, which also drops unused entries
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode == '1':
+        image = image.convert('L')
+    elif image.mode == 'I' and 0 <= min(image.getextrema()) and max(image.getextrema()) <= 0xFFFF:
+        image = image.convert('I;16')
+    elif image.mode not in ('L', 'LA', 'RGB', 'RGBA', 'I;16'):
+        image = image.convert('RGBA' if 'A' in image.mode else 'RGB')
+
+    if image.mode in ('LA', 'RGBA') and image.getchannel('A').getextrema() == (255, 255):
+        image = image.convert(image.mode[:-1])
+    if image.mode in ('RGB', 'RGBA') and _is_grey(image):
+        image = image.convert('LA' if image.mode == 'RGBA' else 'L')
+    return image
+
+
+def to_palette(image, max_colors=256):
+    """Exact palette version of an L, LA, RGB or RGBA image, or None if it has too many colours
+
+    Entries are ordered transparent first (so tRNS stays short), then by
+    frequency.
+    """
+    if image.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        return None
+    colours = image.getcolors(max_colors)
+    if colours is None:
+        return None
+
+    entries = [(_as_rgba(colour, image.mode), count) for count, colour in colours]
+    entries.sort(key=lambda entry: (entry[0][3] == 255, -entry[1]))
+
+    # Match pixels to entries through their RGBA bytes read as one 32-bit key
+    rgba = image.convert('RGBA')
+    pixels = np.asarray(rgba).view('<u4').reshape(rgba.size[1], rgba.size[0])
+    keys = np.array([int.from_bytes(bytes(value), 'little') for value, count in entries], dtype='<u4')
+    order = np.argsort(keys)
+    indices = order[np.searchsorted(keys[order], pixels)].astype(np.uint8)
+
+    palette_image = Image.frombytes('P', image.size, indices.tobytes())
+    palette_image.putpalette([channel for value, count in entries for channel in value[:3]])
+    alphas = [value[3] for value, count in entries]
+    if min(alphas) < 255:
+        last = max(index for index, alpha in enumerate(alphas) if alpha < 255)
+        palette_image.info['transparency'] = bytes(alphas[:last + 1])
+    return palette_image
+
+
+def _as_rgba(colour, mode):
+    if mode == 'L':
+        return (colour, colour, colour, 255)
+    if mode == 'LA':
+        return (colour[0], colour[0], colour[0], colour[1])
+    if mode == 'RGB':
+        return tuple(colour) + (255,)
+    return tuple(colour)
+
+
+def _pillow_encode(image, strategy, icc_profile):
+    buffer = BytesIO()
+    options = {'optimize': True, 'compress_type': strategy}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    if 'transparency' in image.info:
+        options['transparency'] = image.info['transparency']
+    image.save(buffer, format='PNG', **options)
+    return buffer
+
+
+def _filtered_encode(image, filter_type, strategy, icc_profile):
+    buffer = BytesIO()
+    writer = PngBandWriter(buffer, image.size, compress_level=9, filter_type=filter_type,
+                           strategy=strategy, icc_profile=icc_profile)
+    writer.write(image)
+    writer.close()
+    return buffer
+
+
+def _candidates(image, reduced, palette):
+    """(label, encode) pairs, most promising first, starting with the plain Pillow encode"""
+    if image.mode in PNG_SAVE_MODES:
+        yield 'original', lambda icc: _pillow_encode(image, zlib.Z_DEFAULT_STRATEGY, icc)
+
+    if palette is not None:
+        yield 'palette', lambda icc: _pillow_encode(palette, zlib.Z_DEFAULT_STRATEGY, icc)
+        for filter_type in ('up', 'paeth'):
+            yield f'palette, {filter_type} filter', (
+                lambda icc, filter_type=filter_type: _filtered_encode(palette, filter_type, zlib.Z_DEFAULT_STRATEGY, icc)
+            )
+        if len(palette.getpalette()) // 3 <= 16:
+            # Packed below 8 bits per pixel; the 8-bit encodes below cannot win
+            return
+    if reduced.mode != image.mode or image.mode not in PNG_SAVE_MODES:
+        yield f'{reduced.mode}', lambda icc: _pillow_encode(reduced, zlib.Z_DEFAULT_STRATEGY, icc)
+
+    # Adaptive filtering with the other zlib strategies, then fixed filters
+    yield f'{reduced.mode}, filtered strategy', lambda icc: _pillow_encode(reduced, zlib.Z_FILTERED, icc)
+    yield f'{reduced.mode}, rle strategy', lambda icc: _pillow_encode(reduced, zlib.Z_RLE, icc)
+    for filter_type in ('paeth', 'up', 'sub', 'none'):
+        yield f'{reduced.mode}, {filter_type} filter', (
+            lambda icc, filter_type=filter_type: _filtered_encode(reduced, filter_type, zlib.Z_DEFAULT_STRATEGY, icc)
+        )
+
+
+def optimize_png(image, time_budget=None):
+    """Encode image as the smallest PNG found within time_budget seconds
+
+    Every candidate is lossless. The plain Pillow encode (what the tools
+    produced before) is tried first, so the result is never larger.
+    Returns (buffer, info).
+    """
+    if time_budget is None:
+        time_budget = get_time_budget()
+    start = time.perf_counter()
+    icc_profile = image.info.get('icc_profile')
+
+    reduced = reduce_image(image)
+    # Greyscale only gains from a palette when it can be packed below 8 bits
+    palette = to_palette(reduced, 16 if reduced.mode == 'L' else 256)
+
+    best, best_label, baseline, attempts = None, None, None, 0
+    for label, encode in _candidates(image, reduced, palette):
+        if best is not None and time.perf_counter() - start > time_budget:
+            break
+        buffer = encode(icc_profile)
+        attempts += 1
+        size = buffer.getbuffer().nbytes
+        if baseline is None:
+            baseline = size
+        if best is None or size < best.getbuffer().nbytes:
+            best, best_label = buffer, label
+
+    best.seek(0)
+    size = best.getbuffer().nbytes
+    return best, {
+        'size': size,
+        'baseline_size': baseline,
+        'saved': baseline - size,
+        'choice': best_label,
+        'attempts': attempts,
+        'elapsed': round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,276 @@
+"""
+Content-addressed cache for file and image conversion results.
+
+Outputs are stored under ``MEDIA_ROOT/<RESULT_CACHE_DIR>`` keyed by a SHA-256
+of the input bytes plus the conversion parameters, so re-uploading the same
+file with the same settings skips the conversion entirely. Entries are evicted
+least recently used first once the cache grows past RESULT_CACHE_MAX_BYTES.
+
+Measuring the cache means walking it, so each process keeps a running
+estimate of its size instead: writes add to it, and the cache is only walked
+when the estimate crosses the budget (eviction then goes down to
+RESULT_CACHE_LOW_WATER of it) or is older than RESULT_CACHE_SWEEP_INTERVAL,
+which picks up what other processes wrote.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from . import counters
+
+
+HITS_COUNTER = 'result_cache:hits'
+MISSES_COUNTER = 'result_cache:misses'
+
+# Bytes this process believes the cache holds, and when it last walked the cache
+_size_estimate = None
+_measured_at = 0.0
+
+# Prefix of in-progress writes, and the age after which one is taken as abandoned
+TEMP_PREFIX = '.tmp-'
+STALE_TEMP_AGE = 3600
+
+
+def is_enabled():
+    return getattr(settings, 'RESULT_CACHE_ENABLED', True)
+
+
+def get_cache_dir():
+    """Absolute path of the cache directory inside MEDIA_ROOT"""
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'RESULT_CACHE_DIR', 'cache'))
+
+
+def hash_file(file_obj):
+    """SHA-256 of a file's contents; leaves the file rewound"""
+    digest = hashlib.sha256()
+    if hasattr(file_obj, 'chunks'):
+        for chunk in file_obj.chunks():
+            digest.update(chunk)
+    else:
+        file_obj.seek(0)
+        for chunk in iter(lambda: file_obj.read(64 * 1024), b''):
+            digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    """SHA-256 of a string's UTF-8 bytes"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_cache_key(content_hash, **params):
+    """Combine the input hash with the conversion parameters"""
+    params_json = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f'{content_hash}:{params_json}'.encode('utf-8')).hexdigest()
+
+
+def _entry_dir(key):
+    return os.path.join(get_cache_dir(), key[:2], key)
+
+
+def _entry_file(entry_dir):
+    """Name of the finished result in an entry directory, skipping in-progress writes"""
+    for name in os.listdir(entry_dir):
+        if not name.startswith(TEMP_PREFIX):
+            return name
+    raise FileNotFoundError(entry_dir)
+
+
+def get_max_bytes():
+    return getattr(settings, 'RESULT_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+
+
+def get_cached_result(key):
+    """Return (data, filename) for a cached result, or None on a miss"""
+    entry_dir = _entry_dir(key)
+    try:
+        filename = _entry_file(entry_dir)
+        path = os.path.join(entry_dir, filename)
+        with open(path, 'rb') as f:
+            data = f.read()
+        # Bump the modification time; eviction uses it as the LRU clock
+        os.utime(path)
+    except FileNotFoundError:
+        counters.increment(MISSES_COUNTER)
+        return None
+
+    counters.increment(HITS_COUNTER)
+    return data, filename
+
+
+def get_cached_path(key):
+    """Path of a cached result, for streaming it from disk, or None on a miss"""
+    entry_dir = _entry_dir(key)
+    try:
+        path = os.path.join(entry_dir, _entry_file(entry_dir))
+        os.utime(path)
+    except FileNotFoundError:
+        counters.increment(MISSES_COUNTER)
+        return None
+
+    counters.increment(HITS_COUNTER)
+    return path
+
+
+def store_result(key, data, filename='result'):
+    """Write a result (bytes or a file object) into the cache and evict old entries if over budget"""
+    entry_dir = _entry_dir(key)
+    os.makedirs(entry_dir, exist_ok=True)
+
+    # Write to a temp file first; lookups skip temp names, so they only ever
+    # see the entry once it has been renamed into place complete
+    fd, temp_path = tempfile.mkstemp(dir=entry_dir, prefix=TEMP_PREFIX)
+    with os.fdopen(fd, 'wb') as f:
+        if isinstance(data, (bytes, bytearray)):
+            f.write(data)
+        else:
+            data.seek(0)
+            shutil.copyfileobj(data, f)
+        size = f.tell()
+    os.replace(temp_path, os.path.join(entry_dir, os.path.basename(filename)))
+
+    _note_write(size)
+
+
+def _note_write(size):
+    """Account for size new bytes, walking the cache only when the estimate says it may be full"""
+    global _size_estimate
+    stale = time.time() - _measured_at > getattr(settings, 'RESULT_CACHE_SWEEP_INTERVAL', 300)
+    if _size_estimate is None or stale:
+        evict_entries()
+        return
+    _size_estimate += size
+    if _size_estimate > get_max_bytes():
+        evict_entries()
+
+
+def _iter_entries(remove_stale_temps=False):
+    """Yield (path, size, mtime) for every cached file
+
+    In-progress writes are skipped; with remove_stale_temps, ones older than
+    STALE_TEMP_AGE are left over from a crashed writer and get deleted.
+    """
+    cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    for root, dirs, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.startswith(TEMP_PREFIX):
+                if remove_stale_temps and now - stat.st_mtime > STALE_TEMP_AGE:
+                    _remove_entry(path)
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+
+def _remove_entry(path):
+    try:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def evict_entries(max_bytes=None):
+    """Walk the cache and, when it is over max_bytes, remove least recently used entries
+
+    Eviction goes down to RESULT_CACHE_LOW_WATER of max_bytes, so the next
+    walk is not due after the very next write. Returns the number of
+    entries removed.
+    """
+    global _size_estimate, _measured_at
+    if max_bytes is None:
+        max_bytes = get_max_bytes()
+
+    entries = list(_iter_entries(remove_stale_temps=True))
+    total = sum(size for path, size, mtime in entries)
+    removed = 0
+    if total > max_bytes:
+        target = max_bytes * getattr(settings, 'RESULT_CACHE_LOW_WATER', 0.9)
+        for path, size, mtime in sorted(entries, key=lambda entry: entry[2]):
+            if total <= target:
+                break
+            _remove_entry(path)
+            total -= size
+            removed += 1
+
+    _size_estimate, _measured_at = total, time.time()
+    return removed
+
+
+def clear_cache():
+    """Remove every cached result"""
+    return evict_entries(max_bytes=0)
+
+
+def cache_stats():
+    """Hit/miss counters and current disk usage"""
+    entries = list(_iter_entries())
+    counts = counters.get_counts([HITS_COUNTER, MISSES_COUNTER])
+    hits, misses = counts[HITS_COUNTER], counts[MISSES_COUNTER]
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        'entries': len(entries),
+        'size_bytes': sum(size for path, size, mtime in entries),
+        'max_bytes': get_max_bytes(),
+    }
+
+
+def cached_conversion(file_obj, compute, **params):
+    """Return the BytesIO produced by compute(), reusing a cached copy when possible
+
+    Results with a false ``cacheable`` attribute are returned without being stored.
+    """
+    if not is_enabled():
+        return compute()
+
+    key = make_cache_key(hash_file(file_obj), **params)
+    cached = get_cached_result(key)
+    if cached is not None:
+        return BytesIO(cached[0])
+
+    result = compute()
+    if result and getattr(result, 'cacheable', True):
+        try:
+            store_result(key, result.getvalue())
+        except OSError as e:
+            print(f"Result cache write error: {e}")
+        result.seek(0)
+    return result
+
+
+def cached_file_conversion(file_obj, compute, **params):
+    """Like cached_conversion for helpers that return a named ContentFile"""
+    if not is_enabled():
+        return compute()
+
+    key = make_cache_key(hash_file(file_obj), **params)
+    cached = get_cached_result(key)
+    if cached is not None:
+        data, filename = cached
+        return ContentFile(data, name=filename)
+
+    result = compute()
+    if result and getattr(result, 'cacheable', True):
+        try:
+            store_result(key, result, filename=result.name)
+            result.seek(0)
+        except OSError as e:
+            print(f"Result cache write error: {e}")
+    return result
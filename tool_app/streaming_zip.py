@@ -0,0 +1,57 @@
+"""
+ZIP archives streamed entry by entry.
+
+``stream_zip`` writes through a non-seekable sink, so zipfile emits data
+descriptors instead of seeking back, and yields the archive bytes after each
+entry. Only the entry being written is held in memory, which keeps batch
+downloads flat no matter how many files they contain.
+"""
+import io
+import time
+import zipfile
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that is drained after every entry"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED):
+    """Yield a ZIP archive for an iterable of (name, data) or (name, data, compression)
+
+    Already-compressed payloads (images) are best stored as-is; pass
+    ZIP_DEFLATED per entry for text such as reports and manifests.
+    """
+    sink = _ZipSink()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, mode='w') as archive:
+        for entry in entries:
+            name, data = entry[0], entry[1]
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = entry[2] if len(entry) > 2 else compression
+            archive.writestr(info, data)
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+
+def zip_response_headers(response, filename):
+    """Mark a StreamingHttpResponse as a ZIP download"""
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Let proxies pass chunks through instead of buffering the whole archive
+    response['X-Accel-Buffering'] = 'no'
+    return response
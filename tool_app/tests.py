@@ -1,3 +1,887 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from docx import Document
+from PIL import Image
+from pypdf import PdfReader
+
+from . import result_cache
+from .artifacts import artifact_url, resolve_artifact, save_artifact
+from .counters import get_counts, increment
+from .docx_pdf import convert_docx_to_pdf_file
+from .executor import ToolPoolError, ToolTimeout, run_in_pool, shutdown_pools, submit_to_pool, wait_for_result
+from .frames import convert_frames
+from .imaging import (
+    FORMAT_CONTENT_TYPES, FORMAT_EXTENSIONS, ImageRejected, acceptable_formats, admission_stats, band_layout,
+    build_pyramid, choose_smallest_format, compress_to_size, convert_tiled, generate_variants, open_image
+)
+from .jobs import claim_next_job, requeue_stale_jobs
+from .models import FileConversion
+from .pdf_docx import convert_pdf_to_docx_file
+from .pdf_text import extract_text_to_file
+from .text_pdf import TITLE_MAX_LINES, TextLayout, render_text_pdf, render_text_pdf_parallel, use_fast_path
+from .time_stretch import iter_stretched_pcm, pcm_to_samples, samples_to_pcm, time_stretch
+from .png_optimizer import optimize_png
+from .views import compress_image_file, generate_text_pdf
+
+
+class MediaRootMixin:
+    """Point MEDIA_ROOT at a temporary directory for the duration of each test"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+
+class JobQueueTests(TestCase):
+    def make_job(self, **fields):
+        fields.setdefault('conversion_type', 'txt_to_pdf')
+        return FileConversion.objects.create(original_file='uploads/input.txt', **fields)
+
+    def age(self, job, seconds):
+        FileConversion.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_claim_takes_oldest_pending_once(self):
+        first = self.make_job()
+        second = self.make_job()
+        self.make_job(conversion_type='qr_generate')
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, 'processing')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        # Non-queued conversion types are never claimed
+        self.assertIsNone(claim_next_job())
+
+    def test_stale_job_is_requeued(self):
+        self.make_job()
+        job = claim_next_job()
+        self.age(job, 700)
+
+        self.assertEqual(requeue_stale_jobs(timeout=600), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+        self.assertIsNone(job.started_at)
+        self.assertEqual(claim_next_job().attempts, 2)
+
+    def test_job_with_recent_heartbeat_is_left_running(self):
+        self.make_job()
+        job = claim_next_job()
+        # Started long ago, but still sending heartbeats
+        FileConversion.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(requeue_stale_jobs(timeout=600), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'processing')
+
+    def test_job_fails_after_max_attempts(self):
+        job = self.make_job(status='processing', attempts=3)
+        self.age(job, 700)
+
+        self.assertEqual(requeue_stale_jobs(timeout=600, max_attempts=3), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('3 attempts', job.error_message)
+
+
+@override_settings(CONVERSION_QUEUE_EAGER=True, TOOL_POOL_ENABLED=False)
+class QueuedConversionErrorTests(MediaRootMixin, TestCase):
+    def test_failed_job_reports_the_converter_error(self):
+        with mock.patch('builtins.print'):
+            self.client.post('/file-converter/', {
+                'conversion_type': 'txt_to_pdf',
+                'original_file': SimpleUploadedFile('notes.txt', b'\xff\xfe\xfa not utf-8'),
+            })
+        conversion = FileConversion.objects.get()
+
+        payload = self.client.get(f'/api/status/{conversion.pk}/').json()
+        self.assertEqual(payload['status'], 'failed')
+        self.assertFalse(payload['success'])
+        self.assertEqual(payload['error_message'], 'The text file is not valid UTF-8')
+
+
+class CounterTests(TestCase):
+    def test_increment_creates_and_adds(self):
+        increment('test:counter')
+        increment('test:counter', 4)
+        self.assertEqual(get_counts(['test:counter', 'test:unused']), {'test:counter': 5, 'test:unused': 0})
+
+
+class ResultCacheTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Every test starts with a cache this process has never measured
+        result_cache._size_estimate = None
+        result_cache._measured_at = 0.0
+
+    def backdate(self, key, seconds):
+        path = result_cache.get_cached_path(key)
+        stamp = time.time() - seconds
+        os.utime(path, (stamp, stamp))
+
+    def test_cache_key_depends_on_content_and_params(self):
+        key = result_cache.make_cache_key('abc', quality=80, format='JPEG')
+        self.assertEqual(key, result_cache.make_cache_key('abc', format='JPEG', quality=80))
+        self.assertNotEqual(key, result_cache.make_cache_key('abc', quality=81, format='JPEG'))
+        self.assertNotEqual(key, result_cache.make_cache_key('abd', quality=80, format='JPEG'))
+
+    def test_store_and_hit(self):
+        self.assertIsNone(result_cache.get_cached_result('a' * 64))
+        result_cache.store_result('a' * 64, b'data', 'out.txt')
+        self.assertEqual(result_cache.get_cached_result('a' * 64), (b'data', 'out.txt'))
+
+        stats = result_cache.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    @override_settings(RESULT_CACHE_MAX_BYTES=1000, RESULT_CACHE_LOW_WATER=0.7)
+    def test_eviction_removes_least_recently_used_down_to_low_water(self):
+        for index, key in enumerate(['1' * 64, '2' * 64, '3' * 64]):
+            result_cache.store_result(key, b'x' * 300, 'out.bin')
+            self.backdate(key, 100 - index)
+        # Reading the oldest entry makes it the most recently used
+        result_cache.get_cached_result('1' * 64)
+
+        result_cache.store_result('4' * 64, b'x' * 300, 'out.bin')
+        remaining = {key for key in ['1' * 64, '2' * 64, '3' * 64, '4' * 64] if result_cache.get_cached_path(key)}
+        self.assertEqual(remaining, {'1' * 64, '4' * 64})
+
+    @override_settings(RESULT_CACHE_MAX_BYTES=10_000)
+    def test_store_only_walks_cache_when_estimate_is_over_budget(self):
+        result_cache.store_result('1' * 64, b'x' * 100, 'out.bin')
+        with mock.patch.object(result_cache, '_iter_entries', wraps=result_cache._iter_entries) as walk:
+            for key in ['2' * 64, '3' * 64]:
+                result_cache.store_result(key, b'x' * 100, 'out.bin')
+            self.assertEqual(walk.call_count, 0)
+            result_cache.store_result('4' * 64, b'x' * 10_000, 'out.bin')
+            self.assertEqual(walk.call_count, 1)
+
+    def test_in_progress_write_is_a_miss(self):
+        key = 'a' * 64
+        entry_dir = os.path.join(result_cache.get_cache_dir(), key[:2], key)
+        os.makedirs(entry_dir)
+        with open(os.path.join(entry_dir, '.tmp-partial'), 'wb') as f:
+            f.write(b'dat')
+
+        self.assertIsNone(result_cache.get_cached_result(key))
+        self.assertIsNone(result_cache.get_cached_path(key))
+
+    def test_eviction_deletes_stale_temp_files(self):
+        entry_dir = os.path.join(result_cache.get_cache_dir(), 'aa', 'a' * 64)
+        os.makedirs(entry_dir)
+        stale, fresh = os.path.join(entry_dir, '.tmp-stale'), os.path.join(entry_dir, '.tmp-fresh')
+        for path in [stale, fresh]:
+            with open(path, 'wb') as f:
+                f.write(b'dat')
+        stamp = time.time() - result_cache.STALE_TEMP_AGE - 1
+        os.utime(stale, (stamp, stamp))
+
+        result_cache.evict_entries()
+        self.assertFalse(os.path.exists(stale))
+        # A write still in progress is left alone
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_clear_removes_everything(self):
+        result_cache.store_result('1' * 64, b'data', 'out.txt')
+        call_command('result_cache', '--clear', stdout=open(os.devnull, 'w'))
+        self.assertIsNone(result_cache.get_cached_path('1' * 64))
+
+
+class ArtifactTests(MediaRootMixin, TestCase):
+    def test_signed_url_downloads_artifact(self):
+        artifact_id, path = save_artifact(b'%PDF-1.4 test', 'report.pdf')
+        response = self.client.get(artifact_url(artifact_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 test')
+        self.assertIn('report.pdf', response['Content-Disposition'])
+
+    def test_tampered_token_is_refused(self):
+        artifact_id, path = save_artifact(b'data', 'out.txt')
+        other_id, other_path = save_artifact(b'secret', 'other.txt')
+        url = artifact_url(artifact_id)
+        self.assertEqual(self.client.get(url.replace(artifact_id, other_id)).status_code, 404)
+        self.assertEqual(self.client.get(url[:-2] + 'x/').status_code, 404)
+
+    @override_settings(ARTIFACT_TTL=60)
+    def test_token_expires(self):
+        artifact_id, path = save_artifact(b'data', 'out.txt')
+        token = artifact_url(artifact_id).rstrip('/').rsplit('/', 1)[-1]
+        self.assertEqual(resolve_artifact(token), path)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            self.assertIsNone(resolve_artifact(token))
+
+
+    @override_settings(TOOL_POOL_ENABLED=False, ARTIFACT_FILENAME_MAX_LENGTH=40)
+    def test_api_filename_is_sanitized_and_capped(self):
+        payload = {'text_content': 'Body', 'title': '../Quarterly "report" <draft> ' + 'x' * 100}
+        response = self.client.post('/api/text-to-pdf/', payload, content_type='application/json')
+        filename = response.json()['filename']
+        self.assertTrue(filename.startswith('Quarterly_report_draft_xx'))
+        self.assertTrue(filename.endswith('.pdf'))
+        self.assertEqual(len(filename), 40)
+
+    @override_settings(ARTIFACT_PURGE_INTERVAL=60)
+    def test_expired_artifacts_are_purged_at_most_once_per_interval(self):
+        with mock.patch('tool_app.artifacts._purged_at', 0.0), \
+                mock.patch('tool_app.artifacts.purge_expired_artifacts') as purge:
+            save_artifact(b'one', 'one.txt')
+            save_artifact(b'two', 'two.txt')
+            self.assertEqual(purge.call_count, 1)
+            with mock.patch('tool_app.artifacts.time.time', return_value=time.time() + 61):
+                save_artifact(b'three', 'three.txt')
+            self.assertEqual(purge.call_count, 2)
+
+
+def sine(frequency, seconds=1.0, sample_rate=8000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)[None, :]
+
+
+def dominant_frequency(samples, sample_rate=8000):
+    spectrum = np.abs(np.fft.rfft(samples[0] * np.hanning(samples.shape[1])))
+    return np.argmax(spectrum) * sample_rate / samples.shape[1]
+
+
+class TimeStretchTests(TestCase):
+    def test_output_length_follows_speed(self):
+        samples = sine(440)
+        for speed in [0.5, 0.8, 1.5, 2.0]:
+            self.assertEqual(time_stretch(samples, speed).shape, (1, round(8000 / speed)))
+
+    def test_pitch_is_preserved(self):
+        for speed in [0.5, 1.5, 2.0]:
+            stretched = time_stretch(sine(440), speed)
+            # Within one bin of the output spectrum
+            self.assertAlmostEqual(dominant_frequency(stretched), 440, delta=8000 / stretched.shape[1])
+
+    def test_unit_speed_reproduces_input(self):
+        samples = sine(440)
+        np.testing.assert_allclose(time_stretch(samples, 1.0), samples, atol=1e-4)
+
+    def test_very_short_input(self):
+        for length in [0, 1, 10, 100]:
+            stretched = time_stretch(np.full((2, length), 0.1, dtype=np.float32), 1.5)
+            self.assertEqual(stretched.shape, (2, round(length / 1.5)))
+
+    def test_streaming_matches_single_call(self):
+        samples = np.vstack([sine(440), sine(660)])
+        pcm = samples_to_pcm(samples)
+        # Odd chunk sizes split samples and channels across chunks
+        chunks = [pcm[i:i + 1001] for i in range(0, len(pcm), 1001)]
+        whole = time_stretch(pcm_to_samples(pcm, 2), 1.25)
+        self.assertEqual(b''.join(iter_stretched_pcm(chunks, 1.25, 2)), samples_to_pcm(whole))
+
+
+@override_settings(TOOL_POOL_ENABLED=True, TOOL_POOL_WORKERS={'sleep': 2})
+class ToolPoolTests(TestCase):
+    def tearDown(self):
+        shutdown_pools()
+        super().tearDown()
+
+    def test_timeout_retries_tasks_killed_with_the_pool(self):
+        # Start both workers so the tasks below run side by side
+        run_in_pool('sleep', time.sleep, 0)
+        stuck = submit_to_pool('sleep', time.sleep, 30)
+        neighbour = submit_to_pool('sleep', time.sleep, 1.5)
+        queued = submit_to_pool('sleep', time.sleep, 0)
+        time.sleep(0.3)
+
+        with self.assertRaises(ToolTimeout):
+            wait_for_result(stuck, timeout=1)
+        # The recycle killed the running neighbour and dropped the queued task; both are rerun
+        self.assertIsNone(wait_for_result(neighbour, timeout=30))
+        self.assertIsNone(wait_for_result(queued, timeout=30))
+
+
+def image_bytes(image, format, **params):
+    buffer = BytesIO()
+    image.save(buffer, format, **params)
+    return buffer.getvalue()
+
+
+def noisy_image(size=(320, 240)):
+    """A gradient with noise, so JPEG size depends strongly on quality"""
+    rng = np.random.default_rng(0)
+    width, height = size
+    pixels = np.linspace(0, 255, width)[None, :, None] * np.ones((height, 1, 3)) + rng.normal(0, 20, (height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype('uint8'))
+
+
+class CompressToSizeTests(TestCase):
+    def test_output_fits_target(self):
+        image = noisy_image()
+        full_size = len(image_bytes(image, 'JPEG', quality=95))
+        for target in [full_size // 2, full_size // 10]:
+            buffer, info = compress_to_size(image, target)
+            self.assertLessEqual(len(buffer.getvalue()), target)
+            self.assertEqual(info['size'], len(buffer.getvalue()))
+            self.assertTrue(info['fits'])
+            self.assertEqual(Image.open(buffer).format, 'JPEG')
+
+    def test_quality_is_lowered_before_scaling(self):
+        image = noisy_image()
+        buffer, info = compress_to_size(image, len(image_bytes(image, 'JPEG', quality=95)) // 2)
+        self.assertLess(info['quality'], 95)
+        self.assertEqual(info['scale'], 1.0)
+        self.assertEqual(Image.open(buffer).size, image.size)
+
+    def test_unreachable_target_returns_smallest_attempt(self):
+        image = noisy_image()
+        buffer, info = compress_to_size(image, 100)
+        self.assertFalse(info['fits'])
+        self.assertGreater(info['size'], 100)
+        # Smaller than the full-size image at the lowest quality tried
+        self.assertLess(info['size'], len(image_bytes(image, 'JPEG', quality=10, optimize=True)))
+        self.assertLess(info['scale'], 1.0)
+        self.assertEqual(Image.open(buffer).format, 'JPEG')
+
+
+class ImageVariantTests(TestCase):
+    def open_jpeg(self, size=(800, 600)):
+        return open_image(BytesIO(image_bytes(noisy_image(size), 'JPEG', quality=90)))
+
+    def test_pyramid_keeps_aspect_ratio_without_upscaling(self):
+        levels = list(build_pyramid(self.open_jpeg(), [200, 1600, 400, 400]))
+        # Largest first, the oversized width capped at the source and duplicates dropped
+        self.assertEqual([level.size for level in levels], [(800, 600), (400, 300), (200, 150)])
+
+    def test_variants_cover_every_width_and_format(self):
+        variants = list(generate_variants(self.open_jpeg((640, 427)), [160, 320, 2000], ['JPEG', 'PNG', 'WEBP']))
+        self.assertEqual(
+            [(size, target_format) for size, target_format, buffer in variants],
+            [(size, target_format) for size in [(640, 427), (320, 213), (160, 106)] for target_format in ['JPEG', 'PNG', 'WEBP']]
+        )
+        for size, target_format, buffer in variants:
+            decoded = Image.open(buffer)
+            self.assertEqual((decoded.format, decoded.size), (target_format, size))
+            self.assertLessEqual(decoded.size[0], 640)
+            self.assertAlmostEqual(decoded.size[0] / decoded.size[1], 640 / 427, delta=0.02)
+
+    def test_palette_images_are_converted_before_encoding(self):
+        image = open_image(BytesIO(image_bytes(noisy_image((100, 80)).convert('P'), 'PNG')))
+        [(size, target_format, buffer)] = generate_variants(image, [50], ['JPEG'])
+        self.assertEqual(Image.open(buffer).size, (50, 40))
+
+
+class ImageAdmissionTests(TestCase):
+    @override_settings(IMAGE_MAX_PIXELS=10_000, IMAGE_OVERSIZE_POLICY='downsample')
+    def test_admission_decisions_are_counted(self):
+        open_image(BytesIO(image_bytes(Image.new('RGB', (50, 50)), 'PNG')))
+        image = open_image(BytesIO(image_bytes(Image.new('RGB', (400, 400)), 'JPEG')))
+        self.assertLessEqual(image.size[0] * image.size[1], 10_000)
+        with self.assertRaises(ImageRejected):
+            open_image(BytesIO(image_bytes(Image.new('RGB', (400, 400)), 'PNG')))
+
+        self.assertEqual(admission_stats(), {'admitted': 1, 'downsampled': 1, 'rejected': 1})
+
+
+class TiledConversionTests(TestCase):
+    def test_banded_output_matches_source_pixels(self):
+        source = Image.effect_noise((300, 200), 60).convert('RGB')
+        for compression in [None, 'tiff_lzw']:
+            data = image_bytes(source, 'TIFF', compression=compression, strip_size=300 * 3 * 16)
+            for target_format in ['TIFF', 'PNG']:
+                with self.subTest(compression=compression, target_format=target_format):
+                    image = open_image(BytesIO(data), tiled=True)
+                    self.assertIsNotNone(band_layout(image))
+                    output = BytesIO()
+                    self.assertEqual(convert_tiled(image, output, target_format, band_rows=32), 7)
+                    output.seek(0)
+                    converted = Image.open(output)
+                    self.assertEqual(converted.format, target_format)
+                    self.assertEqual(converted.convert('RGB').tobytes(), source.tobytes())
+
+
+class PngOptimizerTests(TestCase):
+    def assert_lossless(self, image):
+        buffer, info = optimize_png(image, time_budget=5)
+        self.assertLessEqual(info['size'], info['baseline_size'])
+        optimized = Image.open(buffer)
+        self.assertEqual(optimized.format, 'PNG')
+        self.assertEqual(optimized.convert('RGBA').tobytes(), image.convert('RGBA').tobytes())
+        return optimized
+
+    def test_colour_photo_is_lossless(self):
+        bands = [Image.effect_noise((64, 48), sigma) for sigma in (20, 40, 60)]
+        self.assertEqual(self.assert_lossless(Image.merge('RGB', bands)).mode, 'RGB')
+
+    def test_grey_rgb_becomes_greyscale(self):
+        grey = Image.effect_noise((64, 48), 40).convert('RGB')
+        self.assertIn(self.assert_lossless(grey).mode, ('L', 'P'))
+
+    def test_few_colours_become_palette(self):
+        image = Image.new('RGBA', (64, 48), (255, 0, 0, 255))
+        image.paste((0, 0, 255, 128), (0, 0, 32, 24))
+        image.paste((0, 0, 0, 0), (32, 24, 64, 48))
+        self.assertEqual(self.assert_lossless(image).mode, 'P')
+
+    def test_opaque_alpha_is_dropped(self):
+        bands = [Image.effect_noise((64, 48), sigma) for sigma in (20, 40, 60)]
+        image = Image.merge('RGB', bands).convert('RGBA')
+        self.assertEqual(self.assert_lossless(image).mode, 'RGB')
+
+
+CHROME_ACCEPT = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+
+
+@override_settings(TOOL_POOL_ENABLED=False)
+class AutoFormatTests(MediaRootMixin, TestCase):
+    def test_accept_negotiation(self):
+        self.assertEqual(acceptable_formats(CHROME_ACCEPT), ['WEBP', 'JPEG', 'PNG'])
+        self.assertEqual(acceptable_formats('image/png,image/*;q=0.8,*/*;q=0.5'), ['JPEG', 'PNG'])
+        self.assertEqual(acceptable_formats('image/webp;q=0, */*'), ['JPEG', 'PNG'])
+        self.assertEqual(acceptable_formats(None), ['JPEG', 'PNG'])
+
+    def test_smallest_passing_candidate_is_chosen(self):
+        for image in [noisy_image(), Image.new('RGB', (320, 240), 'navy')]:
+            target_format, buffer, info = choose_smallest_format(image)
+            self.assertEqual(Image.open(buffer).format, target_format)
+            self.assertEqual(info['size'], min(candidate['size'] for candidate in info['candidates'].values()
+                                               if candidate['psnr'] is None or candidate['psnr'] >= 36.0))
+
+    def test_webp_is_only_chosen_when_accepted(self):
+        target_format, buffer, info = choose_smallest_format(noisy_image(), formats=acceptable_formats('*/*'))
+        self.assertNotEqual(target_format, 'WEBP')
+        self.assertFalse(any(name.startswith('webp') for name in info['candidates']))
+
+    def test_transparent_images_skip_jpeg(self):
+        image = noisy_image().convert('RGBA')
+        image.putalpha(128)
+        target_format, buffer, info = choose_smallest_format(image)
+        self.assertNotIn('jpeg', info['candidates'])
+        self.assertEqual(Image.open(buffer).mode, 'RGBA')
+
+    def test_view_follows_accept_header(self):
+        upload = image_bytes(noisy_image(), 'PNG')
+        for accept in [CHROME_ACCEPT, 'image/png,*/*;q=0.8']:
+            response = self.client.post('/image-conversion/', {
+                'image_file': SimpleUploadedFile('photo.png', upload),
+                'target_format': 'AUTO',
+                'quality': 85,
+            }, HTTP_ACCEPT=accept)
+            chosen = Image.open(BytesIO(response.content)).format
+            self.assertIn(chosen, acceptable_formats(accept))
+            self.assertEqual(response['Content-Type'], FORMAT_CONTENT_TYPES[chosen])
+            self.assertIn(f'photo_converted.{FORMAT_EXTENSIONS[chosen]}', response['Content-Disposition'])
+            self.assertIn('Accept', response['Vary'])
+            if accept == CHROME_ACCEPT:
+                # Lossy WebP beats JPEG and PNG on a photo
+                self.assertEqual(chosen, 'WEBP')
+
+
+def animation_bytes(format, frames=5, size=(40, 30)):
+    images = [Image.new('RGB', size, (index * 50, 255 - index * 50, 80)) for index in range(frames)]
+    for index, image in enumerate(images):
+        image.paste((255, 255, 255), (index * 5, index * 5, index * 5 + 10, index * 5 + 10))
+    return image_bytes(images[0], format, save_all=True, append_images=images[1:], duration=80, loop=0)
+
+
+@override_settings(TOOL_POOL_ENABLED=False)
+class FrameConversionTests(MediaRootMixin, TestCase):
+    def convert(self, source_format, target_format):
+        output = BytesIO()
+        written = convert_frames(Image.open(BytesIO(animation_bytes(source_format))), output, target_format)
+        output.seek(0)
+        return written, Image.open(output)
+
+    def test_frame_count_is_preserved(self):
+        for source_format in ['GIF', 'WEBP', 'PNG']:
+            for target_format in ['GIF', 'WEBP', 'PNG', 'TIFF']:
+                with self.subTest(source_format=source_format, target_format=target_format):
+                    written, converted = self.convert(source_format, target_format)
+                    self.assertEqual(written, 5)
+                    self.assertEqual(converted.format, target_format)
+                    self.assertEqual(converted.n_frames, 5)
+
+    def test_webp_without_private_encoder(self):
+        with mock.patch('tool_app.frames._webp', None):
+            written, converted = self.convert('GIF', 'WEBP')
+        self.assertEqual((converted.format, converted.n_frames), ('WEBP', 5))
+
+    def test_gif_clears_opaque_frame_before_transparent_one(self):
+        opaque = Image.new('RGBA', (20, 20), (255, 0, 0, 255))
+        holed = Image.new('RGBA', (20, 20), (0, 0, 255, 255))
+        holed.paste((0, 0, 0, 0), (0, 0, 10, 20))
+        source = BytesIO()
+        opaque.save(source, 'PNG', save_all=True, append_images=[holed], duration=100)
+
+        output = BytesIO()
+        convert_frames(Image.open(source), output, 'GIF')
+        converted = Image.open(output)
+        self.assertEqual(converted.n_frames, 2)
+        converted.seek(1)
+        frame = converted.convert('RGBA')
+        # The hole shows nothing, not the red first frame
+        self.assertEqual(frame.getpixel((2, 2))[3], 0)
+        self.assertEqual(frame.getpixel((15, 15)), (0, 0, 255, 255))
+
+    def test_compressed_animation_keeps_its_extension(self):
+        upload = SimpleUploadedFile('loop.gif', animation_bytes('GIF'), 'image/gif')
+        compressed = compress_image_file(upload)
+        self.assertEqual(compressed.name, 'compressed_loop.gif')
+        self.assertEqual(Image.open(compressed).n_frames, 5)
+
+    def test_batch_entries_are_named_after_written_format(self):
+        response = self.client.post('/api/image-batch/', {
+            'operation': 'compress',
+            'files': [
+                SimpleUploadedFile('loop.webp', animation_bytes('WEBP'), 'image/webp'),
+                SimpleUploadedFile('still.png', image_bytes(Image.new('RGB', (40, 30)), 'PNG'), 'image/png'),
+            ],
+        })
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['compressed_loop.webp', 'compressed_still.jpg', 'report.json'])
+        self.assertEqual(Image.open(BytesIO(archive.read('compressed_loop.webp'))).n_frames, 5)
+
+
+@override_settings(TOOL_POOL_ENABLED=False)
+class MemeTests(MediaRootMixin, TestCase):
+    def test_animated_meme_is_captioned_on_every_frame(self):
+        frames = [Image.new('RGB', (200, 150), colour) for colour in ['navy', 'darkgreen']]
+        upload = BytesIO()
+        frames[0].save(upload, 'GIF', save_all=True, append_images=frames[1:], duration=100, loop=0)
+
+        response = self.client.post('/meme-generator/', {
+            'image_file': SimpleUploadedFile('loop.gif', upload.getvalue(), 'image/gif'),
+            'top_text': 'TOP',
+            'bottom_text': 'BOTTOM',
+            'font_size': 30,
+        })
+        result = response.context['meme_result']
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual((result['content_type'], result['extension']), ('image/gif', 'gif'))
+
+        download = self.client.get(result['download_url'])
+        self.assertEqual(download['Content-Type'], 'image/gif')
+        self.assertIn('meme.gif', download['Content-Disposition'])
+        meme = Image.open(BytesIO(b''.join(download.streaming_content)))
+        self.assertEqual((meme.format, meme.n_frames), ('GIF', 2))
+        for index in range(2):
+            meme.seek(index)
+            frame = meme.convert('RGB')
+            # The white caption text is on both halves of every frame, which are otherwise dark
+            for band in [(0, 0, 200, 75), (0, 75, 200, 150)]:
+                self.assertGreater(max(frame.crop(band).convert('L').getdata()), 200)
+            # and the frame's own colour, give or take the palette, is still there around it
+            for channel, expected in zip(frame.getpixel((2, 70)), frames[index].getpixel((2, 70))):
+                self.assertAlmostEqual(channel, expected, delta=4)
+
+
+def pdf_bytes(pages):
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for number in range(1, pages + 1):
+        pdf.drawString(72, 720, f'Page {number} of the sample document')
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+@override_settings(TOOL_POOL_ENABLED=False, PDF_TEXT_CHUNK_PAGES=2)
+class PdfTextTests(TestCase):
+    def extract(self, pages, **options):
+        output = BytesIO()
+        result = extract_text_to_file(BytesIO(pdf_bytes(pages)), output, workers=2, **options)
+        return result, output.getvalue().decode('utf-8')
+
+    def test_pages_are_extracted_in_order(self):
+        result, text = self.extract(5)
+        self.assertEqual(result, {'pages': 5, 'extracted': 5, 'stopped': None})
+        self.assertLess(text.index('Page 2 of'), text.index('Page 5 of'))
+
+    def test_page_limit(self):
+        result, text = self.extract(5, max_pages=3)
+        self.assertEqual(result['stopped'], 'page limit')
+        self.assertIn('stopped after 3 of 5 pages: page limit reached', text)
+
+    def test_worker_failure_is_not_reported_as_time_limit(self):
+        calls = []
+
+        def fail_second_run(future, timeout=None):
+            calls.append(future)
+            if len(calls) == 2:
+                raise ToolPoolError('A pdf_text worker process crashed, please try again')
+            return wait_for_result(future, timeout)
+
+        with mock.patch('tool_app.pdf_text.wait_for_result', side_effect=fail_second_run), \
+                mock.patch('builtins.print'):
+            result, text = self.extract(6)
+        self.assertEqual((result['extracted'], result['stopped']), (2, 'worker error'))
+        self.assertIn('stopped after 2 of 6 pages: a worker process failed', text)
+
+
+@override_settings(CONVERSION_QUEUE_EAGER=True, TOOL_POOL_ENABLED=False, PDF_TEXT_CHUNK_PAGES=1)
+class PdfToTextCachingTests(MediaRootMixin, TestCase):
+    def convert(self):
+        self.client.post('/file-converter/', {
+            'conversion_type': 'pdf_to_txt',
+            'original_file': SimpleUploadedFile('report.pdf', pdf_bytes(4)),
+        })
+        conversion = FileConversion.objects.latest('created_at')
+        self.assertEqual(conversion.status, 'completed')
+        with conversion.converted_file.open('rb') as f:
+            return f.read().decode('utf-8')
+
+    def test_text_cut_short_by_time_limit_is_not_cached(self):
+        with mock.patch('tool_app.pdf_text.wait_for_result', side_effect=ToolTimeout('too slow')), \
+                mock.patch('builtins.print'):
+            text = self.convert()
+        self.assertIn('time limit reached', text)
+        self.assertEqual(result_cache.cache_stats()['entries'], 0)
+
+        # The next upload of the same file is converted again, in full
+        self.assertIn('Page 4 of', self.convert())
+
+    @override_settings(PDF_TEXT_MAX_PAGES=2)
+    def test_text_cut_short_by_page_limit_is_cached(self):
+        self.assertIn('page limit reached', self.convert())
+        self.assertEqual(result_cache.cache_stats()['entries'], 1)
+
+
+def heading_pdf_bytes():
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate
+
+    styles = getSampleStyleSheet()
+    buffer = BytesIO()
+    story = []
+    for number in range(1, 4):
+        story.append(Paragraph(f'Chapter {number}', styles['Title']))
+        story.append(Paragraph('Body text for the chapter. ' * 20, styles['Normal']))
+        story.append(Paragraph('<b>A bold closing line</b>', styles['Normal']))
+        story.append(PageBreak())
+    SimpleDocTemplate(buffer).build(story)
+    return buffer.getvalue()
+
+
+@override_settings(TOOL_POOL_ENABLED=False, PDF_TEXT_CHUNK_PAGES=1)
+class PdfToDocxTests(TestCase):
+    def test_headings_and_paragraphs_survive(self):
+        output = BytesIO()
+        result = convert_pdf_to_docx_file(BytesIO(heading_pdf_bytes()), output, workers=2)
+        self.assertEqual(result, {'pages': 3, 'extracted': 3, 'stopped': None})
+
+        paragraphs = [p for p in Document(output).paragraphs if p.text.strip()]
+        headings = [p.text for p in paragraphs if p.style.name == 'Heading 1']
+        self.assertEqual(headings, ['Chapter 1', 'Chapter 2', 'Chapter 3'])
+        self.assertTrue(any(p.text.startswith('Body text for the chapter.') for p in paragraphs))
+        self.assertTrue(any(p.runs[0].bold for p in paragraphs if p.text == 'A bold closing line'))
+
+    def test_worker_failure_note(self):
+        with mock.patch('tool_app.pdf_text.wait_for_result', side_effect=ToolPoolError('crashed')), \
+                mock.patch('builtins.print'):
+            output = BytesIO()
+            result = convert_pdf_to_docx_file(BytesIO(heading_pdf_bytes()), output, workers=2)
+        self.assertEqual(result['stopped'], 'worker error')
+        self.assertIn('a worker process failed', Document(output).paragraphs[-1].text)
+
+
+@override_settings(CONVERSION_QUEUE_EAGER=True, TOOL_POOL_ENABLED=False, PDF_TEXT_CHUNK_PAGES=1)
+class PdfToDocxCachingTests(MediaRootMixin, TestCase):
+    def convert(self):
+        self.client.post('/file-converter/', {
+            'conversion_type': 'pdf_to_doc',
+            'original_file': SimpleUploadedFile('book.pdf', heading_pdf_bytes()),
+        })
+        conversion = FileConversion.objects.latest('created_at')
+        self.assertEqual(conversion.status, 'completed')
+        with conversion.converted_file.open('rb') as f:
+            return [p.text for p in Document(f).paragraphs]
+
+    def test_document_cut_short_by_worker_failure_is_not_cached(self):
+        with mock.patch('tool_app.pdf_text.wait_for_result', side_effect=ToolPoolError('crashed')), \
+                mock.patch('builtins.print'):
+            paragraphs = self.convert()
+        self.assertIn('a worker process failed', paragraphs[-1])
+        self.assertEqual(result_cache.cache_stats()['entries'], 0)
+
+        self.assertIn('Chapter 3', self.convert())
+
+    @override_settings(PDF_TEXT_MAX_PAGES=1)
+    def test_document_cut_short_by_page_limit_is_cached(self):
+        self.assertIn('page limit reached', self.convert()[-1])
+        self.assertEqual(result_cache.cache_stats()['entries'], 1)
+
+
+@override_settings(TEXT_PDF_FAST_THRESHOLD=1000)
+class PlainTextPdfTests(TestCase):
+    def test_long_title_is_wrapped_inside_the_margins(self):
+        layout = TextLayout()
+        title = 'Quarterly results for every region and product line ' * 6
+        lines = layout.title_lines(title)
+        self.assertEqual(len(lines), TITLE_MAX_LINES)
+        self.assertTrue(lines[-1].endswith(b'...'))
+        for line in lines:
+            self.assertLessEqual(sum(layout.title_widths[byte] for byte in line), layout.width)
+        self.assertGreater(layout.title_skip(title), layout.title_skip('Short'))
+
+    def test_title_and_text_survive_the_fast_path(self):
+        text = '\n'.join(f'Line {number}: caf\u00e9 cr\u00e8me' for number in range(200))
+        self.assertTrue(use_fast_path(text, 'R\u00e9sum\u00e9'))
+        output = BytesIO()
+        render_text_pdf(text, 'R\u00e9sum\u00e9', output)
+        first_page = PdfReader(output).pages[0].extract_text()
+        self.assertIn('R\u00e9sum\u00e9', first_page)
+        self.assertIn('Line 0: caf\u00e9 cr\u00e8me', first_page)
+
+    def test_text_outside_cp1252_uses_platypus(self):
+        text = 'x' * 2000
+        self.assertFalse(use_fast_path(text + '\u65e5\u672c', 'Title'))
+        self.assertFalse(use_fast_path(text, '\u03a9 report'))
+        self.assertFalse(use_fast_path('x' * 10, 'Title'))
+
+
+@override_settings(TOOL_POOL_ENABLED=False, TEXT_PDF_CHUNK_CHARS=2000, TEXT_PDF_BATCH_PAGES=2)
+class ParallelTextPdfTests(TestCase):
+    def test_parallel_output_matches_serial(self):
+        text = '\n'.join(f'{number:05d} ' + 'log entry ' * (number % 30) for number in range(600)) + '\n'
+        title = 'Server log ' * 12
+        serial, parallel = BytesIO(), BytesIO()
+        pages = render_text_pdf(text, title, serial)
+        self.assertEqual(render_text_pdf_parallel(text, title, parallel, workers=2), pages)
+        self.assertGreater(pages, 2)
+        self.assertEqual(parallel.getvalue(), serial.getvalue())
+        self.assertEqual(len(PdfReader(parallel).pages), pages)
+
+    @override_settings(TOOL_POOL_ENABLED=False, TEXT_PDF_CHUNK_CHARS=2000, TEXT_PDF_BATCH_PAGES=1)
+    def test_layout_and_rendering_use_separate_pools(self):
+        # Tasks each tool has submitted and not yet handed back, i.e. queue slots in use
+        outstanding, peak = {}, {}
+
+        def submit(tool, func, *args, **kwargs):
+            outstanding[tool] = outstanding.get(tool, 0) + 1
+            peak[tool] = max(peak.get(tool, 0), outstanding[tool])
+            return submit_to_pool(tool, func, *args, **kwargs)
+
+        def wait(future, timeout=None):
+            outstanding[future.tool_pool[0]] -= 1
+            return wait_for_result(future, timeout)
+
+        text = '\n'.join(f'{number:05d} ' + 'log entry ' * (number % 30) for number in range(600))
+        with mock.patch('tool_app.executor.submit_to_pool', side_effect=submit), \
+                mock.patch('tool_app.executor.wait_for_result', side_effect=wait):
+            render_text_pdf_parallel(text, 'Server log', BytesIO(), workers=2)
+        self.assertEqual(set(peak), {'pdf_layout', 'pdf_pages'})
+        # One render never holds more pdf_pages slots than its worker count
+        self.assertEqual(peak['pdf_pages'], 2)
+
+    @override_settings(
+        TOOL_POOL_ENABLED=True, TOOL_POOL_WORKERS={'pdf_pages': 2, 'pdf_layout': 1}, TOOL_POOL_QUEUE_SIZE=2,
+        TEXT_PDF_CHUNK_CHARS=2000, TEXT_PDF_BATCH_PAGES=1
+    )
+    def test_concurrent_renders_share_the_pools(self):
+        text = '\n'.join(f'{number:05d} ' + 'log entry ' * (number % 30) for number in range(600))
+        serial = BytesIO()
+        render_text_pdf(text, 'Server log', serial)
+
+        outputs = [BytesIO(), BytesIO()]
+        with ThreadPoolExecutor(max_workers=2) as threads:
+            renders = [threads.submit(render_text_pdf_parallel, text, 'Server log', output) for output in outputs]
+            try:
+                for render in renders:
+                    render.result()
+            finally:
+                shutdown_pools()
+        for output in outputs:
+            self.assertEqual(output.getvalue(), serial.getvalue())
+
+
+@override_settings(TOOL_POOL_ENABLED=False)
+class TextPdfCachingTests(MediaRootMixin, TestCase):
+    def post_form(self, **headers):
+        return self.client.post('/text-to-pdf/', {'title': 'Notes', 'text_content': 'First line\nSecond line'}, **headers)
+
+    def test_download_is_deterministic_and_rendered_once(self):
+        with mock.patch('tool_app.views.generate_text_pdf', wraps=generate_text_pdf) as generate:
+            first = self.post_form()
+            body = b''.join(first.streaming_content)
+            # A conditional POST is not answered from the client's copy; the PDF is always sent
+            second = self.post_form(HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(second.status_code, 200)
+            self.assertEqual(b''.join(second.streaming_content), body)
+        self.assertEqual(generate.call_count, 1)
+        self.assertNotIn('ETag', first)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+    def test_json_api_is_not_validated_by_etag(self):
+        payload = {'text_content': 'First line', 'title': 'Notes', 'inline': True}
+        response = self.client.post('/api/text-to-pdf/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertIn('pdf_data', response.json())
+
+        again = self.client.post('/api/text-to-pdf/', payload, content_type='application/json', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again.json()['download_url'], response.json()['download_url'])
+
+
+def docx_bytes():
+    from docx.enum.text import WD_BREAK
+
+    document = Document()
+    document.core_properties.title = 'Handbook'
+    document.add_heading('Handbook', 0)
+    document.add_heading('Getting started', 1)
+    paragraph = document.add_paragraph('Read the ')
+    paragraph.add_run('whole').bold = True
+    paragraph.add_run(' guide & <notes>.')
+    for step in ['Install', 'Configure']:
+        document.add_paragraph(step, style='List Number')
+    table = document.add_table(rows=2, cols=2)
+    for row in range(2):
+        for column in range(2):
+            table.cell(row, column).text = f'cell {row}{column}'
+    table.cell(0, 0).merge(table.cell(0, 1))
+    document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.add_heading('Appendix', 1)
+
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class DocxToPdfTests(MediaRootMixin, TestCase):
+    def test_structure_is_rendered(self):
+        output = BytesIO()
+        convert_docx_to_pdf_file(BytesIO(docx_bytes()), output)
+        reader = PdfReader(output)
+        self.assertEqual(len(reader.pages), 2)
+        self.assertEqual(reader.metadata.title, 'Handbook')
+
+        first_page = reader.pages[0].extract_text()
+        for text in ['Getting started', 'Read the whole guide & <notes>.', '1. Install', '2. Configure', 'cell 10']:
+            self.assertIn(text, first_page)
+        self.assertIn('Appendix', reader.pages[1].extract_text())
+
+    @override_settings(CONVERSION_QUEUE_EAGER=True, TOOL_POOL_ENABLED=False)
+    def test_queued_conversion(self):
+        response = self.client.post('/file-converter/', {
+            'conversion_type': 'doc_to_pdf',
+            'original_file': SimpleUploadedFile('handbook.docx', docx_bytes()),
+        })
+        conversion = FileConversion.objects.get()
+        self.assertRedirects(response, f'/result/{conversion.pk}/', fetch_redirect_response=False)
+        self.assertEqual(conversion.status, 'completed')
+        with conversion.converted_file.open('rb') as f:
+            self.assertEqual(len(PdfReader(f).pages), 2)
@@ -0,0 +1,351 @@
+"""
+Plain-text fast path for text to PDF.
+
+``create_pdf_from_text`` turns every line into a platypus Paragraph, and
+parsing that markup dominates the cost for multi-megabyte logs. Above
+TEXT_PDF_FAST_THRESHOLD characters, ``render_text_pdf`` lays the lines out
+itself instead: widths come from a per-font table of the standard font's
+glyph metrics, lines are wrapped greedily at spaces and drawn with the same
+text operators reportlab's canvas emits, using the fonts, sizes and margins
+of the sample stylesheet so both paths look alike. The standard fonts only
+cover cp1252, so texts (or titles) with other characters stay on the
+platypus path.
+
+reportlab's Canvas keeps every page until ``save()``, so ``PdfStreamWriter``
+writes each page (a compressed content stream) as soon as it is laid out and
+only the page tree, catalogue and cross-reference table at the end. The
+standard fonts need no embedding, which keeps the writer small.
+"""
+import zlib
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate, chain
+
+from django.conf import settings
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+
+from .executor import get_pool_workers, map_in_pool
+
+
+# SimpleDocTemplate's default margins plus its frame padding
+MARGIN = 72
+FRAME_PADDING = 6
+
+# Page numbers are set in the body font at this size, centred in the bottom margin
+PAGE_NUMBER_SIZE = 9
+
+# Text is drawn in the standard fonts' WinAnsi encoding; texts with other characters use platypus
+TEXT_ENCODING = 'cp1252'
+
+# Longer titles are wrapped onto at most this many lines, the last one cut short with an ellipsis
+TITLE_MAX_LINES = 3
+
+
+def get_fast_threshold():
+    return getattr(settings, 'TEXT_PDF_FAST_THRESHOLD', 100_000)
+
+
+def is_plain_encodable(*texts):
+    """Whether every text can be drawn with the standard fonts' encoding"""
+    for text in texts:
+        if text.isascii():
+            continue
+        try:
+            text.encode(TEXT_ENCODING)
+        except UnicodeEncodeError:
+            return False
+    return True
+
+
+def use_fast_path(text_content, title=''):
+    return len(text_content) >= get_fast_threshold() and is_plain_encodable(text_content, title)
+
+
+def get_parallel_threshold():
+    return getattr(settings, 'TEXT_PDF_PARALLEL_THRESHOLD', 2_000_000)
+
+
+def use_parallel_path(text_content, title=''):
+    return len(text_content) >= get_parallel_threshold() and is_plain_encodable(text_content, title)
+
+
+def get_chunk_chars():
+    return getattr(settings, 'TEXT_PDF_CHUNK_CHARS', 256 * 1024)
+
+
+def get_batch_pages():
+    return getattr(settings, 'TEXT_PDF_BATCH_PAGES', 100)
+
+
+@lru_cache(maxsize=None)
+def get_stylesheet():
+    """The sample stylesheet, built once per process; treat it as read-only"""
+    return getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def char_widths(font_name, font_size):
+    """Advance width in points of each byte of the font's encoding at font_size"""
+    return [width * font_size / 1000.0 for width in pdfmetrics.getFont(font_name).widths]
+
+
+def _escape(data):
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'\\r')
+
+
+def wrap_line(data, widths, max_width, safe_length=0):
+    """Split an encoded line into pieces no wider than max_width, breaking at spaces where possible
+
+    Lines of at most safe_length bytes are known to fit and are not measured.
+    """
+    if len(data) <= safe_length:
+        return [data]
+
+    pieces = []
+    while data:
+        edges = list(accumulate(map(widths.__getitem__, data)))
+        fit = bisect_right(edges, max_width)
+        if fit >= len(data):
+            pieces.append(data)
+            break
+        space = data.rfind(b' ', 0, fit + 1)
+        end = space if space > 0 else max(fit, 1)
+        pieces.append(data[:end])
+        data = data[end + 1 if space > 0 else end:]
+    return pieces
+
+
+class PdfStreamWriter:
+    """Write a PDF using standard fonts to fp one page at a time
+
+    fonts maps resource names (F1, F2...) to standard font names. Object 1
+    is the catalogue and 2 the page tree, written last, once the page
+    count is known.
+    """
+
+    def __init__(self, fp, fonts, pagesize=letter):
+        self.fp = fp
+        self.pagesize = pagesize
+        self.offsets = {}
+        self.position = 0
+        self.next_object = 3
+        self.kids = []
+
+        self._write(b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n')
+        font_refs = []
+        for resource, font_name in fonts.items():
+            number = self._add_object(
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /{font_name} /Encoding /WinAnsiEncoding >>'.encode('ascii')
+            )
+            font_refs.append(f'/{resource} {number} 0 R')
+        self.resources = f"<< /Font << {' '.join(font_refs)} >> >>"
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.position += len(data)
+
+    def _write_object(self, number, body):
+        self.offsets[number] = self.position
+        self._write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def _add_object(self, body):
+        number = self.next_object
+        self.next_object += 1
+        self._write_object(number, body)
+        return number
+
+    def add_page(self, content, compressed=False):
+        """Write one page whose content stream is content (bytes, already deflated when compressed)"""
+        if not compressed:
+            content = zlib.compress(content)
+        contents = self._add_object(
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream'
+        )
+        width, height = self.pagesize
+        self.kids.append(self._add_object((
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] '
+            f'/Resources {self.resources} /Contents {contents} 0 R >>'
+        ).encode('ascii')))
+
+    def close(self):
+        kids = ' '.join(f'{number} 0 R' for number in self.kids)
+        self._write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.kids)} >>'.encode('ascii'))
+        self._write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref = self.position
+        entries = [b'0000000000 65535 f \n']
+        entries.extend(b'%010d 00000 n \n' % self.offsets[number] for number in range(1, self.next_object))
+        self._write(b'xref\n0 %d\n' % self.next_object + b''.join(entries))
+        self._write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_object, xref))
+
+
+class TextLayout:
+    """Page geometry and fonts for plain-text pages, taken from the sample stylesheet"""
+
+    def __init__(self, pagesize=letter):
+        styles = get_stylesheet()
+        self.body = styles['Normal']
+        self.title = styles['Title']
+        self.fonts = {'F1': self.body.fontName, 'F2': self.title.fontName}
+        self.pagesize = pagesize
+
+        self.left = MARGIN + FRAME_PADDING
+        self.width = pagesize[0] - 2 * self.left
+        self.top = pagesize[1] - MARGIN - FRAME_PADDING
+        self.bottom = MARGIN + FRAME_PADDING
+        self.widths = char_widths(self.body.fontName, self.body.fontSize)
+        # Lines this short fit even in the font's widest glyph, so most log lines are never measured
+        self.safe_length = int(self.width // max(self.widths))
+        self.lines_per_page = int((self.top - self.bottom) // self.body.leading)
+        self.title_widths = char_widths(self.title.fontName, self.title.fontSize)
+
+    def title_lines(self, title):
+        """The encoded title wrapped to the text width, at most TITLE_MAX_LINES lines"""
+        lines = wrap_line(title.encode(TEXT_ENCODING, 'replace'), self.title_widths, self.width) or [b'']
+        if len(lines) > TITLE_MAX_LINES:
+            last = lines[TITLE_MAX_LINES - 1]
+            ellipsis_width = sum(map(self.title_widths.__getitem__, b'...'))
+            while last and sum(map(self.title_widths.__getitem__, last)) + ellipsis_width > self.width:
+                last = last[:-1]
+            lines = lines[:TITLE_MAX_LINES - 1] + [last.rstrip() + b'...']
+        return lines
+
+    def title_skip(self, title):
+        """Body lines the title takes from the first page"""
+        height = len(self.title_lines(title)) * self.title.leading + self.title.spaceAfter
+        return int(-(-height // self.body.leading))
+
+    def _centred(self, resource, font_name, font_size, y, data):
+        text_width = sum(map(char_widths(font_name, font_size).__getitem__, data))
+        x = self.left + (self.width - text_width) / 2
+        return b'BT /%s %g Tf %.2f %.2f Td (%s) Tj ET\n' % (resource, font_size, x, y, _escape(data))
+
+    def page_content(self, lines, number, skip=0, title=''):
+        """Content stream for page number holding encoded lines, starting skip lines down
+
+        The first page also carries the title, and every page its number
+        centred in the bottom margin.
+        """
+        ops = []
+        if number == 1:
+            y = self.top - self.title.fontSize
+            for line in self.title_lines(title):
+                ops.append(self._centred(b'F2', self.title.fontName, self.title.fontSize, y, line))
+                y -= self.title.leading
+
+        leading = self.body.leading
+        # "'" moves down one leading before drawing, so start a line above the first baseline
+        y = self.top - self.body.fontSize - (skip - 1) * leading
+        ops.append(b'BT /F1 %g Tf %g TL %.2f %.2f Td\n' % (self.body.fontSize, leading, self.left, y))
+        ops.extend(b'(%s) \'\n' % _escape(line) for line in lines)
+        ops.append(b'ET\n')
+        ops.append(self._centred(b'F1', self.body.fontName, PAGE_NUMBER_SIZE, MARGIN / 2, b'%d' % number))
+        return b''.join(ops)
+
+    def iter_lines(self, text_content):
+        """Encoded, wrapped lines of text_content; blank lines are kept"""
+        for line in text_content.split('\n'):
+            data = line.rstrip('\r').expandtabs(4).encode(TEXT_ENCODING, 'replace')
+            yield from wrap_line(data, self.widths, self.width, self.safe_length)
+
+
+def paginate(layout, lines, title=''):
+    """Group wrapped lines into pages, yielding (lines, skip); the first page starts below the title"""
+    skip = layout.title_skip(title)
+    page, capacity = [], layout.lines_per_page - skip
+    for line in lines:
+        page.append(line)
+        if len(page) == capacity:
+            yield page, skip
+            page, capacity, skip = [], layout.lines_per_page, 0
+    if page or skip:
+        yield page, skip
+
+
+def iter_pages(layout, text_content, title):
+    """Yield the content stream of each page in order"""
+    for number, (lines, skip) in enumerate(paginate(layout, layout.iter_lines(text_content), title), 1):
+        yield layout.page_content(lines, number, skip, title)
+
+
+def render_text_pdf(text_content, title, output):
+    """Lay text_content out as plain text and write the PDF to the binary file output
+
+    Returns the page count.
+    """
+    layout = TextLayout()
+    writer = PdfStreamWriter(output, layout.fonts, layout.pagesize)
+    for content in iter_pages(layout, text_content, title):
+        writer.add_page(content)
+    writer.close()
+    return len(writer.kids)
+
+
+@lru_cache(maxsize=None)
+def _worker_layout():
+    return TextLayout()
+
+
+def _layout_chunk(text_chunk):
+    """Pool task: the wrapped lines of a chunk of whole lines"""
+    return list(_worker_layout().iter_lines(text_chunk))
+
+
+def _render_pages(pages, title):
+    """Pool task: deflated content streams for a batch of (number, (lines, skip)) pages"""
+    layout = _worker_layout()
+    return [zlib.compress(layout.page_content(lines, number, skip, title)) for number, (lines, skip) in pages]
+
+
+def _text_chunks(text_content, chunk_chars):
+    """Split text into pieces of about chunk_chars characters at line breaks"""
+    start = 0
+    while start < len(text_content):
+        end = text_content.find('\n', start + chunk_chars)
+        if end == -1:
+            yield text_content[start:]
+            return
+        yield text_content[start:end]
+        start = end + 1
+    if text_content.endswith('\n') or not text_content:
+        # The serial path sees a last, empty line here
+        yield ''
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_text_pdf_parallel(text_content, title, output, workers=None):
+    """render_text_pdf with layout and rendering spread over tool pools
+
+    The text is cut at line breaks into chunks that the 'pdf_layout' pool
+    wraps; this process numbers the wrapped lines into pages and sends
+    page-aligned batches to the 'pdf_pages' pool (workers at a time) to be
+    rendered and deflated, then writes the pages in order as each batch
+    returns. The two stages run at once, so each has its own pool and queue
+    slots. The output is byte-for-byte the same as render_text_pdf's.
+    Returns the page count.
+    """
+    workers = workers or get_pool_workers('pdf_pages')
+    layout = TextLayout()
+    writer = PdfStreamWriter(output, layout.fonts, layout.pagesize)
+
+    chunks = ((chunk,) for chunk in _text_chunks(text_content, get_chunk_chars()))
+    lines = chain.from_iterable(map_in_pool('pdf_layout', _layout_chunk, chunks))
+    pages = enumerate(paginate(layout, lines, title), 1)
+    batches = ((batch, title) for batch in _batches(pages, get_batch_pages()))
+    for streams in map_in_pool('pdf_pages', _render_pages, batches, workers):
+        for content in streams:
+            writer.add_page(content, compressed=True)
+    writer.close()
+    return len(writer.kids)
@@ -38,6 +38,7 @@ urlpatterns = [
     
     path('result/<int:pk>/', views.conversion_result, name='conversion_result'),
     path('download/<int:pk>/', views.download_file, name='download_file'),
+    path('artifact/<str:token>/', views.download_artifact, name='download_artifact'),
     
     # Static Pages
     path('about/', views.about, name='about'),
@@ -53,5 +54,8 @@ urlpatterns = [
     path('api/convert/', views.api_convert_file, name='api_convert_file'),
     path('api/text-to-pdf/', views.api_text_to_pdf, name='api_text_to_pdf'),
     path('api/status/<int:pk>/', views.api_conversion_status, name='api_conversion_status'),
+    path('api/media-info/', views.api_media_info, name='api_media_info'),
+    path('api/image-variants/', views.api_image_variants, name='api_image_variants'),
+    path('api/image-batch/', views.api_image_batch, name='api_image_batch'),
     path('api/newsletter-subscribe/', views.newsletter_subscribe, name='newsletter_subscribe'),
 ]
@@ -1,23 +1,54 @@
 import os
 import tempfile
+import zipfile
 from io import BytesIO
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse, FileResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404, StreamingHttpResponse
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
+from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.conf import settings
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Paragraph
 import json
-from docx import Document
 from docx.shared import Inches
 
 from .models import FileConversion, Newsletter
+from .jobs import QUEUED_CONVERSION_TYPES, enqueue_conversion
+from .result_cache import (
+    cached_conversion, cached_file_conversion, get_cached_path, hash_text, is_enabled as result_cache_enabled,
+    make_cache_key, store_result
+)
+from .artifacts import (
+    artifact_url, create_artifact, get_artifact_ttl, inline_artifact_data, resolve_artifact, safe_filename,
+    save_artifact
+)
+from .media import (
+    MediaError, audio_info_from_probe, can_stream_copy, media_info_from_probe, probe_media,
+    probe_media_cached, transcode_audio, video_info_from_probe
+)
+from .time_stretch import stretch_audio
+from .executor import ToolPoolBusy, ToolPoolError, ToolTimeout, run_in_pool, submit_to_pool, wait_for_result
+from .imaging import (
+    AUTO_FORMAT, FORMAT_CONTENT_TYPES, FORMAT_EXTENSIONS, TILED_FORMATS, VARIANT_FORMATS, ImageRejected,
+    acceptable_formats, band_layout, choose_smallest_format, compress_to_size, convert_tiled, encode_image,
+    generate_variants, get_resize_strategy, open_image, resize_to_width, sniff_format
+)
+from .frames import ANIMATED_FORMATS, convert_frames, is_multi_frame
+from .fonts import get_font
+from .docx_pdf import convert_docx_to_pdf_file
+from .pdf_docx import convert_pdf_to_docx_file
+from .pdf_text import TRANSIENT_STOPS, extract_text_to_file
+from .png_optimizer import optimize_png
+from .text_pdf import get_stylesheet, render_text_pdf, render_text_pdf_parallel, use_fast_path, use_parallel_path
+from .streaming_zip import stream_zip, zip_response_headers
 from .forms import (
     FileUploadForm, TextToPdfForm, ImageCompressionForm, ImageConversionForm, QRCodeForm,
     MetaTagForm, URLEncoderDecoderForm, DomainResolverForm, WhoisLookupForm, RobotsSitemapForm,
@@ -43,15 +74,11 @@ from datetime import datetime, timezone
 from email.utils import parseaddr
 import random
 import string
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import textwrap
 import os
 import tempfile
 from pydub import AudioSegment
-try:
-    from moviepy.editor import VideoFileClip
-except ImportError:
-    VideoFileClip = None
 
 
 def home(request):
@@ -129,28 +156,14 @@ def file_converter(request):
         form = FileUploadForm(request.POST, request.FILES)
         if form.is_valid():
             conversion = form.save(commit=False)
-            conversion.status = 'processing'
-            conversion.save()
             
-            # Process the conversion
+            # Hand the conversion to the worker pool and show its progress page
             try:
-                converted_file = process_file_conversion(conversion)
-                if converted_file:
-                    conversion.converted_file = converted_file
-                    conversion.status = 'completed'
-                    conversion.save()
-                    messages.success(request, 'File converted successfully!')
-                    return redirect('tool_app:conversion_result', pk=conversion.pk)
-                else:
-                    conversion.status = 'failed'
-                    conversion.error_message = 'Conversion failed'
-                    conversion.save()
-                    messages.error(request, 'File conversion failed. Please try again.')
+                enqueue_conversion(conversion)
+                messages.success(request, 'File uploaded. Your conversion has been queued.')
+                return redirect('tool_app:conversion_result', pk=conversion.pk)
             except Exception as e:
-                conversion.status = 'failed'
-                conversion.error_message = str(e)
-                conversion.save()
-                messages.error(request, f'Error during conversion: {str(e)}')
+                messages.error(request, f'Error queuing conversion: {str(e)}')
     else:
         form = FileUploadForm()
     
@@ -163,13 +176,18 @@ def text_to_pdf(request):
         form = TextToPdfForm(request.POST)
         if form.is_valid():
             try:
-                pdf_buffer = create_pdf_from_text(
-                    form.cleaned_data['text_content'],
-                    form.cleaned_data.get('title', 'Document')
-                )
+                text_content = form.cleaned_data['text_content']
+                title = form.cleaned_data.get('title', 'Document')
+                
+                # Written straight to disk (page by page for large texts) and streamed back
+                _, pdf_path = cached_text_pdf(text_content, title, 'converted_document.pdf')
                 
-                response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-                response['Content-Disposition'] = 'attachment; filename="converted_document.pdf"'
+                response = FileResponse(
+                    open(pdf_path, 'rb'),
+                    as_attachment=True,
+                    filename='converted_document.pdf',
+                    content_type='application/pdf'
+                )
                 return response
             except Exception as e:
                 messages.error(request, f'Error creating PDF: {str(e)}')
@@ -185,6 +203,19 @@ def conversion_result(request, pk):
     return render(request, 'tool_app/conversion_result.html', {'conversion': conversion})
 
 
+def download_artifact(request, token):
+    """Stream a generated artifact from the short-lived artifact store"""
+    artifact_path = resolve_artifact(token)
+    if not artifact_path:
+        raise Http404('This download link has expired or is invalid.')
+    
+    return FileResponse(
+        open(artifact_path, 'rb'),
+        as_attachment=request.GET.get('disposition') != 'inline',
+        filename=os.path.basename(artifact_path)
+    )
+
+
 def download_file(request, pk):
     """Download converted file"""
     conversion = get_object_or_404(FileConversion, pk=pk)
@@ -215,32 +246,14 @@ def api_convert_file(request):
         if not conversion_type:
             return JsonResponse({'error': 'No conversion type specified'}, status=400)
         
-        # Create conversion record
-        conversion = FileConversion.objects.create(
-            original_file=file,
-            conversion_type=conversion_type,
-            status='processing'
-        )
+        if conversion_type not in QUEUED_CONVERSION_TYPES:
+            return JsonResponse({'error': f'Unsupported conversion type: {conversion_type}'}, status=400)
         
-        # Process conversion
-        converted_file = process_file_conversion(conversion)
+        # Create conversion record and queue it; the client polls the status URL
+        conversion = FileConversion(original_file=file, conversion_type=conversion_type)
+        enqueue_conversion(conversion)
         
-        if converted_file:
-            conversion.converted_file = converted_file
-            conversion.status = 'completed'
-            conversion.save()
-            
-            return JsonResponse({
-                'success': True,
-                'conversion_id': conversion.id,
-                'download_url': f'/download/{conversion.id}/',
-                'original_filename': conversion.original_filename,
-                'converted_filename': conversion.converted_filename
-            })
-        else:
-            conversion.status = 'failed'
-            conversion.save()
-            return JsonResponse({'error': 'Conversion failed'}, status=500)
+        return JsonResponse(conversion_status_payload(conversion), status=202)
             
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -258,60 +271,289 @@ def api_text_to_pdf(request):
         if not text_content:
             return JsonResponse({'error': 'No text content provided'}, status=400)
         
-        pdf_buffer = create_pdf_from_text(text_content, title)
+        # Store the PDF once and hand back a short-lived download URL
+        filename = safe_filename(f'{title}.pdf')
+        artifact_id, pdf_path = cached_text_pdf(text_content, title, filename)
+        
+        response_data = {
+            'success': True,
+            'download_url': request.build_absolute_uri(artifact_url(artifact_id)),
+            'filename': filename,
+            'size': os.path.getsize(pdf_path),
+            'expires_in': get_artifact_ttl()
+        }
         
-        # Return base64 encoded PDF
-        import base64
-        pdf_base64 = base64.b64encode(pdf_buffer.getvalue()).decode('utf-8')
+        # Small PDFs can still be embedded when the client opts in
+        pdf_data = inline_artifact_data(pdf_path, bool(data.get('inline')))
+        if pdf_data:
+            response_data['pdf_data'] = pdf_data
+        
+        return JsonResponse(response_data)
+        
+    except ToolPoolBusy as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    except ToolTimeout as e:
+        return JsonResponse({'error': str(e)}, status=504)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_POST
+def api_media_info(request):
+    """API endpoint for audio/video metadata read from the container headers"""
+    try:
+        if 'file' not in request.FILES:
+            return JsonResponse({'error': 'No file provided'}, status=400)
+        
+        media_file = request.FILES['file']
+        info = media_info_from_probe(probe_media_cached(media_file))
         
         return JsonResponse({
             'success': True,
-            'pdf_data': pdf_base64,
-            'filename': f'{title.replace(" ", "_")}.pdf'
+            'filename': media_file.name,
+            **info
         })
         
+    except MediaError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_POST
+def api_image_variants(request):
+    """API endpoint returning responsive variants of one image as a streamed ZIP"""
+    try:
+        if 'file' not in request.FILES:
+            return JsonResponse({'error': 'No file provided'}, status=400)
+        
+        image_file = request.FILES['file']
+        try:
+            widths = [int(width) for width in request.POST.get('widths', '').split(',') if width.strip()]
+            quality = int(request.POST.get('quality', 80))
+        except ValueError:
+            return JsonResponse({'error': 'widths must be a comma-separated list of integers'}, status=400)
+        formats = [f.strip().upper() for f in request.POST.get('formats', 'WEBP,JPEG').split(',') if f.strip()]
+        
+        max_widths = getattr(settings, 'IMAGE_VARIANT_MAX_WIDTHS', 8)
+        if not widths or len(widths) > max_widths or not all(16 <= width <= 5000 for width in widths):
+            return JsonResponse({'error': f'Provide 1-{max_widths} widths between 16 and 5000'}, status=400)
+        if not formats or any(f not in VARIANT_FORMATS for f in formats):
+            return JsonResponse({'error': f'Supported formats: {", ".join(VARIANT_FORMATS)}'}, status=400)
+        if not 10 <= quality <= 95:
+            return JsonResponse({'error': 'quality must be between 10 and 95'}, status=400)
+        
+        # Read only the header so a bad or oversized upload fails before the download starts
+        try:
+            image = open_image(image_file)
+        except ImageRejected as e:
+            return JsonResponse({'error': str(e)}, status=413)
+        except Exception:
+            return JsonResponse({'error': 'The uploaded file is not a supported image'}, status=400)
+        
+        stem = os.path.splitext(os.path.basename(image_file.name))[0] or 'image'
+        
+        def entries():
+            manifest = {'source': image_file.name, 'variants': [], 'srcset': {}}
+            for size, target_format, buffer in generate_variants(image, widths, formats, quality):
+                filename = f'{stem}-{size[0]}w.{FORMAT_EXTENSIONS[target_format]}'
+                data = buffer.getvalue()
+                manifest['variants'].append({
+                    'file': filename,
+                    'format': target_format,
+                    'width': size[0],
+                    'height': size[1],
+                    'size': len(data)
+                })
+                yield filename, data
+            
+            for target_format in formats:
+                manifest['srcset'][target_format] = ', '.join(
+                    f"{v['file']} {v['width']}w" for v in manifest['variants'] if v['format'] == target_format
+                )
+            yield 'manifest.json', json.dumps(manifest, indent=2).encode('utf-8'), zipfile.ZIP_DEFLATED
+        
+        response = StreamingHttpResponse(stream_zip(entries()), content_type='application/zip')
+        return zip_response_headers(response, f'{stem}-variants.zip')
+        
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@csrf_exempt
+@require_POST
+def api_image_batch(request):
+    """API endpoint compressing or converting many images, streamed back as a ZIP"""
+    # Spool every upload to disk so a large batch never sits in memory; workers read the paths
+    request.upload_handlers = [TemporaryFileUploadHandler(request)]
+    try:
+        files = request.FILES.getlist('files')
+        if not files:
+            return JsonResponse({'error': 'No files provided'}, status=400)
+        
+        max_files = getattr(settings, 'IMAGE_BATCH_MAX_FILES', 500)
+        if len(files) > max_files:
+            return JsonResponse({'error': f'At most {max_files} files per batch'}, status=400)
+        
+        operation = request.POST.get('operation', 'compress')
+        try:
+            quality = int(request.POST.get('quality', 80 if operation == 'compress' else 85))
+            resize_width = int(request.POST['resize_width']) if request.POST.get('resize_width') else None
+            target_size_kb = int(request.POST['target_size_kb']) if request.POST.get('target_size_kb') else None
+        except ValueError:
+            return JsonResponse({'error': 'quality, resize_width and target_size_kb must be integers'}, status=400)
+        target_format = request.POST.get('target_format', 'PNG').upper()
+        
+        if not 10 <= quality <= 95:
+            return JsonResponse({'error': 'quality must be between 10 and 95'}, status=400)
+        if operation == 'compress':
+            task = (compress_image, (quality, resize_width, target_size_kb))
+        elif operation == 'convert':
+            if target_format not in FORMAT_EXTENSIONS:
+                return JsonResponse({'error': f'Unsupported target format: {target_format}'}, status=400)
+            optimize = request.POST.get('optimize', '').lower() in ('1', 'true', 'on')
+            task = (convert_image_format, (target_format, quality, request.POST.get('tiff_compression'), optimize))
+        else:
+            return JsonResponse({'error': 'operation must be "compress" or "convert"'}, status=400)
+        
+        response = StreamingHttpResponse(
+            stream_zip(iter_image_batch(files, operation, task, target_format)),
+            content_type='application/zip'
+        )
+        return zip_response_headers(response, f'images-{operation}ed.zip')
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def iter_image_batch(files, operation, task, target_format):
+    """Run a batch through the image pool, yielding ZIP entries in upload order plus a report"""
+    func, args = task
+    window = getattr(settings, 'IMAGE_BATCH_WINDOW', 4)
+    report = {'operation': operation, 'total': len(files), 'succeeded': 0, 'failed': 0, 'items': []}
+    used_names = set()
+    pending = []
+    queue = iter(files)
+    
+    def output_name(upload, result):
+        stem = os.path.splitext(os.path.basename(upload.name))[0] or 'image'
+        if operation == 'compress':
+            # JPEG, unless an animation was kept in its own format
+            name = f"compressed_{stem}.{FORMAT_EXTENSIONS.get(sniff_format(result), 'jpg')}"
+        else:
+            name = f'{stem}_converted.{FORMAT_EXTENSIONS[target_format]}'
+        # Keep entries unique when several uploads share a name
+        base, ext = os.path.splitext(name)
+        counter = 2
+        while name in used_names:
+            name = f'{base}-{counter}{ext}'
+            counter += 1
+        used_names.add(name)
+        return name
+    
+    def submit(upload):
+        try:
+            pending.append((upload, submit_to_pool('image', func, upload, *args)))
+        except ToolPoolError as e:
+            pending.append((upload, e))
+    
+    try:
+        # Keep only a small window of images in flight so memory stays flat
+        for upload in queue:
+            submit(upload)
+            if len(pending) >= window:
+                break
+        
+        while pending:
+            upload, future = pending.pop(0)
+            item = {'file': upload.name}
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                result = wait_for_result(future)
+                if not result:
+                    raise ValueError('The file could not be processed as an image')
+                data = result.getvalue()
+                item.update({'status': 'ok', 'output': output_name(upload, result), 'size': len(data)})
+                report['succeeded'] += 1
+                yield item['output'], data
+            except Exception as e:
+                item.update({'status': 'error', 'error': str(e)})
+                report['failed'] += 1
+            finally:
+                upload.close()
+            report['items'].append(item)
+            
+            next_upload = next(queue, None)
+            if next_upload is not None:
+                submit(next_upload)
+    finally:
+        # Client went away: drop whatever has not started yet
+        for upload, future in pending:
+            if not isinstance(future, Exception):
+                future.cancel()
+    
+    yield 'report.json', json.dumps(report, indent=2).encode('utf-8'), zipfile.ZIP_DEFLATED
+
+
 def api_conversion_status(request, pk):
     """API endpoint to check conversion status"""
     try:
         conversion = get_object_or_404(FileConversion, pk=pk)
-        return JsonResponse({
-            'id': conversion.id,
-            'status': conversion.status,
-            'conversion_type': conversion.conversion_type,
-            'original_filename': conversion.original_filename,
-            'converted_filename': conversion.converted_filename,
-            'created_at': conversion.created_at.isoformat(),
-            'error_message': conversion.error_message
-        })
+        return JsonResponse(conversion_status_payload(conversion))
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def conversion_status_payload(conversion):
+    """Build the JSON body describing a queued conversion job"""
+    payload = {
+        'success': conversion.status != 'failed',
+        'id': conversion.id,
+        'job_id': conversion.id,
+        'conversion_id': conversion.id,
+        'status': conversion.status,
+        'progress': conversion.progress,
+        'conversion_type': conversion.conversion_type,
+        'original_filename': conversion.original_filename,
+        'converted_filename': conversion.converted_filename,
+        'created_at': conversion.created_at.isoformat(),
+        'started_at': conversion.started_at.isoformat() if conversion.started_at else None,
+        'status_url': reverse('tool_app:api_conversion_status', args=[conversion.id]),
+        'error_message': conversion.error_message
+    }
+    if conversion.status == 'completed':
+        payload['download_url'] = reverse('tool_app:download_file', args=[conversion.id])
+    return payload
+
+
 # Helper functions
 def process_file_conversion(conversion):
-    """Process file conversion based on type"""
-    try:
-        if conversion.conversion_type == 'txt_to_pdf':
-            return convert_txt_to_pdf(conversion.original_file)
-        elif conversion.conversion_type == 'pdf_to_txt':
-            return convert_pdf_to_txt(conversion.original_file)
-        elif conversion.conversion_type == 'doc_to_pdf':
-            return convert_doc_to_pdf(conversion.original_file)
-        elif conversion.conversion_type == 'pdf_to_doc':
-            return convert_pdf_to_doc(conversion.original_file)
-        elif conversion.conversion_type == 'image_compress':
-            return compress_image_file(conversion.original_file)
-        elif conversion.conversion_type == 'image_convert':
-            return convert_image_format_file(conversion.original_file)
-        else:
-            raise ValueError(f"Unsupported conversion type: {conversion.conversion_type}")
-    except Exception as e:
-        print(f"Conversion error: {e}")
-        return None
+    """Process file conversion based on type
+
+    Converters raise with a message saying what went wrong, which the job
+    records as the conversion's error message.
+    """
+    converters = {
+        'txt_to_pdf': convert_txt_to_pdf,
+        'pdf_to_txt': convert_pdf_to_txt,
+        'doc_to_pdf': convert_doc_to_pdf,
+        'pdf_to_doc': convert_pdf_to_doc,
+        'image_compress': compress_image_file,
+        'image_convert': convert_image_format_file,
+    }
+    converter = converters.get(conversion.conversion_type)
+    if converter is None:
+        raise ValueError(f"Unsupported conversion type: {conversion.conversion_type}")
+    
+    # Identical uploads with the same conversion type reuse the cached output
+    return cached_file_conversion(
+        conversion.original_file,
+        lambda: converter(conversion.original_file),
+        conversion_type=conversion.conversion_type
+    )
 
 
 def convert_txt_to_pdf(txt_file):
@@ -321,80 +563,83 @@ def convert_txt_to_pdf(txt_file):
         content = txt_file.read().decode('utf-8')
         
         # Create PDF
-        pdf_buffer = create_pdf_from_text(content, "Converted Document")
+        output = tempfile.TemporaryFile()
+        write_pdf_from_text(content, "Converted Document", output)
+        output.seek(0)
         
         # Save to file
         filename = f"converted_{txt_file.name.split('.')[0]}.pdf"
-        return ContentFile(pdf_buffer.getvalue(), name=filename)
+        return File(output, name=filename)
         
+    except UnicodeDecodeError as e:
+        print(f"TXT to PDF conversion error: {e}")
+        raise ValueError('The text file is not valid UTF-8') from e
     except Exception as e:
         print(f"TXT to PDF conversion error: {e}")
-        return None
+        raise ValueError(f'Could not convert the text file to PDF: {e}') from e
 
 
 def convert_pdf_to_txt(pdf_file):
     """Convert PDF to text file"""
     try:
-        # This is a simplified implementation
-        # For production, you'd use PyPDF2 or pdfplumber
-        content = "PDF to text conversion is not fully implemented in this demo.\nThis would require additional libraries like PyPDF2 or pdfplumber."
+        # Streamed to an anonymous temp file page by page, never held whole in memory
+        output = tempfile.TemporaryFile()
+        result = extract_text_to_file(pdf_file, output)
+        output.seek(0)
         
         filename = f"converted_{pdf_file.name.split('.')[0]}.txt"
-        return ContentFile(content.encode('utf-8'), name=filename)
+        converted = File(output, name=filename)
+        # A retry may get further, so text cut short by load is not cached
+        converted.cacheable = result['stopped'] not in TRANSIENT_STOPS
+        return converted
         
     except Exception as e:
         print(f"PDF to TXT conversion error: {e}")
-        return None
+        raise ValueError(f'Could not read the PDF: {e}') from e
 
 
 def convert_doc_to_pdf(doc_file):
     """Convert DOC/DOCX to PDF"""
     try:
-        # Read DOCX content
-        doc = Document(doc_file)
-        content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        
-        # Convert to PDF
-        pdf_buffer = create_pdf_from_text(content, "Converted Document")
+        # Headings, lists and tables are laid out as the body is walked
+        output = tempfile.TemporaryFile()
+        convert_docx_to_pdf_file(doc_file, output)
+        output.seek(0)
         
         filename = f"converted_{doc_file.name.split('.')[0]}.pdf"
-        return ContentFile(pdf_buffer.getvalue(), name=filename)
+        return File(output, name=filename)
         
     except Exception as e:
         print(f"DOC to PDF conversion error: {e}")
-        return None
+        raise ValueError(f'Could not read the document (only DOCX files are supported): {e}') from e
 
 
 def convert_pdf_to_doc(pdf_file):
     """Convert PDF to DOC/DOCX"""
     try:
-        # This is a simplified implementation
-        content = "PDF to DOC conversion is not fully implemented in this demo.\nThis would require additional libraries for PDF parsing."
-        
-        # Create DOCX
-        doc = Document()
-        doc.add_paragraph(content)
-        
-        # Save to buffer
-        doc_buffer = BytesIO()
-        doc.save(doc_buffer)
-        doc_buffer.seek(0)
+        # Paragraphs are streamed into the archive page by page
+        output = tempfile.TemporaryFile()
+        result = convert_pdf_to_docx_file(pdf_file, output)
+        output.seek(0)
         
         filename = f"converted_{pdf_file.name.split('.')[0]}.docx"
-        return ContentFile(doc_buffer.getvalue(), name=filename)
+        converted = File(output, name=filename)
+        # As with text, a document cut short by load is not cached
+        converted.cacheable = result['stopped'] not in TRANSIENT_STOPS
+        return converted
         
     except Exception as e:
         print(f"PDF to DOC conversion error: {e}")
-        return None
+        raise ValueError(f'Could not read the PDF: {e}') from e
 
 
 def create_pdf_from_text(text_content, title):
     """Create PDF from text content"""
     buffer = BytesIO()
     
-    # Create PDF document
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
+    # Create PDF document; invariant output leaves out the creation time and random file ID
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=int(getattr(settings, 'TEXT_PDF_INVARIANT', True)))
+    styles = get_stylesheet()
     story = []
     
     # Add title
@@ -412,6 +657,70 @@ def create_pdf_from_text(text_content, title):
     return buffer
 
 
+def write_pdf_from_text(text_content, title, output):
+    """Write a PDF of text_content to output (a path or binary file)
+
+    Texts of TEXT_PDF_FAST_THRESHOLD characters or more are laid out as
+    plain text and written page by page, from TEXT_PDF_PARALLEL_THRESHOLD
+    on the 'pdf_layout' and 'pdf_pages' pools; shorter ones, and any the standard fonts'
+    encoding cannot hold, go through create_pdf_from_text.
+    Returns output.
+    """
+    if isinstance(output, str):
+        with open(output, 'wb') as f:
+            write_pdf_from_text(text_content, title, f)
+        return output
+    
+    if use_parallel_path(text_content, title):
+        render_text_pdf_parallel(text_content, title, output)
+    elif use_fast_path(text_content, title):
+        render_text_pdf(text_content, title, output)
+    else:
+        output.write(create_pdf_from_text(text_content, title).getvalue())
+    return output
+
+
+def generate_text_pdf(text_content, title, pdf_path):
+    """Write a PDF of text_content to pdf_path without tying up the calling web worker"""
+    if use_parallel_path(text_content, title):
+        # Only coordinates here; the layout and rendering run on their own pools
+        return write_pdf_from_text(text_content, title, pdf_path)
+    return run_in_pool('pdf', write_pdf_from_text, text_content, title, pdf_path)
+
+
+def text_pdf_cache_key(text_content, title):
+    """Result cache key of the PDF for a text and title"""
+    renderer = 'plain' if use_fast_path(text_content, title) else 'platypus'
+    return make_cache_key(hash_text(text_content), conversion_type='text_to_pdf', title=title, renderer=renderer)
+
+
+def cached_text_pdf(text_content, title, filename):
+    """(artifact_id, path) of a new artifact holding the PDF for text_content and title
+
+    Generated PDFs are kept in the result cache, so the same text and title
+    is only rendered once and later requests copy the cached file.
+    """
+    if not result_cache_enabled():
+        artifact_id, pdf_path = create_artifact(filename)
+        generate_text_pdf(text_content, title, pdf_path)
+        return artifact_id, pdf_path
+    
+    key = text_pdf_cache_key(text_content, title)
+    cached_path = get_cached_path(key)
+    if cached_path:
+        with open(cached_path, 'rb') as f:
+            return save_artifact(f, filename)
+    
+    artifact_id, pdf_path = create_artifact(filename)
+    generate_text_pdf(text_content, title, pdf_path)
+    try:
+        with open(pdf_path, 'rb') as f:
+            store_result(key, f, filename='document.pdf')
+    except OSError as e:
+        print(f"Result cache write error: {e}")
+    return artifact_id, pdf_path
+
+
 # Image Processing Views
 def image_compression(request):
     """Image compression tool"""
@@ -419,17 +728,28 @@ def image_compression(request):
         form = ImageCompressionForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                compressed_file = compress_image(
-                    form.cleaned_data['image_file'],
-                    form.cleaned_data['quality'],
-                    form.cleaned_data.get('resize_width')
+                image_file = form.cleaned_data['image_file']
+                quality = form.cleaned_data['quality']
+                resize_width = form.cleaned_data.get('resize_width')
+                target_size_kb = form.cleaned_data.get('target_size_kb')
+                compressed_file = cached_conversion(
+                    image_file,
+                    lambda: run_in_pool('image', compress_image, image_file, quality, resize_width, target_size_kb),
+                    conversion_type='image_compress',
+                    quality=quality,
+                    resize_width=resize_width,
+                    target_size_kb=target_size_kb,
+                    resize_strategy=get_resize_strategy()
                 )
                 
                 if compressed_file:
-                    original_filename = form.cleaned_data['image_file'].name
-                    filename = f"compressed_{original_filename}"
+                    original_name = form.cleaned_data['image_file'].name.split('.')[0]
                     
-                    response = HttpResponse(compressed_file.getvalue(), content_type='image/jpeg')
+                    # JPEG, unless an animation was kept in its own format
+                    compressed_format = sniff_format(compressed_file)
+                    filename = f"compressed_{original_name}.{FORMAT_EXTENSIONS.get(compressed_format, 'jpg')}"
+                    content_type = FORMAT_CONTENT_TYPES.get(compressed_format, 'image/jpeg')
+                    response = HttpResponse(compressed_file.getvalue(), content_type=content_type)
                     response['Content-Disposition'] = f'attachment; filename="{filename}"'
                     return response
                 else:
@@ -448,28 +768,72 @@ def image_conversion(request):
         form = ImageConversionForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                converted_file = convert_image_format(
-                    form.cleaned_data['image_file'],
-                    form.cleaned_data['target_format'],
-                    form.cleaned_data['quality']
-                )
+                image_file = form.cleaned_data['image_file']
+                target_format = form.cleaned_data['target_format']
+                quality = form.cleaned_data['quality']
+                tiff_compression = form.cleaned_data['tiff_compression'] or None
+                optimize = form.cleaned_data['optimize_png']
+
+                original_name = form.cleaned_data['image_file'].name.split('.')[0]
+                target_ext = form.cleaned_data['target_format'].lower()
+                if target_ext == 'jpeg':
+                    target_ext = 'jpg'
+                filename = f"{original_name}_converted.{target_ext}"
                 
-                if converted_file:
-                    original_name = form.cleaned_data['image_file'].name.split('.')[0]
-                    target_ext = form.cleaned_data['target_format'].lower()
-                    if target_ext == 'jpeg':
-                        target_ext = 'jpg'
-                    filename = f"{original_name}_converted.{target_ext}"
+                content_type = f"image/{target_ext}"
+                if target_ext == 'svg':
+                    content_type = 'image/svg+xml'
+
+                if form.cleaned_data['tiled'] and target_format != AUTO_FORMAT:
+                    # Written straight to disk and streamed back; too large for the result cache
+                    _, output_path = create_artifact(filename)
+                    converted_path = run_in_pool(
+                        'image', convert_image_format_tiled,
+                        image_file, output_path, target_format, quality, tiff_compression
+                    )
                     
-                    content_type = f"image/{target_ext}"
-                    if target_ext == 'svg':
-                        content_type = 'image/svg+xml'
-                    
-                    response = HttpResponse(converted_file.getvalue(), content_type=content_type)
-                    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                    return response
+                    if converted_path:
+                        return FileResponse(
+                            open(converted_path, 'rb'),
+                            as_attachment=True,
+                            filename=filename,
+                            content_type=content_type
+                        )
+                    else:
+                        messages.error(request, 'Image conversion failed.')
                 else:
-                    messages.error(request, 'Image conversion failed.')
+                    # 'auto' output depends on which formats the browser accepts
+                    formats = None
+                    if target_format == AUTO_FORMAT:
+                        formats = acceptable_formats(request.META.get('HTTP_ACCEPT'))
+                    
+                    converted_file = cached_conversion(
+                        image_file,
+                        lambda: run_in_pool(
+                            'image', convert_image_format,
+                            image_file, target_format, quality, tiff_compression, optimize, formats
+                        ),
+                        conversion_type='image_convert',
+                        target_format=target_format,
+                        quality=quality,
+                        tiff_compression=tiff_compression,
+                        optimize=optimize,
+                        formats=formats
+                    )
+                    
+                    if converted_file:
+                        if target_format == AUTO_FORMAT:
+                            chosen_format = sniff_format(converted_file)
+                            filename = f"{original_name}_converted.{FORMAT_EXTENSIONS[chosen_format]}"
+                            content_type = FORMAT_CONTENT_TYPES[chosen_format]
+                        
+                        response = HttpResponse(converted_file.getvalue(), content_type=content_type)
+                        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+                        if target_format == AUTO_FORMAT:
+                            patch_vary_headers(response, ['Accept'])
+                        return response
+                    else:
+                        messages.error(request, 'Image conversion failed.')
             except Exception as e:
                 messages.error(request, f'Error converting image: {str(e)}')
     else:
@@ -484,7 +848,9 @@ def qr_code_generator(request):
         form = QRCodeForm(request.POST)
         if form.is_valid():
             try:
-                qr_file = generate_qr_code(
+                qr_file = run_in_pool(
+                    'qr',
+                    generate_qr_code,
                     form.cleaned_data['content'],
                     form.cleaned_data['size'],
                     form.cleaned_data['format']
@@ -621,65 +987,110 @@ def robots_sitemap_generator(request):
 
 
 # Image Processing Helper Functions
-def compress_image(image_file, quality, resize_width=None):
-    """Compress image with optional resizing"""
+def compress_image(image_file, quality, resize_width=None, target_size_kb=None):
+    """Compress image with optional resizing, or to at most target_size_kb"""
     try:
-        # Open image
-        image = Image.open(image_file)
+        # Open image; oversized images are refused before any pixels are decoded
+        image = open_image(image_file)
+        
+        # Animations stay animated in their own format, with frames resized on a thread pool
+        if is_multi_frame(image) and image.format in ('GIF', 'WEBP', 'PNG') and not target_size_kb:
+            buffer = BytesIO()
+            convert_frames(image, buffer, image.format, quality, resize_width=resize_width)
+            buffer.seek(0)
+            return buffer
+        
+        # Palette images cannot be resampled directly
+        if image.mode == 'P':
+            image = image.convert('RGB')
+        
+        # Resize if width specified; JPEGs are decoded straight at a reduced scale
+        if resize_width:
+            image = resize_to_width(image, resize_width)
         
         # Convert to RGB if necessary (for JPEG compatibility)
         if image.mode in ('RGBA', 'P'):
             image = image.convert('RGB')
         
-        # Resize if width specified
-        if resize_width:
-            width_percent = (resize_width / float(image.size[0]))
-            height = int((float(image.size[1]) * float(width_percent)))
-            image = image.resize((resize_width, height), Image.Resampling.LANCZOS)
+        # Search quality (then scale) on the decoded image to fit the size budget
+        if target_size_kb:
+            buffer, info = compress_to_size(image, target_size_kb * 1024, max_quality=quality)
+            return buffer
         
         # Save compressed image
-        buffer = BytesIO()
-        image.save(buffer, format='JPEG', quality=quality, optimize=True)
-        buffer.seek(0)
-        
-        return buffer
+        return encode_image(image, 'JPEG', quality)
         
+    except ImageRejected:
+        raise
     except Exception as e:
         print(f"Image compression error: {e}")
         return None
 
 
-def convert_image_format(image_file, target_format, quality=85):
-    """Convert image to different format"""
+def convert_image_format(image_file, target_format, quality=85, tiff_compression=None, optimize=False, formats=None):
+    """Convert image to different format
+
+    With target_format 'AUTO' the image is encoded as each of formats in
+    parallel and the smallest acceptable result is returned.
+    """
     try:
-        # Open image
-        image = Image.open(image_file)
+        # Open image; oversized images are refused before any pixels are decoded
+        image = open_image(image_file)
+        
+        if target_format == AUTO_FORMAT:
+            # The caller reads the chosen format back from the encoded header
+            chosen_format, buffer, info = choose_smallest_format(image, formats, quality)
+            return buffer
+        
+        # Animations and multi-page TIFFs keep every frame, encoded one frame at a time
+        if is_multi_frame(image) and target_format in ANIMATED_FORMATS:
+            buffer = BytesIO()
+            convert_frames(image, buffer, target_format, quality, tiff_compression)
+            buffer.seek(0)
+            return buffer
+        
+        # Lossless reductions and an encoder search, within a time budget
+        if target_format == 'PNG' and optimize:
+            buffer, info = optimize_png(image)
+            return buffer
         
         # Handle different target formats
-        buffer = BytesIO()
+        return encode_image(image, target_format, quality, tiff_compression)
         
-        if target_format == 'JPEG':
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-            image.save(buffer, format='JPEG', quality=quality, optimize=True)
-        elif target_format == 'PNG':
-            image.save(buffer, format='PNG', optimize=True)
-        elif target_format == 'WEBP':
-            image.save(buffer, format='WEBP', quality=quality, optimize=True)
-        elif target_format == 'BMP':
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-            image.save(buffer, format='BMP')
-        elif target_format == 'TIFF':
-            image.save(buffer, format='TIFF')
-        else:
-            raise ValueError(f"Unsupported target format: {target_format}")
+    except ImageRejected:
+        raise
+    except Exception as e:
+        print(f"Image conversion error: {e}")
+        return None
+
+
+def convert_image_format_tiled(image_file, output_path, target_format, quality=85, tiff_compression=None):
+    """Convert an image into output_path, band by band when the source allows it
+
+    Striped and tiled TIFFs converted to TIFF or PNG never hold more than one
+    band in memory, and animations and multi-page TIFFs never more than one
+    frame; anything else falls back to the regular in-memory conversion.
+    Returns output_path, or None on failure.
+    """
+    try:
+        tiled = target_format in TILED_FORMATS
+        image = open_image(image_file, tiled=tiled)
+        
+        # Read back as well as written: multi-page TIFF output patches earlier pages
+        with open(output_path, 'w+b') as output:
+            if is_multi_frame(image) and target_format in ANIMATED_FORMATS:
+                convert_frames(image, output, target_format, quality, tiff_compression)
+            elif tiled and band_layout(image) is not None:
+                convert_tiled(image, output, target_format, tiff_compression)
+            else:
+                output.write(encode_image(image, target_format, quality, tiff_compression).getvalue())
         
-        buffer.seek(0)
-        return buffer
+        return output_path
         
+    except ImageRejected:
+        raise
     except Exception as e:
-        print(f"Image conversion error: {e}")
+        print(f"Tiled image conversion error: {e}")
         return None
 
 
@@ -740,28 +1151,31 @@ def compress_image_file(image_file, quality=80):
     try:
         compressed = compress_image(image_file, quality)
         if compressed:
-            filename = f"compressed_{image_file.name.split('.')[0]}.jpg"
+            # JPEG, unless an animation was kept in its own format
+            extension = FORMAT_EXTENSIONS.get(sniff_format(compressed), 'jpg')
+            filename = f"compressed_{image_file.name.split('.')[0]}.{extension}"
             return ContentFile(compressed.getvalue(), name=filename)
-        return None
     except Exception as e:
         print(f"Image file compression error: {e}")
-        return None
+        raise ValueError(f'Could not compress the image: {e}') from e
+    raise ValueError('The file could not be read as an image')
 
 
 def convert_image_format_file(image_file, target_format='PNG'):
     """Convert image file format with default settings"""
     try:
-        converted = convert_image_format(image_file, target_format)
+        # Stored conversions are kept around, so spend the time to shrink them
+        converted = convert_image_format(image_file, target_format, optimize=True)
         if converted:
             ext = target_format.lower()
             if ext == 'jpeg':
                 ext = 'jpg'
             filename = f"converted_{image_file.name.split('.')[0]}.{ext}"
             return ContentFile(converted.getvalue(), name=filename)
-        return None
     except Exception as e:
         print(f"Image format conversion error: {e}")
-        return None
+        raise ValueError(f'Could not convert the image: {e}') from e
+    raise ValueError('The file could not be read as an image')
 
 
 # Web & SEO Helper Functions
@@ -1364,7 +1778,10 @@ def meme_generator(request):
                 top_text = form.cleaned_data['top_text']
                 bottom_text = form.cleaned_data['bottom_text']
                 font_size = form.cleaned_data['font_size']
-                meme_result = create_meme(image_file, top_text, bottom_text, font_size)
+                inline = bool(request.POST.get('inline'))
+                meme_result = run_in_pool(
+                    'meme', create_meme, image_file, top_text, bottom_text, font_size, inline=inline
+                )
             except Exception as e:
                 messages.error(request, f'Error creating meme: {str(e)}')
     else:
@@ -1465,11 +1882,107 @@ def unit_converter(request):
 
 # Fun Tools Helper Functions
 
-def create_meme(image_file, top_text, bottom_text, font_size):
-    """Create a meme from image and text"""
+MEME_OUTLINE_WIDTH = 2
+
+
+def draw_meme_text(draw, size, top_text, bottom_text, font, outline_width=MEME_OUTLINE_WIDTH):
+    """Draw upper-cased, wrapped meme captions in white with a black outline
+
+    Top text runs down from the top edge and bottom text up from the bottom
+    edge, placed by each line's glyph box. Each line is drawn once; FreeType
+    strokes the outline, so the cost does not grow with outline_width.
+    """
+    width, height = size
+    
+    # Add top text
+    if top_text:
+        lines = textwrap.fill(top_text.upper(), width=20).split('\n')
+        for i, line in enumerate(lines):
+            bbox = draw.textbbox((0, 0), line, font=font)
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+            
+            # Centered, near top
+            x = (width - text_width) // 2
+            y = 10 + (i * (text_height + 5))
+            draw.text((x - bbox[0], y - bbox[1]), line, font=font, fill='white',
+                      stroke_width=outline_width, stroke_fill='black')
+    
+    # Add bottom text
+    if bottom_text:
+        lines = textwrap.fill(bottom_text.upper(), width=20).split('\n')
+        for i, line in enumerate(reversed(lines)):
+            bbox = draw.textbbox((0, 0), line, font=font)
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+            
+            # Centered, near bottom
+            x = (width - text_width) // 2
+            y = height - 10 - (text_height * (i + 1)) - (i * 5)
+            draw.text((x - bbox[0], y - bbox[1]), line, font=font, fill='white',
+                      stroke_width=outline_width, stroke_fill='black')
+
+
+def render_meme_overlay(size, top_text, bottom_text, font):
+    """Render the captions once on a transparent layer
+
+    Returns (piece, offset) pairs cropped to the text in the top and bottom
+    halves, so compositing only touches the pixels that hold text.
+    """
+    width, height = size
+    overlay = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw_meme_text(ImageDraw.Draw(overlay), size, top_text, bottom_text, font)
+    
+    pieces = []
+    for top, bottom in ((0, height // 2), (height // 2, height)):
+        band = overlay.crop((0, top, width, bottom))
+        box = band.getbbox()
+        if box:
+            pieces.append((band.crop(box), (box[0], top + box[1])))
+    return pieces
+
+
+def composite_meme_overlay(frame, pieces):
+    """Alpha-composite pre-rendered caption pieces onto one frame"""
+    if frame.mode != 'RGBA':
+        frame = frame.convert('RGBA')
+    for piece, offset in pieces:
+        frame.alpha_composite(piece, offset)
+    return frame
+
+
+def create_meme(image_file, top_text, bottom_text, font_size, inline=False):
+    """Create a meme from image and text
+
+    Animated GIF, WebP and PNG templates stay animated: the captions are
+    rendered once and composited onto each frame on a thread pool while the
+    frames stream into the output.
+    """
     try:
         # Open and process the image
-        image = Image.open(image_file)
+        image = open_image(image_file)
+        font = get_font(font_size)
+        
+        if is_multi_frame(image) and image.format in ('GIF', 'WEBP', 'PNG'):
+            target_format = image.format
+            artifact_id, output_path = create_artifact(f'meme.{FORMAT_EXTENSIONS[target_format]}')
+            pieces = render_meme_overlay(image.size, top_text, bottom_text, font)
+            with open(output_path, 'wb') as output:
+                convert_frames(
+                    image, output, target_format, quality=90,
+                    transform=lambda frame: composite_meme_overlay(frame, pieces)
+                )
+            
+            return {
+                'success': True,
+                'download_url': artifact_url(artifact_id),
+                'image_data': inline_artifact_data(output_path, inline),
+                'content_type': FORMAT_CONTENT_TYPES[target_format],
+                'extension': FORMAT_EXTENSIONS[target_format],
+                'top_text': top_text,
+                'bottom_text': bottom_text,
+                'font_size': font_size
+            }
         
         # Convert to RGB if necessary
         if image.mode != 'RGB':
@@ -1478,76 +1991,20 @@ def create_meme(image_file, top_text, bottom_text, font_size):
         # Get image dimensions
         width, height = image.size
         
-        # Create drawing context
+        # Fonts come from the per-process registry; the outline is drawn with the text
         draw = ImageDraw.Draw(image)
+        draw_meme_text(draw, (width, height), top_text, bottom_text, font)
         
-        # Try to use a better font, fall back to default
-        try:
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except:
-            try:
-                font = ImageFont.truetype("DejaVuSans-Bold.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-        
-        # Add top text
-        if top_text:
-            # Wrap text if needed
-            wrapped_text = textwrap.fill(top_text.upper(), width=20)
-            lines = wrapped_text.split('\n')
-            
-            for i, line in enumerate(lines):
-                # Get text size
-                bbox = draw.textbbox((0, 0), line, font=font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-                
-                # Calculate position (centered, near top)
-                x = (width - text_width) // 2
-                y = 10 + (i * (text_height + 5))
-                
-                # Draw text with outline
-                outline_width = 2
-                for dx in range(-outline_width, outline_width + 1):
-                    for dy in range(-outline_width, outline_width + 1):
-                        draw.text((x + dx, y + dy), line, font=font, fill='black')
-                draw.text((x, y), line, font=font, fill='white')
-        
-        # Add bottom text
-        if bottom_text:
-            # Wrap text if needed
-            wrapped_text = textwrap.fill(bottom_text.upper(), width=20)
-            lines = wrapped_text.split('\n')
-            
-            for i, line in enumerate(reversed(lines)):
-                # Get text size
-                bbox = draw.textbbox((0, 0), line, font=font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-                
-                # Calculate position (centered, near bottom)
-                x = (width - text_width) // 2
-                y = height - 10 - (text_height * (i + 1)) - (i * 5)
-                
-                # Draw text with outline
-                outline_width = 2
-                for dx in range(-outline_width, outline_width + 1):
-                    for dy in range(-outline_width, outline_width + 1):
-                        draw.text((x + dx, y + dy), line, font=font, fill='black')
-                draw.text((x, y), line, font=font, fill='white')
-        
-        # Save to buffer
-        buffer = BytesIO()
-        image.save(buffer, format='JPEG', quality=95)
-        buffer.seek(0)
-        
-        # Encode to base64 for display
-        import base64
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        # Save straight into the artifact store
+        artifact_id, output_path = create_artifact('meme.jpg')
+        image.save(output_path, format='JPEG', quality=95)
         
         return {
             'success': True,
-            'image_data': image_base64,
+            'download_url': artifact_url(artifact_id),
+            'image_data': inline_artifact_data(output_path, inline),
+            'content_type': 'image/jpeg',
+            'extension': 'jpg',
             'top_text': top_text,
             'bottom_text': bottom_text,
             'font_size': font_size
@@ -1810,7 +2267,8 @@ def audio_converter(request):
                 audio_file = form.cleaned_data['audio_file']
                 target_format = form.cleaned_data['target_format']
                 quality = form.cleaned_data['quality']
-                conversion_result = convert_audio_format(audio_file, target_format, quality)
+                inline = bool(request.POST.get('inline'))
+                conversion_result = convert_audio_format(audio_file, target_format, quality, inline=inline)
             except Exception as e:
                 messages.error(request, f'Error converting audio: {str(e)}')
     else:
@@ -1833,7 +2291,10 @@ def audio_speed_changer(request):
                 speed_multiplier = form.cleaned_data['speed_multiplier']
                 preserve_pitch = form.cleaned_data['preserve_pitch']
                 output_format = form.cleaned_data['output_format']
-                processing_result = change_audio_speed(audio_file, speed_multiplier, preserve_pitch, output_format)
+                inline = bool(request.POST.get('inline'))
+                processing_result = change_audio_speed(
+                    audio_file, speed_multiplier, preserve_pitch, output_format, inline=inline
+                )
             except Exception as e:
                 messages.error(request, f'Error changing audio speed: {str(e)}')
     else:
@@ -1857,8 +2318,9 @@ def video_to_audio(request):
                 audio_quality = form.cleaned_data['audio_quality']
                 start_time = form.cleaned_data.get('start_time')
                 end_time = form.cleaned_data.get('end_time')
+                inline = bool(request.POST.get('inline'))
                 extraction_result = extract_audio_from_video(
-                    video_file, audio_format, audio_quality, start_time, end_time
+                    video_file, audio_format, audio_quality, start_time, end_time, inline=inline
                 )
             except Exception as e:
                 messages.error(request, f'Error extracting audio: {str(e)}')
@@ -1873,66 +2335,34 @@ def video_to_audio(request):
 
 # Audio/Video Processing Helper Functions
 
-def convert_audio_format(audio_file, target_format, quality):
+def convert_audio_format(audio_file, target_format, quality, inline=False):
     """Convert audio file to different format"""
     try:
-        # Create temporary files
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_file.name.split(".")[-1]}') as temp_input:
-            # Write uploaded file to temp file
-            for chunk in audio_file.chunks():
-                temp_input.write(chunk)
-            temp_input_path = temp_input.name
-        
-        # Load audio with pydub
-        audio = AudioSegment.from_file(temp_input_path)
-        
-        # Get audio information
-        original_info = {
-            'duration': len(audio) / 1000.0,  # seconds
-            'channels': audio.channels,
-            'sample_rate': audio.frame_rate,
-            'bitrate': audio.frame_rate * audio.frame_width * 8 * audio.channels // 1000 if audio.frame_width else 'Unknown'
-        }
-        
-        # Create output temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{target_format}') as temp_output:
-            temp_output_path = temp_output.name
+        # Read duration, channels and sample rate from the container headers
+        original_info = audio_info_from_probe(probe_media_cached(audio_file))
         
-        # Export with specified quality
-        export_params = {'format': target_format}
-        if target_format in ['mp3', 'aac', 'ogg']:
-            export_params['bitrate'] = f'{quality}k'
+        # Stream the upload through ffmpeg straight into the artifact store
+        filename = f"converted.{target_format}"
+        artifact_id, output_path = create_artifact(filename)
+        transcode_audio(audio_file, output_path, target_format, bitrate=quality)
         
-        audio.export(temp_output_path, **export_params)
-        
-        # Read the converted file
-        with open(temp_output_path, 'rb') as f:
-            converted_data = f.read()
-        
-        # Get converted file info
-        converted_audio = AudioSegment.from_file(temp_output_path)
+        # Get converted file info from a probe instead of decoding it again
+        probed = audio_info_from_probe(probe_media(output_path))
         converted_info = {
-            'duration': len(converted_audio) / 1000.0,
-            'channels': converted_audio.channels,
-            'sample_rate': converted_audio.frame_rate,
-            'size': len(converted_data)
+            'duration': probed['duration'],
+            'channels': probed['channels'],
+            'sample_rate': probed['sample_rate'],
+            'size': os.path.getsize(output_path)
         }
         
-        # Clean up temp files
-        os.unlink(temp_input_path)
-        os.unlink(temp_output_path)
-        
-        # Encode to base64 for download
-        import base64
-        audio_base64 = base64.b64encode(converted_data).decode('utf-8')
-        
         return {
             'success': True,
-            'audio_data': audio_base64,
+            'download_url': artifact_url(artifact_id),
+            'audio_data': inline_artifact_data(output_path, inline),
             'original_format': audio_file.name.split('.')[-1].upper(),
             'target_format': target_format.upper(),
             'quality': quality,
-            'filename': f"converted.{target_format}",
+            'filename': filename,
             'original_info': original_info,
             'converted_info': converted_info
         }
@@ -1944,71 +2374,55 @@ def convert_audio_format(audio_file, target_format, quality):
         }
 
 
-def change_audio_speed(audio_file, speed_multiplier, preserve_pitch, output_format):
+def change_audio_speed(audio_file, speed_multiplier, preserve_pitch, output_format, inline=False):
     """Change audio playback speed"""
     try:
-        # Create temporary files
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_file.name.split(".")[-1]}') as temp_input:
-            for chunk in audio_file.chunks():
-                temp_input.write(chunk)
-            temp_input_path = temp_input.name
-        
-        # Load audio
-        audio = AudioSegment.from_file(temp_input_path)
-        
-        # Get original info
-        original_duration = len(audio) / 1000.0
+        filename = f"speed_changed.{output_format}"
+        artifact_id, output_path = create_artifact(filename)
         
         # Change speed
         if preserve_pitch:
-            # Use speedup method that preserves pitch (simple approach)
-            # Note: This is a basic implementation. For professional use, 
-            # consider using librosa or other advanced audio processing libraries
-            if speed_multiplier > 1:
-                # Speed up: remove samples
-                audio = audio[::int(speed_multiplier)]
-            else:
-                # Slow down: interpolate (basic approach)
-                audio = audio._spawn(audio.raw_data, overrides={'frame_rate': int(audio.frame_rate * speed_multiplier)})
-                audio = audio.set_frame_rate(audio.frame_rate)
+            # Phase-vocoder time-stretch, streamed between an ffmpeg decoder and encoder
+            audio_info = stretch_audio(audio_file, output_path, speed_multiplier, output_format)
+            original_duration = audio_info['duration']
         else:
+            # Create temporary files
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_file.name.split(".")[-1]}') as temp_input:
+                for chunk in audio_file.chunks():
+                    temp_input.write(chunk)
+                temp_input_path = temp_input.name
+            
+            # Load audio
+            audio = AudioSegment.from_file(temp_input_path)
+            
+            # Get original info
+            original_duration = len(audio) / 1000.0
+            
             # Simple speed change (changes pitch)
             new_sample_rate = int(audio.frame_rate * speed_multiplier)
             audio = audio._spawn(audio.raw_data, overrides={'frame_rate': new_sample_rate})
             audio = audio.set_frame_rate(audio.frame_rate)
-        
-        # Create output temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{output_format}') as temp_output:
-            temp_output_path = temp_output.name
-        
-        # Export processed audio
-        audio.export(temp_output_path, format=output_format)
-        
-        # Read the processed file
-        with open(temp_output_path, 'rb') as f:
-            processed_data = f.read()
-        
-        # Clean up
-        os.unlink(temp_input_path)
-        os.unlink(temp_output_path)
+            
+            # Export processed audio straight into the artifact store
+            audio.export(output_path, format=output_format)
+            
+            # Clean up
+            os.unlink(temp_input_path)
         
         # Calculate new duration
         new_duration = original_duration / speed_multiplier
         
-        # Encode to base64
-        import base64
-        audio_base64 = base64.b64encode(processed_data).decode('utf-8')
-        
         return {
             'success': True,
-            'audio_data': audio_base64,
-            'filename': f"speed_changed.{output_format}",
+            'download_url': artifact_url(artifact_id),
+            'audio_data': inline_artifact_data(output_path, inline),
+            'filename': filename,
             'speed_multiplier': speed_multiplier,
             'preserve_pitch': preserve_pitch,
             'output_format': output_format.upper(),
             'original_duration': original_duration,
             'new_duration': new_duration,
-            'size': len(processed_data)
+            'size': os.path.getsize(output_path)
         }
         
     except Exception as e:
@@ -2018,98 +2432,60 @@ def change_audio_speed(audio_file, speed_multiplier, preserve_pitch, output_form
         }
 
 
-def extract_audio_from_video(video_file, audio_format, audio_quality, start_time=None, end_time=None):
+def extract_audio_from_video(video_file, audio_format, audio_quality, start_time=None, end_time=None, inline=False):
     """Extract audio from video file"""
     try:
-        # Check if VideoFileClip is available
-        if VideoFileClip is None:
-            return {
-                'success': False,
-                'error': 'MoviePy library is not properly installed. Please install it with: pip install moviepy'
-            }
-            
-        # Create temporary files
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{video_file.name.split(".")[-1]}') as temp_input:
-            for chunk in video_file.chunks():
-                temp_input.write(chunk)
-            temp_input_path = temp_input.name
-        
-        # Load video with moviepy
-        video_clip = VideoFileClip(temp_input_path)
-        
-        # Get video information
-        video_info = {
-            'duration': video_clip.duration,
-            'fps': video_clip.fps,
-            'size': video_clip.size,
-            'has_audio': video_clip.audio is not None
-        }
+        # Get video information from the container headers before decoding anything
+        video_info = video_info_from_probe(probe_media_cached(video_file))
         
-        if not video_clip.audio:
-            video_clip.close()
-            os.unlink(temp_input_path)
+        if not video_info['has_audio']:
             return {
                 'success': False,
                 'error': 'This video file does not contain audio'
             }
         
-        # Extract audio
-        audio_clip = video_clip.audio
-        
         # Apply time range if specified
+        start_seconds = 0
+        end_seconds = None
         if start_time or end_time:
             start_seconds = parse_time_to_seconds(start_time) if start_time else 0
-            end_seconds = parse_time_to_seconds(end_time) if end_time else video_clip.duration
+            end_seconds = parse_time_to_seconds(end_time) if end_time else video_info['duration']
             
-            if start_seconds < end_seconds and start_seconds >= 0 and end_seconds <= video_clip.duration:
-                audio_clip = audio_clip.subclip(start_seconds, end_seconds)
-            else:
-                video_clip.close()
-                os.unlink(temp_input_path)
+            if not (start_seconds < end_seconds and start_seconds >= 0 and end_seconds <= video_info['duration']):
                 return {
                     'success': False,
                     'error': 'Invalid time range specified'
                 }
         
-        # Create output temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_format}') as temp_output:
-            temp_output_path = temp_output.name
-        
-        # Export audio with quality settings
-        audio_params = {}
-        if audio_format == 'mp3':
-            audio_params['bitrate'] = f'{audio_quality}k'
-        elif audio_format == 'aac':
-            audio_params['bitrate'] = f'{audio_quality}k'
-        
-        audio_clip.write_audiofile(temp_output_path, **audio_params, verbose=False, logger=None)
-        
-        # Read the extracted audio file
-        with open(temp_output_path, 'rb') as f:
-            audio_data = f.read()
+        # Remux the audio track as-is when its codec already fits the target format
+        stream_copy = can_stream_copy(video_info['audio_codec'], audio_format)
+        
+        # Export audio straight into the artifact store, seeking in the input for trims
+        filename = f"extracted_audio.{audio_format}"
+        artifact_id, output_path = create_artifact(filename)
+        transcode_audio(
+            video_file, output_path, audio_format,
+            bitrate=audio_quality,
+            start=start_seconds,
+            end=end_seconds,
+            stream_copy=stream_copy
+        )
         
         # Get audio information
+        duration = (end_seconds if end_seconds is not None else video_info['duration']) - start_seconds
         audio_info = {
-            'duration': audio_clip.duration,
-            'size': len(audio_data),
+            'duration': duration,
+            'size': os.path.getsize(output_path),
             'format': audio_format.upper(),
-            'quality': f'{audio_quality} kbps'
+            'quality': 'Original (no re-encoding)' if stream_copy else f'{audio_quality} kbps',
+            'stream_copy': stream_copy
         }
         
-        # Clean up
-        video_clip.close()
-        audio_clip.close()
-        os.unlink(temp_input_path)
-        os.unlink(temp_output_path)
-        
-        # Encode to base64
-        import base64
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-        
         return {
             'success': True,
-            'audio_data': audio_base64,
-            'filename': f"extracted_audio.{audio_format}",
+            'download_url': artifact_url(artifact_id),
+            'audio_data': inline_artifact_data(output_path, inline),
+            'filename': filename,
             'video_info': video_info,
             'audio_info': audio_info,
             'start_time': start_time,
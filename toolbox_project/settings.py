@@ -128,6 +128,120 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Conversion job queue
+# Run the worker pool with `python manage.py conversion_worker`. Set
+# CONVERSION_QUEUE_EAGER = True to convert inline when no workers are running.
+CONVERSION_QUEUE_EAGER = False
+CONVERSION_WORKER_PROCESSES = 2
+CONVERSION_WORKER_POLL_INTERVAL = 1.0  # seconds
+CONVERSION_JOB_HEARTBEAT = 30  # seconds between a running job's heartbeats
+CONVERSION_JOB_TIMEOUT = 600  # seconds without a heartbeat before a job is requeued
+CONVERSION_JOB_MAX_ATTEMPTS = 3  # claims before a job that keeps stalling is marked failed
+
+# Content-addressed cache for conversion results, stored under MEDIA_ROOT.
+# Hit/miss counters are kept in the database, shared by every process.
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_DIR = 'cache'
+RESULT_CACHE_MAX_BYTES = 500 * 1024 * 1024  # LRU eviction above this size
+RESULT_CACHE_LOW_WATER = 0.9  # eviction frees space down to this fraction of the budget
+RESULT_CACHE_SWEEP_INTERVAL = 300  # seconds between full walks of the cache per process
+
+# Artifact store for generated downloads (audio, memes, PDFs). Outputs are
+# written once under MEDIA_ROOT and served through signed, expiring URLs.
+ARTIFACT_DIR = 'artifacts'
+ARTIFACT_TTL = 60 * 60  # seconds a download link stays valid
+ARTIFACT_INLINE_MAX_BYTES = 1024 * 1024  # largest output allowed in opt-in inline (base64) mode
+ARTIFACT_FILENAME_MAX_LENGTH = 100  # longer user-supplied download names are truncated
+ARTIFACT_PURGE_INTERVAL = 60  # seconds between scans for expired artifacts
+
+# ffmpeg/ffprobe used for streaming audio and video processing
+FFMPEG_BINARY = 'ffmpeg'
+FFPROBE_BINARY = 'ffprobe'
+MEDIA_PROCESS_TIMEOUT = 300  # seconds
+MEDIA_PROBE_CACHE_TTL = 24 * 60 * 60  # probe results are cached by content hash
+
+# Warm process pools for CPU-bound tools (Pillow, reportlab, qrcode), so web
+# workers only do I/O. Set TOOL_POOL_ENABLED = False to run the tools inline.
+TOOL_POOL_ENABLED = True
+TOOL_POOL_WORKERS = {
+    'image': 2,
+    'meme': 1,
+    'qr': 1,
+    'pdf': 1,
+    'pdf_text': 4,  # page runs of one PDF extracted in parallel
+    'pdf_pages': 4,  # page batches of one very large text-to-PDF rendered in parallel
+    'pdf_layout': 2,  # text chunks wrapped ahead of the pdf_pages renderers
+}
+TOOL_POOL_QUEUE_SIZE = 8  # tasks allowed to wait per pool beyond the running ones
+TOOL_POOL_QUEUE_TIMEOUT = 5  # seconds to wait for a queue slot before reporting busy
+TOOL_POOL_TIMEOUT = 60  # seconds before a task is cancelled
+TOOL_POOL_START_METHOD = 'forkserver'
+
+# Image downscaling: 'speed' lets JPEG draft decoding and Image.reduce do
+# nearly all the shrinking; 'quality' keeps 3x headroom for the final LANCZOS.
+IMAGE_RESIZE_STRATEGY = 'quality'
+
+# Image admission: uploads are checked from their header before decoding.
+# Over budget, JPEGs are decoded at 1/2-1/8 scale ('downsample') and anything
+# else is refused; with 'reject' every oversized image is refused. Counters
+# (`manage.py image_admission`) are kept in the database.
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_DECODE_BYTES = 256 * 1024 * 1024
+IMAGE_OVERSIZE_POLICY = 'downsample'
+
+# Responsive variants API: one decode, a downscale pyramid, parallel encodes
+IMAGE_VARIANT_WORKERS = 4  # encoder threads per request
+IMAGE_VARIANT_MAX_WIDTHS = 8
+
+# Batch image API: uploads run through the 'image' tool pool, at most
+# IMAGE_BATCH_WINDOW at a time, and results stream back as a ZIP
+IMAGE_BATCH_MAX_FILES = 500
+IMAGE_BATCH_WINDOW = 4
+DATA_UPLOAD_MAX_NUMBER_FILES = IMAGE_BATCH_MAX_FILES
+
+# Tiled conversion: striped/tiled TIFFs converted to TIFF or PNG are read and
+# written in bands of about IMAGE_TILE_BYTES decoded, so they are admitted up
+# to IMAGE_TILED_MAX_PIXELS instead of IMAGE_MAX_PIXELS.
+IMAGE_TILE_BYTES = 16 * 1024 * 1024
+IMAGE_TILED_MAX_PIXELS = 1_000_000_000
+IMAGE_TIFF_COMPRESSION = 'lzw'  # default for TIFF output: 'lzw', 'deflate' or 'none'
+
+# Optimized PNG output: seconds of encoder search per image after the first encode
+IMAGE_PNG_OPTIMIZE_BUDGET = 2.0
+
+# 'Auto' target format: lossy WebP/JPEG results below this PSNR (dB) against
+# the decoded source are discarded in favour of the next smallest candidate
+IMAGE_AUTO_MIN_PSNR = 36.0
+
+# Animated GIF/WebP/PNG and multi-page TIFF are converted one frame at a time;
+# when compressing animations, frames are resized on this many threads
+IMAGE_FRAME_WORKERS = 4
+
+# Meme caption fonts, first one FreeType can open wins (file names on the system
+# font path or absolute paths). Resolved once per worker process.
+MEME_FONTS = ['arial.ttf', 'DejaVuSans-Bold.ttf']
+
+# PDF to text: pages are extracted PDF_TEXT_CHUNK_PAGES at a time on the
+# 'pdf_text' tool pool and streamed to the output. Each document stops at
+# PDF_TEXT_MAX_PAGES pages or PDF_TEXT_TIME_BUDGET seconds, whichever comes first.
+PDF_TEXT_MAX_PAGES = 500
+PDF_TEXT_TIME_BUDGET = 120
+PDF_TEXT_CHUNK_PAGES = 8
+
+# Text to PDF: texts of at least this many characters skip platypus Paragraph
+# markup and are laid out as plain text, each page written as it is finished
+TEXT_PDF_FAST_THRESHOLD = 100_000
+# From this many characters the plain-text layout itself is spread over tool
+# pools: chunks of TEXT_PDF_CHUNK_CHARS are wrapped on 'pdf_layout', then
+# batches of TEXT_PDF_BATCH_PAGES pages rendered on 'pdf_pages', and the pages
+# merged in order
+TEXT_PDF_PARALLEL_THRESHOLD = 2_000_000
+TEXT_PDF_CHUNK_CHARS = 256 * 1024
+TEXT_PDF_BATCH_PAGES = 100
+# Leave the timestamp and random file ID out of generated PDFs, so the same text
+# and title always give the same bytes and each is rendered once into the result cache
+TEXT_PDF_INVARIANT = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 